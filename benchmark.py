@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmarks for the fetch → parse → Markdown → DNA pipeline
+
+Runs on a synthetic newsletter corpus (no Gmail, no OpenAI) and reports
+throughput, p50/p99 latency and peak traced memory per stage. Results are
+written as JSON so runs from different releases can be compared.
+"""
+import os
+import io
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+import contextlib
+from datetime import datetime
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.mime.image import MIMEImage
+from email.utils import formatdate, make_msgid
+import numpy as np
+from email_parser import parse_email_content
+from email_to_markdown import html_to_markdown, save_email_as_markdown
+from test_parser import extract_text_from_html
+from markdown_extract import extract_raw_content
+from llm_backends import create_chat_models
+
+RESULTS_VERSION = 1
+
+# Newsletter shapes: sections of copy, inline images and bytes per image
+CORPUS_PROFILES = {
+    "small": {"sections": 3, "images": 2, "image_bytes": 20_000},
+    "medium": {"sections": 8, "images": 6, "image_bytes": 60_000},
+    "large": {"sections": 20, "images": 15, "image_bytes": 150_000},
+}
+
+_WORDS = ("run", "shoe", "community", "member", "benefit", "exclusive", "new", "collection",
+          "today", "limited", "free", "shipping", "discover", "performance", "comfort", "trail",
+          "offer", "save", "join", "event", "training", "style", "season", "launch", "now")
+_PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+def _sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(_WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+def generate_email(rng: random.Random, profile: str = "medium", index: int = 0) -> bytes:
+    """One synthetic multipart/related newsletter: HTML body, plain text part, cid: images"""
+    shape = CORPUS_PROFILES[profile]
+    msg = MIMEMultipart("related")
+    msg["Subject"] = f"{_sentence(rng, 6)[:-1]} #{index}"
+    msg["From"] = f"Brand {index % 5} <news@brand{index % 5}.example.com>"
+    msg["To"] = "reader@example.com"
+    msg["Date"] = formatdate(1_700_000_000 + index * 86_400)
+    msg["Message-ID"] = make_msgid(idstring=f"bench{index}", domain="bench.example.com")
+
+    html = [f"<html><body><h1>{msg['Subject']}</h1>"]
+    text = []
+    for section in range(shape["sections"]):
+        heading = _sentence(rng, 4)
+        paragraphs = [_sentence(rng, rng.randint(12, 40)) for _ in range(rng.randint(1, 3))]
+        html.append(f"<h2>{heading}</h2>")
+        html.extend(f"<p>{p} <strong>{rng.choice(_WORDS)}</strong> <em>{rng.choice(_WORDS)}</em></p>"
+                    for p in paragraphs)
+        html.append(f'<p><a href="https://brand.example.com/s/{section}">Shop {heading}</a></p>')
+        if section < shape["images"]:
+            html.append(f'<a href="https://brand.example.com/i/{section}">'
+                        f'<img src="cid:image{section}" alt="{heading}"></a>')
+        text.append(heading + "\n\n" + "\n\n".join(paragraphs))
+    html.append('<p>Follow us: <a href="https://instagram.com/brand">Instagram</a><br>'
+                '<a href="https://brand.example.com/unsubscribe">Unsubscribe</a></p></body></html>')
+
+    alternative = MIMEMultipart("alternative")
+    alternative.attach(MIMEText("\n\n".join(text), "plain", "utf-8"))
+    alternative.attach(MIMEText("".join(html), "html", "utf-8"))
+    msg.attach(alternative)
+
+    for n in range(shape["images"]):
+        image = MIMEImage(_PNG_HEADER + rng.randbytes(shape["image_bytes"]), "png")
+        image.add_header("Content-ID", f"<image{n}>")
+        image.add_header("Content-Disposition", "inline", filename=f"image{n}.png")
+        msg.attach(image)
+    return msg.as_bytes()
+
+def generate_corpus(count: int = 30, seed: int = 7, profiles=tuple(CORPUS_PROFILES)) -> list:
+    """Deterministic corpus cycling through the given size profiles"""
+    rng = random.Random(seed)
+    return [{"profile": profiles[i % len(profiles)],
+             "raw_email": generate_email(rng, profiles[i % len(profiles)], i)} for i in range(count)]
+
+def summarize(latencies: list, items_bytes: int = 0, peak_bytes: int = None) -> dict:
+    """Throughput and latency percentiles for one stage"""
+    seconds = np.asarray(latencies, dtype=np.float64)
+    total = float(seconds.sum())
+    summary = {
+        "calls": int(len(seconds)),
+        "total_s": round(total, 4),
+        "throughput_per_s": round(len(seconds) / total, 2) if total else None,
+        "mb_per_s": round(items_bytes / total / 1e6, 2) if total and items_bytes else None,
+        "mean_ms": round(float(seconds.mean()) * 1000, 3),
+        "p50_ms": round(float(np.percentile(seconds, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(seconds, 99)) * 1000, 3),
+        "max_ms": round(float(seconds.max()) * 1000, 3),
+    }
+    if peak_bytes is not None:
+        summary["peak_memory_kb"] = round(peak_bytes / 1024, 1)
+    return summary
+
+def _timed(fn, items: list, repeat: int) -> list:
+    latencies = []
+    for _ in range(repeat):
+        for item in items:
+            start = time.perf_counter()
+            fn(item)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+def _peak_memory(fn, items: list) -> int:
+    """Peak traced allocation while running fn over items once (kept out of the timed runs)"""
+    tracemalloc.start()
+    try:
+        for item in items:
+            fn(item)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def bench_stage(name: str, fn, items: list, repeat: int = 3, items_bytes: int = 0) -> dict:
+    fn(items[0])  # warm-up: imports, regex compilation, parser caches
+    latencies = _timed(fn, items, repeat)
+    result = summarize(latencies, items_bytes * repeat, _peak_memory(fn, items))
+    print(f"⏱️  {name}: {result['throughput_per_s']}/s, p50 {result['p50_ms']} ms, "
+          f"p99 {result['p99_ms']} ms, peak {result.get('peak_memory_kb')} KB")
+    return result
+
+def bench_workflow(corpus: list, workdir: str, repeat: int = 1, llm_latency: float = 0.0) -> dict:
+    """Full LangGraph workflow per email (Markdown + images on disk, fake LLM backend)"""
+    from langgraph_agents import EmailDNAAgents, build_initial_state, create_email_dna_workflow
+    llm, vision_llm = create_chat_models("fake", latency=llm_latency)
+    workflow = create_email_dna_workflow(EmailDNAAgents(llm=llm, vision_llm=vision_llm))
+    inputs = []
+    for i, item in enumerate(corpus):
+        email_dir = os.path.join(workdir, f"email_{i}")
+        md_path = save_email_as_markdown(parse_email_content(item["raw_email"]), output_dir=email_dir)
+        inputs.append((md_path, os.path.join(email_dir, "images")))
+
+    def run(item):
+        # Node progress prints would dominate the timings
+        with contextlib.redirect_stdout(io.StringIO()):
+            workflow.invoke(build_initial_state(*item))
+
+    return bench_stage("workflow (fake LLM)", run, inputs, repeat)
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(count: int = 30, seed: int = 7, repeat: int = 3, workflow: bool = True,
+                   llm_latency: float = 0.0, output_path: str = "benchmark_results.json") -> dict:
+    """Benchmark every pipeline stage on a synthetic corpus and save the results as JSON"""
+    print(f"🧪 Generating synthetic corpus: {count} emails (seed={seed})")
+    corpus = generate_corpus(count, seed)
+    raw_emails = [item["raw_email"] for item in corpus]
+    parsed = [parse_email_content(raw) for raw in raw_emails]
+    htmls = [p["html_body"] for p in parsed]
+    with tempfile.TemporaryDirectory() as workdir:
+        markdowns = []
+        for i, p in enumerate(parsed):
+            with open(save_email_as_markdown(p, output_dir=os.path.join(workdir, f"md_{i}")), encoding="utf-8") as f:
+                markdowns.append(f.read())
+
+        stages = {
+            "parse_email_content": bench_stage("parse_email_content", parse_email_content, raw_emails,
+                                               repeat, sum(map(len, raw_emails))),
+            "html_to_markdown": bench_stage("html_to_markdown", html_to_markdown, htmls,
+                                            repeat, sum(map(len, htmls))),
+            "extract_text_from_html": bench_stage("extract_text_from_html", extract_text_from_html, htmls,
+                                                  repeat, sum(map(len, htmls))),
+            "extract_raw_content": bench_stage("extract_raw_content", extract_raw_content, markdowns,
+                                               repeat, sum(map(len, markdowns))),
+        }
+        if workflow:
+            stages["workflow"] = bench_workflow(corpus, workdir, 1, llm_latency)
+
+    results = {
+        "version": RESULTS_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"emails": count, "seed": seed, "repeat": repeat, "llm_latency_s": llm_latency,
+                   "corpus_bytes": sum(map(len, raw_emails)),
+                   "profiles": {name: sum(1 for item in corpus if item["profile"] == name)
+                                for name in CORPUS_PROFILES}},
+        "stages": stages,
+    }
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"📊 Benchmark results saved to: {output_path}")
+    return results
+
+def compare_results(baseline_path: str, current_path: str) -> dict:
+    """p50 / throughput ratio of current vs baseline for every stage both runs share"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["stages"]
+    with open(current_path) as f:
+        current = json.load(f)["stages"]
+    comparison = {}
+    for stage in baseline.keys() & current.keys():
+        old, new = baseline[stage], current[stage]
+        comparison[stage] = {
+            "p50_ratio": round(new["p50_ms"] / old["p50_ms"], 3) if old["p50_ms"] else None,
+            "throughput_ratio": (round(new["throughput_per_s"] / old["throughput_per_s"], 3)
+                                 if old["throughput_per_s"] and new["throughput_per_s"] else None),
+        }
+        print(f"{stage}: p50 x{comparison[stage]['p50_ratio']}, throughput x{comparison[stage]['throughput_ratio']}")
+    return comparison
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the email DNA pipeline on a synthetic corpus")
+    parser.add_argument("--emails", type=int, default=30, help="synthetic emails to generate")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes per parsing stage")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds each fake LLM call sleeps")
+    parser.add_argument("--no-workflow", action="store_true", help="skip the LangGraph workflow stage")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", metavar="BASELINE_JSON", help="compare the new results against a saved run")
+    args = parser.parse_args()
+
+    run_benchmarks(args.emails, args.seed, args.repeat, not args.no_workflow, args.llm_latency, args.output)
+    if args.compare:
+        compare_results(args.compare, args.output)
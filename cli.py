@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Command-line entry point for the email pipeline
+
+    python cli.py fetch --sender newsfeed@on.com --limit 5   # → emails/<key>.eml
+    python cli.py parse emails/<key>.eml
+    python cli.py markdown emails/<key>.eml                  # → emails/<key>/<key>.md
+    python cli.py analyze emails/<key>/<key>.md              # → dna_results/<key>.json
+    python cli.py run --sender newsfeed@on.com --limit 5     # all of the above
+    python cli.py pipeline --limit 500                       # all of the above, stages overlapped
+    python cli.py enqueue --limit 5000                       # coordinator: queue emails for workers
+    python cli.py worker --workers 4 --store dna.sqlite      # on each node: drain the queue
+    python cli.py queue-status
+
+<key> is output_manifest.email_key (from the Message-ID), as in main.py and
+the pipeline and worker commands; outputs a manifest shows are current are
+not rewritten. Each subcommand imports only what it needs: fetch/parse/markdown
+never load LangGraph, LangChain or OpenAI, which dominate startup time.
+"""
+import os
+import sys
+import argparse
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def cmd_fetch(args):
+    from gmail_fetch import fetch_emails_from_sender
+    from output_manifest import email_key
+    os.makedirs(args.output_dir, exist_ok=True)
+    emails = fetch_emails_from_sender(args.sender, limit=args.limit)
+    for email_obj in emails:
+        path = os.path.join(args.output_dir, f"{email_key(email_obj['raw_email'])}.eml")
+        if os.path.exists(path) and _read_bytes(path) == email_obj['raw_email']:
+            print(f"♻️  {path}: unchanged")
+            continue
+        with open(path, "wb") as f:
+            f.write(email_obj['raw_email'])
+        print(f"📧 {path}: {email_obj['subject']}")
+    print(f"✅ Fetched {len(emails)} emails from {args.sender}")
+
+def cmd_parse(args):
+    from email_parser import parse_email_content, save_images
+    for path in args.eml:
+        parsed = parse_email_content(_read_bytes(path))
+        print(f"🔍 {path}")
+        print(f"✅ Subject: {parsed['subject']}")
+        print(f"✅ From: {parsed['from']}")
+        print(f"✅ HTML Content: {len(parsed['html_body'])} characters")
+        print(f"✅ Text Content: {len(parsed['text_body'])} characters")
+        print(f"✅ Images: {len(parsed['images'])} found")
+        if args.save_images and parsed['images']:
+            saved = save_images(parsed, args.save_images)
+            print(f"🖼️  Images saved: {len(saved)} files")
+
+def cmd_markdown(args):
+    from pipeline_runner import process_raw_email
+    for path in args.eml:
+        converted = process_raw_email(path, _read_bytes(path), args.output_dir or os.path.dirname(path))
+        if converted["skipped"]:
+            print(f"♻️  Markdown unchanged: {converted['md_path']}")
+        else:
+            print(f"📝 Markdown saved: {converted['md_path']}")
+
+def cmd_analyze(args):
+    from concurrent.futures import ThreadPoolExecutor
+    from langgraph_agents import EmailDNAAnalyzer
+    from output_manifest import analyze_incremental
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    def analyze(md_path):
+        images_dir = args.images_dir or os.path.join(os.path.dirname(md_path), "images")
+        output_path = os.path.join(args.output_dir, f"{os.path.splitext(os.path.basename(md_path))[0]}.json")
+        try:
+            skipped = analyze_incremental(analyzer, md_path, images_dir, output_path)
+        except Exception as e:
+            print(f"❌ {md_path}: {e}")
+            return False
+        print(f"{'♻️  Unchanged' if skipped else '🧬 Analyzed'}: {md_path} → {output_path}")
+        return True
+
+    with EmailDNAAnalyzer(store_path=args.store, llm_backend=args.llm_backend) as analyzer:
+        with ThreadPoolExecutor(max_workers=args.max_concurrency) as pool:
+            succeeded = list(pool.map(analyze, args.markdown))
+    return 0 if all(succeeded) else 1
+
+def cmd_run(args):
+    if args.llm_backend:
+        os.environ["DNA_LLM_BACKEND"] = args.llm_backend
+    from main import main as run_pipeline
+    run_pipeline(args.sender, args.limit, metrics_file=args.metrics_file,
+                 metrics_log=args.metrics_log, metrics_port=args.metrics_port)
+
+def cmd_pipeline(args):
+    from langgraph_agents import EmailDNAAnalyzer
+    from pipeline_runner import PipelineRunner
+    with EmailDNAAnalyzer(max_connections=args.llm_concurrency, store_path=args.store,
+                          llm_backend=args.llm_backend) as analyzer:
+        runner = PipelineRunner(analyzer, fetch_workers=args.fetch_workers, parse_workers=args.parse_workers,
+                                llm_concurrency=args.llm_concurrency, queue_size=args.queue_size,
+                                output_root=args.emails_dir, output_dir=args.output_dir)
+        if args.eml:
+            summary = runner.run_raw((os.path.splitext(os.path.basename(path))[0], _read_bytes(path))
+                                     for path in args.eml)
+        else:
+            summary = runner.run_gmail(args.sender, args.limit)
+    return 1 if any(item["error"] for item in summary) else 0
+
+def cmd_enqueue(args):
+    from work_queue import WorkQueue, enqueue_files, enqueue_gmail
+    queue = WorkQueue(args.queue, max_attempts=args.max_attempts)
+    try:
+        if args.eml:
+            enqueue_files(queue, args.eml)
+        else:
+            enqueue_gmail(queue, args.sender, args.limit)
+        print(f"📋 Queue: {queue.stats()}")
+    finally:
+        queue.close()
+
+def cmd_worker(args):
+    if args.llm_backend:
+        # Spawned worker processes pick the backend up from the environment as well
+        os.environ["DNA_LLM_BACKEND"] = args.llm_backend
+    from work_queue import QueueWorker, run_workers
+    options = {"lease_seconds": args.lease_seconds, "emails_root": args.emails_dir, "output_dir": args.output_dir}
+    if args.workers > 1:
+        exit_codes = run_workers(args.queue, args.store, processes=args.workers,
+                                 exit_when_empty=not args.follow, **options)
+        return 1 if any(exit_codes) else 0
+    worker = QueueWorker(args.queue, args.store, worker_id=args.worker_id, **options)
+    try:
+        worker.run(exit_when_empty=not args.follow)
+    finally:
+        worker.close()
+
+def cmd_queue_status(args):
+    from work_queue import WorkQueue
+    queue = WorkQueue(args.queue)
+    try:
+        if args.requeue_failed:
+            print(f"🔁 Requeued {queue.requeue_failed()} failed jobs")
+        print(f"📋 Queue: {queue.stats()}")
+        for failure in queue.failures():
+            print(f"❌ {failure['job_id']} ({failure['attempts']} attempts): {failure['last_error']}")
+    finally:
+        queue.close()
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli.py", description="Gmail marketing email DNA pipeline")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fetch = commands.add_parser("fetch", help="download raw emails from Gmail as .eml files")
+    fetch.add_argument("--sender", default="newsfeed@on.com")
+    fetch.add_argument("--limit", type=int, default=1)
+    fetch.add_argument("--output-dir", default="emails")
+    fetch.set_defaults(handler=cmd_fetch)
+
+    parse = commands.add_parser("parse", help="parse .eml files and summarize their content")
+    parse.add_argument("eml", nargs="+")
+    parse.add_argument("--save-images", metavar="DIR", help="also write extracted images to DIR")
+    parse.set_defaults(handler=cmd_parse)
+
+    markdown = commands.add_parser("markdown", help="convert .eml files to Markdown + images")
+    markdown.add_argument("eml", nargs="+")
+    markdown.add_argument("--output-dir", help="parent of the per-email directories (default: next to each .eml)")
+    markdown.set_defaults(handler=cmd_markdown)
+
+    analyze = commands.add_parser("analyze", help="run LangGraph DNA analysis on Markdown emails")
+    analyze.add_argument("markdown", nargs="+")
+    analyze.add_argument("--images-dir", help="images for every email (default: images/ next to each .md)")
+    analyze.add_argument("--output-dir", default="dna_results")
+    analyze.add_argument("--max-concurrency", type=int, default=4)
+    analyze.add_argument("--store", help="SQLite results store to record the DNA in")
+    analyze.add_argument("--llm-backend", choices=("openai", "fake"))
+    analyze.set_defaults(handler=cmd_analyze)
+
+    run = commands.add_parser("run", help="fetch → parse → Markdown → DNA analysis")
+    run.add_argument("--sender", default="newsfeed@on.com")
+    run.add_argument("--limit", type=int, default=1)
+    run.add_argument("--metrics-file", default="pipeline_metrics.prom")
+    run.add_argument("--metrics-log")
+    run.add_argument("--metrics-port", type=int)
+    run.add_argument("--llm-backend", choices=("openai", "fake"))
+    run.set_defaults(handler=cmd_run)
+
+    pipeline = commands.add_parser("pipeline", help="staged run: fetch, parse and analyze concurrently")
+    pipeline.add_argument("--sender", default="newsfeed@on.com")
+    pipeline.add_argument("--limit", type=int, default=10)
+    pipeline.add_argument("--eml", nargs="+", help="process these .eml files instead of fetching from Gmail")
+    pipeline.add_argument("--fetch-workers", type=int, default=4, help="parallel IMAP connections (Gmail allows 15)")
+    pipeline.add_argument("--parse-workers", type=int, help="parsing processes (default: CPUs - 1)")
+    pipeline.add_argument("--llm-concurrency", type=int, default=4, help="emails analyzed at once")
+    pipeline.add_argument("--queue-size", type=int, default=16, help="max emails waiting between stages")
+    pipeline.add_argument("--emails-dir", default="emails")
+    pipeline.add_argument("--output-dir", default="dna_results")
+    pipeline.add_argument("--store", help="SQLite results store to record the DNA in")
+    pipeline.add_argument("--llm-backend", choices=("openai", "fake"))
+    pipeline.set_defaults(handler=cmd_pipeline)
+
+    enqueue = commands.add_parser("enqueue", help="queue emails for distributed workers")
+    enqueue.add_argument("--sender", default="newsfeed@on.com")
+    enqueue.add_argument("--limit", type=int, default=10)
+    enqueue.add_argument("--eml", nargs="+", help="queue these .eml files instead of Gmail UIDs")
+    enqueue.add_argument("--queue", default="work_queue.sqlite")
+    enqueue.add_argument("--max-attempts", type=int, default=3)
+    enqueue.set_defaults(handler=cmd_enqueue)
+
+    worker = commands.add_parser("worker", help="claim queued emails and analyze them into a shared store")
+    worker.add_argument("--queue", default="work_queue.sqlite")
+    worker.add_argument("--store", default="dna_results.sqlite", help="shared SQLite results store")
+    worker.add_argument("--workers", type=int, default=1, help="worker processes to start on this host")
+    worker.add_argument("--worker-id", help="default: <hostname>:<pid>")
+    worker.add_argument("--lease-seconds", type=float, default=300.0)
+    worker.add_argument("--follow", action="store_true", help="keep polling for new jobs instead of exiting")
+    worker.add_argument("--emails-dir", default="emails")
+    worker.add_argument("--output-dir", default="dna_results")
+    worker.add_argument("--llm-backend", choices=("openai", "fake"))
+    worker.set_defaults(handler=cmd_worker)
+
+    status = commands.add_parser("queue-status", help="show work queue progress and failures")
+    status.add_argument("--queue", default="work_queue.sqlite")
+    status.add_argument("--requeue-failed", action="store_true", help="give failed jobs another round of attempts")
+    status.set_defaults(handler=cmd_queue_status)
+    return parser
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.handler(args) or 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Cross-email analytics over stored DNA: columnar arrays + vectorized aggregates
+"""
+import numpy as np
+from dna_store import DNAResultStore
+
+DEFAULT_METRICS = (
+    "overall_score", "content_score", "visual_score", "urgency_score",
+    "subject_length", "cta_count", "total_links", "total_images", "word_count",
+)
+
+GROUP_KEYS = ("sender", "sender_domain", "email_type")
+
+_NO_WEEK = np.iinfo(np.int64).min
+
+def _week_index(sent_at: str) -> int:
+    """ISO week number counted from the Monday before 1970-01-01"""
+    if not sent_at:
+        return _NO_WEEK
+    days = np.datetime64(sent_at[:10], "D").astype(np.int64)
+    # 1970-01-01 was a Thursday; shift so weeks start on Monday
+    return int((days + 3) // 7)
+
+def _week_start(week: int) -> str:
+    return str(np.datetime64(week * 7 - 3, "D"))
+
+class DNAAnalytics:
+    """Columnar view of a DNAResultStore with per-sender / per-week aggregates
+
+    refresh() pulls only rows written since the last refresh (by store seq);
+    re-analyzed messages overwrite their existing row. All aggregates are
+    computed with NumPy over the whole column at once.
+    """
+
+    def __init__(self, store: DNAResultStore, metrics=DEFAULT_METRICS):
+        self.store = store
+        self.metrics = tuple(metrics)
+        self.message_ids = []
+        self._positions = {}
+        self._last_seq = 0
+        self._labels = {key: [] for key in GROUP_KEYS}
+        self._label_codes = {key: {} for key in GROUP_KEYS}
+        self.codes = {key: np.empty(0, dtype=np.int64) for key in GROUP_KEYS}
+        self.week = np.empty(0, dtype=np.int64)
+        self.values = {metric: np.empty(0, dtype=np.float64) for metric in self.metrics}
+
+    def __len__(self):
+        return len(self.message_ids)
+
+    def refresh(self) -> int:
+        """Load rows written since the last refresh; returns how many changed"""
+        rows = self.store.rows_since(self._last_seq)
+        if not rows:
+            return 0
+        self._last_seq = rows[-1]["seq"]
+
+        # Latest write wins if a message appears twice in one refresh
+        latest = {row["message_id"]: row for row in rows}
+        updates = [row for mid, row in latest.items() if mid in self._positions]
+        inserts = [row for mid, row in latest.items() if mid not in self._positions]
+
+        if updates:
+            positions = np.array([self._positions[row["message_id"]] for row in updates])
+            self._assign(positions, updates)
+        if inserts:
+            start = len(self.message_ids)
+            for offset, row in enumerate(inserts):
+                self._positions[row["message_id"]] = start + offset
+                self.message_ids.append(row["message_id"])
+            self._grow(len(inserts))
+            self._assign(np.arange(start, start + len(inserts)), inserts)
+        return len(latest)
+
+    def _grow(self, extra: int):
+        for key in GROUP_KEYS:
+            self.codes[key] = np.concatenate([self.codes[key], np.zeros(extra, dtype=np.int64)])
+        self.week = np.concatenate([self.week, np.full(extra, _NO_WEEK, dtype=np.int64)])
+        for metric in self.metrics:
+            self.values[metric] = np.concatenate([self.values[metric], np.full(extra, np.nan)])
+
+    def _assign(self, positions: np.ndarray, rows: list):
+        for key in GROUP_KEYS:
+            self.codes[key][positions] = [self._code(key, row.get(key)) for row in rows]
+        self.week[positions] = [_week_index(row.get("sent_at")) for row in rows]
+        for metric in self.metrics:
+            self.values[metric][positions] = np.array(
+                [row.get(metric) for row in rows], dtype=np.float64
+            )
+
+    def _code(self, key: str, label) -> int:
+        codes = self._label_codes[key]
+        if label not in codes:
+            codes[label] = len(self._labels[key])
+            self._labels[key].append(label)
+        return codes[label]
+
+    def _grouped(self, codes: np.ndarray, n_groups: int, metric: str, mask=None) -> dict:
+        """count/mean/std/min/max of metric per group code, ignoring missing values"""
+        values = self.values[metric]
+        valid = ~np.isnan(values)
+        if mask is not None:
+            valid &= mask
+        codes, values = codes[valid], values[valid]
+        count = np.bincount(codes, minlength=n_groups)
+        total = np.bincount(codes, weights=values, minlength=n_groups)
+        total_sq = np.bincount(codes, weights=values * values, minlength=n_groups)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / count
+            std = np.sqrt(np.maximum(total_sq / count - mean * mean, 0.0))
+        minimum = np.full(n_groups, np.inf)
+        maximum = np.full(n_groups, -np.inf)
+        np.minimum.at(minimum, codes, values)
+        np.maximum.at(maximum, codes, values)
+        return {"count": count, "mean": mean, "std": std, "min": minimum, "max": maximum}
+
+    @staticmethod
+    def _rows(stats: dict, labels: list) -> list:
+        rows = []
+        for i, label in enumerate(labels):
+            count = int(stats["count"][i])
+            if not count:
+                continue
+            row = dict(label)
+            row.update({
+                "count": count,
+                "mean": round(float(stats["mean"][i]), 3),
+                "std": round(float(stats["std"][i]), 3),
+                "min": round(float(stats["min"][i]), 3),
+                "max": round(float(stats["max"][i]), 3),
+            })
+            rows.append(row)
+        return rows
+
+    def by_group(self, metric: str = "overall_score", group_by: str = "sender") -> list:
+        """Aggregate a metric per sender (or sender_domain / email_type)"""
+        labels = self._labels[group_by]
+        stats = self._grouped(self.codes[group_by], len(labels), metric)
+        rows = self._rows(stats, [{group_by: label} for label in labels])
+        return sorted(rows, key=lambda row: -row["count"])
+
+    def by_group_week(self, metric: str = "overall_score", group_by: str = "sender") -> list:
+        """Aggregate a metric per (sender, week); weeks start on Monday"""
+        dated = self.week != _NO_WEEK
+        if not dated.any():
+            return []
+        group_codes = self.codes[group_by]
+        first_week = int(self.week[dated].min())
+        n_weeks = int(self.week[dated].max()) - first_week + 1
+        combined = group_codes * n_weeks + np.where(dated, self.week - first_week, 0)
+        keys, inverse = np.unique(combined[dated], return_inverse=True)
+        full_inverse = np.zeros(len(combined), dtype=np.int64)
+        full_inverse[dated] = inverse
+        stats = self._grouped(full_inverse, len(keys), metric, mask=dated)
+        labels = [{group_by: self._labels[group_by][int(key) // n_weeks],
+                   "week": _week_start(first_week + int(key) % n_weeks)} for key in keys]
+        return sorted(self._rows(stats, labels), key=lambda row: (str(row[group_by]), row["week"]))
+
+    def distribution(self, metric: str = "overall_score", bins=10, group_by: str = None, group=None) -> dict:
+        """Histogram of a metric, optionally restricted to one sender/domain/type"""
+        values = self.values[metric]
+        mask = ~np.isnan(values)
+        if group_by is not None:
+            code = self._label_codes[group_by].get(group)
+            if code is None:
+                return {"counts": [], "edges": []}
+            mask &= self.codes[group_by] == code
+        if not mask.any():
+            return {"counts": [], "edges": []}
+        counts, edges = np.histogram(values[mask], bins=bins)
+        return {"counts": counts.tolist(), "edges": [round(float(edge), 3) for edge in edges]}
@@ -0,0 +1,86 @@
+"""
+SQLite checkpoint persistence for resumable LangGraph DNA runs
+"""
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+
+def open_checkpointer(path: str):
+    """Open (or create) a local SQLite checkpointer shared by all runs in the process"""
+    # Optional dependency: only needed when checkpointing is switched on
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return SqliteSaver(conn)
+
+def thread_id_for(email_content: str, images_dir: str, model: str = "") -> str:
+    """Stable checkpoint thread for one email input
+
+    Derived from the input paths, the Markdown and image bytes and the model
+    names, so an unchanged email resumes its previous run while an edited
+    one, or one analyzed with a different model, starts fresh.
+    """
+    digest = hashlib.sha1()
+    digest.update(os.path.abspath(email_content).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(os.path.abspath(images_dir).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(model.encode("utf-8"))
+    if os.path.exists(email_content):
+        with open(email_content, "rb") as f:
+            digest.update(f.read())
+    if os.path.isdir(images_dir):
+        for name in sorted(os.listdir(images_dir)):
+            path = os.path.join(images_dir, name)
+            if os.path.isfile(path):
+                digest.update(b"\0" + name.encode("utf-8") + b"\0")
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()
+
+class ImageProgressStore:
+    """Per-image completion records so image_agent can resume mid-node
+
+    LangGraph checkpoints only at node boundaries; this table keeps every
+    successful vision call so a crash halfway through image_agent doesn't pay
+    for the finished images again.
+    """
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS image_progress (
+                    thread_id TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    analysis TEXT NOT NULL,
+                    PRIMARY KEY (thread_id, filename)
+                )
+            """)
+
+    def load(self, thread_id: str) -> dict:
+        """Completed analyses for a thread, keyed by image filename"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT filename, analysis FROM image_progress WHERE thread_id = ?", (thread_id,)
+            ).fetchall()
+        return {filename: json.loads(analysis) for filename, analysis in rows}
+
+    def save(self, thread_id: str, filename: str, analysis: dict):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO image_progress (thread_id, filename, analysis) VALUES (?, ?, ?)",
+                (thread_id, filename, json.dumps(analysis, default=str))
+            )
+
+    def clear(self, thread_id: str):
+        """Forget a thread's images once its run has completed (the checkpoint holds the result)"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM image_progress WHERE thread_id = ?", (thread_id,))
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,54 @@
+"""
+JSON Lines progress events for the LangGraph DNA workflow
+"""
+import json
+import threading
+from datetime import datetime
+
+class JsonlEventSink:
+    """Write one JSON event per line to a file and/or forward it to a callback
+
+    Every line is flushed as soon as it is written, so completed work survives
+    a crash later in the run. Safe to share between concurrently running emails.
+    """
+
+    def __init__(self, path: str = None, callback=None):
+        self.path = path
+        self.callback = callback
+        self._file = open(path, "a", encoding="utf-8") if path else None
+        self._lock = threading.Lock()
+
+    def emit(self, event: dict):
+        if self._file:
+            line = json.dumps(event, default=str)
+            with self._lock:
+                self._file.write(line + "\n")
+                self._file.flush()
+        if self.callback:
+            self.callback(event)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def make_event(event_type: str, email: str, data=None) -> dict:
+    """Build a single progress event"""
+    return {
+        "event": event_type,
+        "email": email,
+        "timestamp": datetime.now().isoformat(),
+        "data": data
+    }
+
+def emit_event(config, event_type: str, email: str, data=None):
+    """Emit an event to the sink carried in a LangGraph run config, if any"""
+    sink = ((config or {}).get("configurable") or {}).get("event_sink")
+    if sink:
+        sink.emit(make_event(event_type, email, data))
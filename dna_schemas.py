@@ -0,0 +1,167 @@
+"""
+Typed models for the LLM outputs of the DNA workflow, plus parse-failure counters and fallback marking
+"""
+import threading
+from collections import Counter
+from typing import List, Union
+from pydantic import BaseModel, ConfigDict
+
+Number = Union[int, float]
+
+class _DNAModel(BaseModel):
+    # The prompts describe the minimum shape; keep anything extra the model returns
+    model_config = ConfigDict(extra="allow")
+
+# --- Content DNA (content_agent) ---
+
+class SubjectLineDNA(_DNAModel):
+    text: str = ""
+    length: int = 0
+    emotional_triggers: List[str] = []
+    power_words: List[str] = []
+    personalization_level: str = "none"
+    urgency_indicators: List[str] = []
+    predicted_open_rate: str = "medium"
+
+class ContentStructureDNA(_DNAModel):
+    word_count: int = 0
+    paragraph_count: int = 0
+    opening_hook_type: str = "benefit"
+    value_propositions: List[str] = []
+    social_proof_elements: List[str] = []
+    scarcity_signals: List[str] = []
+    closing_technique: str = "benefit"
+
+class PrimaryCTA(_DNAModel):
+    text: str = ""
+    action_type: str = "learn_more"
+    urgency_level: str = "low"
+    position: str = "bottom"
+
+class CTADNA(_DNAModel):
+    primary_cta: PrimaryCTA = PrimaryCTA()
+    secondary_ctas: List[str] = []
+    cta_count: int = 0
+    cta_strategy: str = "single_focus"
+
+class PsychologicalTriggers(_DNAModel):
+    urgency_score: Number = 0
+    scarcity_indicators: List[str] = []
+    authority_markers: List[str] = []
+    reciprocity_elements: List[str] = []
+    social_proof_strength: str = "low"
+
+class OfferDNA(_DNAModel):
+    discount_type: str = "none"
+    discount_value: Number = 0
+    offer_presentation: str = "none"
+    bonus_items: List[str] = []
+    guarantee_type: str = "none"
+
+class BrandVoiceDNA(_DNAModel):
+    tone: str = "friendly"
+    personality_traits: List[str] = []
+    emotional_temperature: str = "neutral"
+    formality_level: str = "business_casual"
+    reading_level: str = "middle_school"
+
+class ContentDNA(_DNAModel):
+    subject_line_dna: SubjectLineDNA
+    content_structure_dna: ContentStructureDNA
+    cta_dna: CTADNA
+    psychological_triggers: PsychologicalTriggers
+    offer_dna: OfferDNA
+    brand_voice_dna: BrandVoiceDNA
+
+# --- Image analysis (analyze_single_image) ---
+
+class RawVisualDescription(_DNAModel):
+    scene_description: str = ""
+    people_details: str = ""
+    objects_present: List[str] = []
+    text_in_image: str = ""
+    colors_observed: List[str] = []
+    setting_context: str = "unknown"
+    mood_atmosphere: str = "unknown"
+
+class VisualElements(_DNAModel):
+    image_type: str = "unknown"
+    dominant_colors: List[str] = []
+    color_psychology: List[str] = []
+    text_content: str = ""
+    design_style: str = "unknown"
+    layout_pattern: str = "unknown"
+
+class BrandDNA(_DNAModel):
+    professionalism_score: Number = 5
+    brand_consistency: str = "unknown"
+    visual_appeal: str = "unknown"
+    target_demographic: str = "unknown"
+    brand_personality: List[str] = []
+
+class MarketingPsychology(_DNAModel):
+    cta_visibility: str = "unknown"
+    emotional_impact: str = "unknown"
+    attention_grabbing: str = "unknown"
+    urgency_visual_cues: List[str] = []
+    trust_signals: List[str] = []
+    conversion_elements: List[str] = []
+
+class TechnicalAnalysis(_DNAModel):
+    resolution: str = "unknown"
+    mobile_optimization: bool = False
+    composition_quality: str = "unknown"
+    color_harmony: str = "unknown"
+    text_readability: str = "unknown"
+
+class CompetitiveInsights(_DNAModel):
+    innovation_level: str = "standard"
+    industry_trends: List[str] = []
+    differentiation_factors: List[str] = []
+
+class ImageAnalysis(_DNAModel):
+    filename: str = ""
+    raw_visual_description: RawVisualDescription
+    visual_elements: VisualElements
+    brand_dna: BrandDNA
+    marketing_psychology: MarketingPsychology = MarketingPsychology()
+    technical_analysis: TechnicalAnalysis = TechnicalAnalysis()
+    competitive_insights: CompetitiveInsights = CompetitiveInsights()
+    recommendations: List[str] = []
+
+# --- Parse failure accounting ---
+
+class StructuredOutputError(ValueError):
+    """LLM output still failed schema validation after the repair retries"""
+
+_parse_stats = Counter()
+_parse_stats_lock = threading.Lock()
+
+def record_parse_stat(name: str, count: int = 1):
+    with _parse_stats_lock:
+        _parse_stats[name] += count
+
+def parse_stats() -> dict:
+    """Snapshot of parse counters: <label>_parse_failures, _repaired, _fallbacks"""
+    with _parse_stats_lock:
+        return dict(_parse_stats)
+
+def reset_parse_stats():
+    with _parse_stats_lock:
+        _parse_stats.clear()
+
+# --- Fallback marking ---
+
+class AnalysisFallbackError(RuntimeError):
+    """A DNA result was (partly) built from fallback defaults and must not be kept as final"""
+
+def fallback_reasons(final_dna: dict) -> list:
+    """Why a final DNA document holds fallback defaults instead of model output; [] if it doesn't
+
+    dna_synthesizer sets meta_data.analysis_status to "fallback" (with
+    fallback_reasons) when the content or any image analysis failed.
+    """
+    meta = (final_dna or {}).get("email_dna", {}).get("meta_data", {})
+    if meta.get("analysis_status") != "fallback":
+        return []
+    return list(meta.get("fallback_reasons") or ["unknown"])
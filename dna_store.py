@@ -0,0 +1,229 @@
+"""
+SQLite results store for email DNA, keyed by Message-ID
+"""
+import json
+import sqlite3
+import threading
+from datetime import timezone
+from email.utils import parseaddr, parsedate_to_datetime
+
+# Summary columns pulled out of each DNA document for indexed filtering
+SUMMARY_COLUMNS = [
+    "sender", "sender_domain", "subject", "sent_at", "email_type",
+    "overall_score", "content_score", "visual_score", "urgency_score",
+    "subject_length", "cta_count", "total_links", "total_images", "word_count",
+    "analyzed_at",
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS email_dna (
+    message_id TEXT PRIMARY KEY,
+    sender TEXT,
+    sender_domain TEXT,
+    subject TEXT,
+    sent_at TEXT,
+    email_type TEXT,
+    overall_score REAL,
+    content_score REAL,
+    visual_score REAL,
+    urgency_score REAL,
+    subject_length INTEGER,
+    cta_count INTEGER,
+    total_links INTEGER,
+    total_images INTEGER,
+    word_count INTEGER,
+    analyzed_at TEXT,
+    seq INTEGER NOT NULL,
+    dna TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_email_dna_sender ON email_dna (sender, sent_at);
+CREATE INDEX IF NOT EXISTS idx_email_dna_domain ON email_dna (sender_domain, sent_at);
+CREATE INDEX IF NOT EXISTS idx_email_dna_sent_at ON email_dna (sent_at);
+CREATE INDEX IF NOT EXISTS idx_email_dna_type ON email_dna (email_type);
+CREATE INDEX IF NOT EXISTS idx_email_dna_overall ON email_dna (overall_score);
+CREATE INDEX IF NOT EXISTS idx_email_dna_urgency ON email_dna (urgency_score);
+CREATE INDEX IF NOT EXISTS idx_email_dna_seq ON email_dna (seq);
+"""
+
+# Aggregates allowed in DNAResultStore.aggregate (column names are whitelisted, never interpolated raw)
+_GROUPABLE = {"sender", "sender_domain", "email_type"}
+_NUMERIC = {"overall_score", "content_score", "visual_score", "urgency_score",
+            "subject_length", "cta_count", "total_links", "total_images", "word_count"}
+
+def normalize_date(value: str):
+    """RFC 2822 email date -> ISO 8601 UTC string, or None if unparseable"""
+    if not value:
+        return None
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat()
+
+def summarize_dna(final_dna: dict) -> dict:
+    """Flatten the indexed summary columns out of a final DNA document"""
+    dna = final_dna.get("email_dna", {})
+    meta = dna.get("meta_data", {})
+    raw = dna.get("raw_data", {})
+    original = raw.get("original_email", {})
+    stats = raw.get("content_stats", {})
+    content = dna.get("content_dna", {})
+    sender = original.get("sender")
+    subject = original.get("subject_line") or ""
+    return {
+        "sender": sender,
+        "sender_domain": parseaddr(sender or "")[1].rpartition("@")[2].lower() or None,
+        "subject": subject,
+        "sent_at": normalize_date(original.get("date")),
+        "email_type": meta.get("email_type"),
+        "overall_score": meta.get("overall_effectiveness_score"),
+        "content_score": meta.get("content_score"),
+        "visual_score": meta.get("visual_score"),
+        "urgency_score": content.get("psychological_triggers", {}).get("urgency_score"),
+        "subject_length": len(subject),
+        "cta_count": content.get("cta_dna", {}).get("cta_count"),
+        "total_links": stats.get("total_links"),
+        "total_images": stats.get("total_images"),
+        "word_count": stats.get("total_words"),
+        "analyzed_at": meta.get("analysis_timestamp"),
+    }
+
+class DNAResultStore:
+    """Indexed history of every analyzed email; one row per Message-ID
+
+    Re-analyzing a message replaces its row. Every write takes a new, increasing
+    seq so readers can pick up changes incrementally with rows_since().
+    Safe to share between threads; separate processes may open the same file.
+    """
+
+    def __init__(self, path: str = "dna_results.sqlite"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def save(self, message_id: str, final_dna: dict):
+        """Insert or replace the DNA for one message"""
+        row = summarize_dna(final_dna)
+        row["message_id"] = message_id
+        row["dna"] = json.dumps(final_dna, default=str)
+        columns = ["message_id"] + SUMMARY_COLUMNS + ["dna"]
+        updates = ", ".join(f"{col} = excluded.{col}" for col in SUMMARY_COLUMNS + ["dna", "seq"])
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO email_dna ({', '.join(columns)}, seq) "
+                f"VALUES ({', '.join('?' for _ in columns)}, "
+                f"(SELECT COALESCE(MAX(seq), 0) + 1 FROM email_dna)) "
+                f"ON CONFLICT(message_id) DO UPDATE SET {updates}",
+                [row[col] for col in columns]
+            )
+
+    def get(self, message_id: str):
+        """Full DNA document for a message, or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT dna FROM email_dna WHERE message_id = ?", (message_id,)).fetchone()
+        return json.loads(row["dna"]) if row else None
+
+    def query(self, sender=None, sender_domain=None, email_type=None, since=None, until=None,
+              min_score=None, max_score=None, order_by="sent_at", limit=None, include_dna=False) -> list:
+        """Filter stored emails on the indexed columns
+
+        since/until are ISO 8601 strings compared against sent_at (UTC).
+        Returns summary rows as dicts; include_dna adds the parsed document.
+        """
+        clauses, params = [], []
+        for column, value in (("sender", sender), ("sender_domain", sender_domain), ("email_type", email_type)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("sent_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("sent_at < ?")
+            params.append(until)
+        if min_score is not None:
+            clauses.append("overall_score >= ?")
+            params.append(min_score)
+        if max_score is not None:
+            clauses.append("overall_score <= ?")
+            params.append(max_score)
+        if order_by not in _NUMERIC | {"sent_at", "seq", "message_id"}:
+            raise ValueError(f"Cannot order by {order_by!r}")
+
+        columns = ["message_id"] + SUMMARY_COLUMNS + ["seq"] + (["dna"] if include_dna else [])
+        sql = f"SELECT {', '.join(columns)} FROM email_dna"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY {order_by}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._row_dict(row) for row in rows]
+
+    def aggregate(self, group_by: str = "sender", metric: str = "overall_score", **filters) -> list:
+        """count/avg/min/max of a numeric column per group, e.g. avg urgency per sender"""
+        if group_by not in _GROUPABLE or metric not in _NUMERIC:
+            raise ValueError(f"Cannot aggregate {metric!r} by {group_by!r}")
+        clauses, params = [], []
+        for column in _GROUPABLE:
+            if filters.get(column) is not None:
+                clauses.append(f"{column} = ?")
+                params.append(filters[column])
+        if filters.get("since") is not None:
+            clauses.append("sent_at >= ?")
+            params.append(filters["since"])
+        if filters.get("until") is not None:
+            clauses.append("sent_at < ?")
+            params.append(filters["until"])
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        sql = (f"SELECT {group_by} AS grp, COUNT(*) AS count, AVG({metric}) AS avg, "
+               f"MIN({metric}) AS min, MAX({metric}) AS max FROM email_dna{where} "
+               f"GROUP BY {group_by} ORDER BY count DESC")
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{group_by: row["grp"], "count": row["count"], "avg": row["avg"],
+                 "min": row["min"], "max": row["max"]} for row in rows]
+
+    def rows_since(self, seq: int = 0) -> list:
+        """Summary rows written after seq, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT message_id, {', '.join(SUMMARY_COLUMNS)}, seq FROM email_dna WHERE seq > ? ORDER BY seq",
+                (seq,)
+            ).fetchall()
+        return [self._row_dict(row) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM email_dna").fetchone()[0]
+
+    def export_parquet(self, path: str, **filters) -> str:
+        """Write the summary columns (filtered like query) to a Parquet file
+
+        Needs pandas with pyarrow or fastparquet installed.
+        """
+        try:
+            import pandas as pd
+        except ImportError as e:
+            raise ImportError("Parquet export needs pandas and pyarrow: pip install pandas pyarrow") from e
+        rows = self.query(**filters)
+        pd.DataFrame(rows, columns=["message_id"] + SUMMARY_COLUMNS + ["seq"]).to_parquet(path, index=False)
+        return path
+
+    def close(self):
+        self._conn.close()
+
+    @staticmethod
+    def _row_dict(row: sqlite3.Row) -> dict:
+        item = dict(row)
+        if "dna" in item:
+            item["dna"] = json.loads(item["dna"])
+        return item
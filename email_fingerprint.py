@@ -0,0 +1,172 @@
+"""
+Near-duplicate detection for templated sends: MinHash over clean text + image hashes
+"""
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import difflib
+import threading
+import numpy as np
+
+NUM_PERMUTATIONS = 128
+BANDS = 32
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+SHINGLE_SIZE = 5
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(20240101)
+# Fixed seed: signatures must stay comparable across processes and runs
+_PERM_A = _rng.randint(1, _PRIME, size=NUM_PERMUTATIONS).astype(np.int64)
+_PERM_B = _rng.randint(0, _PRIME, size=NUM_PERMUTATIONS).astype(np.int64)
+
+_WORD_RE = re.compile(r'\w+')
+_DIGITS_RE = re.compile(r'\d+')
+# Discounts and prices: "20% off", "$49.99", "15 EUR", "£5"
+_OFFER_RE = re.compile(r'[$€£]\s?\d[\d,.]*\d|[$€£]\s?\d|\d[\d,.]*\s?(?:%|percent\b|usd\b|eur\b|gbp\b|[$€£])',
+                       re.IGNORECASE)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp')
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Word n-grams of lowercased text; numbers collapse so dates/prices don't break matches"""
+    words = _WORD_RE.findall(_DIGITS_RE.sub("0", text.lower()))
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def offer_numbers(text: str) -> list:
+    """Discount and price figures in the text, normalized and sorted
+
+    shingles() collapses digits, so two sends that differ only in their
+    offer look identical; comparing these catches that.
+    """
+    return sorted({re.sub(r'\s+', '', match).lower() for match in _OFFER_RE.findall(text)})
+
+def minhash_signature(text: str) -> np.ndarray:
+    """NUM_PERMUTATIONS-long MinHash signature of the text's shingles"""
+    grams = shingles(text)
+    if not grams:
+        return np.full(NUM_PERMUTATIONS, _PRIME, dtype=np.int64)
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little") for g in grams],
+        dtype=np.int64
+    ) % _PRIME
+    return ((_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _PRIME).min(axis=1)
+
+def image_hashes(images_dir: str) -> list:
+    """Content hashes of every image file in images_dir"""
+    if not images_dir or not os.path.isdir(images_dir):
+        return []
+    hashes = set()
+    for name in os.listdir(images_dir):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(images_dir, name), "rb") as f:
+                hashes.add(hashlib.sha1(f.read()).hexdigest())
+    return sorted(hashes)
+
+def text_similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures"""
+    return float(np.mean(sig_a == sig_b))
+
+def image_similarity(hashes_a: list, hashes_b: list) -> float:
+    a, b = set(hashes_a), set(hashes_b)
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+def _band_keys(signature: np.ndarray) -> list:
+    bands = signature.reshape(BANDS, ROWS_PER_BAND)
+    return [hashlib.blake2b(band.tobytes(), digest_size=8).hexdigest() for band in bands]
+
+def text_diff(old_text: str, new_text: str, limit: int = 50) -> dict:
+    """Lines added/removed between two clean-text bodies"""
+    added, removed = [], []
+    for line in difflib.ndiff(old_text.splitlines(), new_text.splitlines()):
+        if line.startswith("+ "):
+            added.append(line[2:])
+        elif line.startswith("- "):
+            removed.append(line[2:])
+    return {"added_lines": added[:limit], "removed_lines": removed[:limit],
+            "total_added": len(added), "total_removed": len(removed)}
+
+class FingerprintIndex:
+    """SQLite-backed LSH index of email fingerprints
+
+    Candidates share at least one MinHash band with the query; they are then
+    verified against the full signature and the image hash sets. Lookups are
+    restricted to the same sender domain, since only a brand's own templates
+    should stand in for each other.
+    """
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    message_id TEXT PRIMARY KEY,
+                    sender_domain TEXT,
+                    signature BLOB NOT NULL,
+                    image_hashes TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS fingerprint_bands (
+                    band INTEGER NOT NULL,
+                    bucket TEXT NOT NULL,
+                    message_id TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_fingerprint_bands ON fingerprint_bands (band, bucket);
+                CREATE INDEX IF NOT EXISTS idx_fingerprint_bands_message ON fingerprint_bands (message_id);
+            """)
+
+    def add(self, message_id: str, sender_domain: str, signature: np.ndarray, hashes: list):
+        signature = np.asarray(signature, dtype=np.int64)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM fingerprint_bands WHERE message_id = ?", (message_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fingerprints (message_id, sender_domain, signature, image_hashes) "
+                "VALUES (?, ?, ?, ?)",
+                (message_id, sender_domain, signature.tobytes(), json.dumps(hashes))
+            )
+            self._conn.executemany(
+                "INSERT INTO fingerprint_bands (band, bucket, message_id) VALUES (?, ?, ?)",
+                [(band, key, message_id) for band, key in enumerate(_band_keys(signature))]
+            )
+
+    def find_duplicate(self, sender_domain: str, signature: np.ndarray, hashes: list,
+                       threshold: float = 0.9, image_threshold: float = 0.5, exclude: str = None):
+        """Best stored match at or above both thresholds, or None
+
+        Only emails from the same sender domain are candidates; with no
+        sender domain there is nothing to group by, so there is no match.
+        """
+        if not sender_domain:
+            return None
+        signature = np.asarray(signature, dtype=np.int64)
+        keys = _band_keys(signature)
+        clause = " OR ".join("(b.band = ? AND b.bucket = ?)" for _ in keys)
+        params = [value for band, key in enumerate(keys) for value in (band, key)]
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT DISTINCT f.message_id, f.signature, f.image_hashes "
+                f"FROM fingerprint_bands b JOIN fingerprints f ON f.message_id = b.message_id "
+                f"WHERE ({clause}) AND f.sender_domain = ?",
+                params + [sender_domain]
+            ).fetchall()
+
+        best = None
+        for message_id, blob, stored_hashes in rows:
+            if message_id == exclude:
+                continue
+            text_sim = text_similarity(signature, np.frombuffer(blob, dtype=np.int64))
+            img_sim = image_similarity(hashes, json.loads(stored_hashes))
+            if text_sim >= threshold and img_sim >= image_threshold:
+                if best is None or (text_sim, img_sim) > (best["text_similarity"], best["image_similarity"]):
+                    best = {"message_id": message_id, "text_similarity": round(text_sim, 3),
+                            "image_similarity": round(img_sim, 3)}
+        return best
+
+    def close(self):
+        self._conn.close()
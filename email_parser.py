@@ -1,13 +1,17 @@
 import email
 from email.header import decode_header
-import base64
 import os
-from gmail_fetch import fetch_emails_from_sender
+from pipeline_metrics import get_metrics
 
 def parse_email_content(raw_email):
     """Parse raw email and extract structured content"""
-    msg = email.message_from_bytes(raw_email)
-    
+    with get_metrics().stage("parse"):
+        parsed_data = _parse_message(email.message_from_bytes(raw_email))
+    get_metrics().add_images(len(parsed_data['images']), "parse")
+    return parsed_data
+
+def _parse_message(msg):
+    """Structured content of an email.message.Message"""
     # Decode subject
     subject = decode_header(msg["Subject"])[0][0]
     if isinstance(subject, bytes):
@@ -17,6 +21,7 @@ def parse_email_content(raw_email):
         'subject': subject,
         'from': msg.get("From"),
         'date': msg.get("Date"),
+        'message_id': (msg.get("Message-ID") or "").strip() or None,
         'text_body': '',
         'html_body': '',
         'images': []
@@ -73,19 +78,25 @@ def save_images(parsed_email, output_dir="images"):
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
+    metrics = get_metrics()
     saved_images = []
-    for i, image in enumerate(parsed_email['images']):
-        filename = image['filename'] or f"image_{i}.jpg"
-        filepath = os.path.join(output_dir, filename)
-        
-        with open(filepath, 'wb') as f:
-            f.write(image['data'])
-        
-        saved_images.append(filepath)
+    with metrics.stage("save_images"):
+        for i, image in enumerate(parsed_email['images']):
+            filename = image['filename'] or f"image_{i}.jpg"
+            filepath = os.path.join(output_dir, filename)
+            
+            with open(filepath, 'wb') as f:
+                f.write(image['data'])
+            metrics.add_bytes_written(len(image['data']), "save_images")
+            
+            saved_images.append(filepath)
+    metrics.add_images(len(saved_images), "save_images")
     
     return saved_images
 
 if __name__ == "__main__":
+    from gmail_fetch import fetch_emails_from_sender
+    
     # Fetch and parse emails
     emails = fetch_emails_from_sender("newsfeed@on.com", limit=1)
     
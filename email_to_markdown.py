@@ -2,8 +2,7 @@ import os
 import re
 from datetime import datetime
 from bs4 import BeautifulSoup
-from email_parser import parse_email_content, save_images
-from gmail_fetch import fetch_emails_from_sender
+from pipeline_metrics import get_metrics
 
 def html_to_markdown(html_content):
     """Convert HTML to basic Markdown"""
@@ -36,17 +35,43 @@ def html_to_markdown(html_content):
     
     return soup.get_text()
 
-def save_email_as_markdown(parsed_email, output_dir="emails"):
-    """Save email content as Markdown file"""
+def save_email_as_markdown(parsed_email, output_dir="emails", filename=None):
+    """Save email content as Markdown file
+    
+    filename defaults to one derived from the subject. Files whose content is
+    unchanged are left alone, so re-running on the same email rewrites nothing.
+    """
+    metrics = get_metrics()
+    with metrics.stage("markdown"):
+        filepath, written = _write_markdown(parsed_email, output_dir, filename)
+    metrics.add_bytes_written(written["markdown"], "markdown")
+    metrics.add_bytes_written(written["markdown_images"], "markdown_images")
+    metrics.add_images(len(parsed_email['images']), "markdown_images")
+    return filepath
+
+def _write_if_changed(path, data: bytes) -> int:
+    """Write data to path unless it already holds exactly that; returns bytes written"""
+    if os.path.exists(path) and os.path.getsize(path) == len(data):
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return 0
+    with open(path, 'wb') as f:
+        f.write(data)
+    return len(data)
+
+def _write_markdown(parsed_email, output_dir, filename=None):
+    """Write the Markdown file (and its images) for one parsed email; returns (path, bytes written)"""
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
-    # Create safe filename from subject
-    subject = parsed_email['subject']
-    safe_filename = re.sub(r'[^\w\s-]', '', subject).strip()
-    safe_filename = re.sub(r'[-\s]+', '-', safe_filename)
-    filename = f"{safe_filename}.md"
+    if filename is None:
+        # Create safe filename from subject
+        subject = parsed_email['subject']
+        safe_filename = re.sub(r'[^\w\s-]', '', subject).strip()
+        safe_filename = re.sub(r'[-\s]+', '-', safe_filename) or "email"
+        filename = f"{safe_filename}.md"
     filepath = os.path.join(output_dir, filename)
+    written = {"markdown": 0, "markdown_images": 0}
     
     # Save images and get paths
     image_paths = []
@@ -59,8 +84,7 @@ def save_email_as_markdown(parsed_email, output_dir="emails"):
             img_filename = image['filename'] or f"image_{i}.jpg"
             img_path = os.path.join(image_dir, img_filename)
             
-            with open(img_path, 'wb') as f:
-                f.write(image['data'])
+            written["markdown_images"] += _write_if_changed(img_path, image['data'])
             
             image_paths.append(f"images/{img_filename}")
     
@@ -68,8 +92,11 @@ def save_email_as_markdown(parsed_email, output_dir="emails"):
     markdown_content = f"""# {parsed_email['subject']}
 
 **From:** {parsed_email['from']}  
-**Date:** {parsed_email['date']}
-
+**Date:** {parsed_email['date']}  
+"""
+    if parsed_email.get('message_id'):
+        markdown_content += f"**Message-ID:** {parsed_email['message_id']}\n"
+    markdown_content += """
 ---
 
 """
@@ -87,12 +114,14 @@ def save_email_as_markdown(parsed_email, output_dir="emails"):
             markdown_content += f"![Image]({img_path})\n\n"
     
     # Save to file
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(markdown_content)
+    written["markdown"] = _write_if_changed(filepath, markdown_content.encode('utf-8'))
     
-    return filepath
+    return filepath, written
 
 if __name__ == "__main__":
+    from email_parser import parse_email_content
+    from gmail_fetch import fetch_emails_from_sender
+    
     # Fetch and convert email to Markdown
     emails = fetch_emails_from_sender("newsfeed@on.com", limit=1)
     
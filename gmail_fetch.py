@@ -2,55 +2,145 @@ import imaplib
 import email
 from email.header import decode_header
 import os
-from dotenv import load_dotenv
+from pipeline_metrics import get_metrics
+from rate_limiter import get_scheduler
 
-load_dotenv()
+# Gmail allows at most 15 simultaneous IMAP connections per account
+GMAIL_MAX_CONNECTIONS = 15
+
+class IMAPConnectionLost(Exception):
+    """The IMAP connection dropped mid-command; reconnect before trying again
+    
+    Deliberately not an IMAP4.abort: the scheduler would retry it on the same
+    dead socket. Callers that hold a connection catch this and reconnect.
+    """
 
 def connect_gmail():
     """Connect to Gmail IMAP server"""
-    mail = imaplib.IMAP4_SSL("imap.gmail.com")
+    # Credentials are only needed here, so .env is read on first connect rather than on import
+    from dotenv import load_dotenv
+    load_dotenv()
     email_user = os.getenv('GMAIL_USER')
     email_pass = os.getenv('GMAIL_APP_PASSWORD')
     
     if not email_user or not email_pass:
         raise ValueError("Gmail credentials not found in environment variables")
     
-    mail.login(email_user, email_pass)
+    with get_metrics().stage("imap_connect"):
+        # "Too many simultaneous connections" is retried with backoff like any throttle
+        return get_scheduler("imap").call(_login, email_user, email_pass)
+
+def _login(email_user, email_pass):
+    mail = imaplib.IMAP4_SSL("imap.gmail.com")
+    try:
+        mail.login(email_user, email_pass)
+    except Exception:
+        mail.shutdown()
+        raise
     return mail
 
+def _imap_command(method, *args):
+    """Run one IMAP command through the shared IMAP scheduler
+    
+    A NO/BAD reply raises, so Gmail's [THROTTLED] responses are paced and
+    retried instead of being mistaken for an empty result. A dropped
+    connection raises IMAPConnectionLost at once.
+    """
+    def run():
+        try:
+            status, data = method(*args)
+        except (imaplib.IMAP4.abort, OSError) as e:
+            raise IMAPConnectionLost(f"{type(e).__name__}: {e}") from e
+        if status != "OK":
+            raise imaplib.IMAP4.error(f"{status} {data!r}")
+        return status, data
+    return get_scheduler("imap").call(run)
+
+def select_inbox(mail):
+    """SELECT the inbox through the IMAP scheduler, like every other command"""
+    return _imap_command(mail.select, "inbox")
+
+def open_inbox():
+    """A new connection with the inbox selected; logged out again if SELECT fails"""
+    mail = connect_gmail()
+    try:
+        select_inbox(mail)
+    except Exception:
+        close_mailbox(mail)
+        raise
+    return mail
+
+def close_mailbox(mail):
+    """CLOSE and LOGOUT, ignoring errors: the session may never have selected, or already be gone"""
+    try:
+        mail.close()
+    except Exception:
+        # CLOSE is only valid after a successful SELECT; LOGOUT still has to run
+        pass
+    try:
+        mail.logout()
+    except Exception:
+        pass
+
 def fetch_emails_from_sender(sender_email="newsfeed@on.com", limit=10):
     """Fetch emails from specific sender"""
+    metrics = get_metrics()
     mail = connect_gmail()
-    mail.select("inbox")
     
     # Search for emails from specific sender
-    status, messages = mail.search(None, f'FROM "{sender_email}"')
+    with metrics.stage("imap_search"):
+        select_inbox(mail)
+        status, messages = _imap_command(mail.search, None, f'FROM "{sender_email}"')
     email_ids = messages[0].split()
     
     emails = []
     for email_id in email_ids[-limit:]:  # Get latest emails
-        status, msg_data = mail.fetch(email_id, "(RFC822)")
+        with metrics.stage("imap_fetch", email=email_id.decode()):
+            status, msg_data = _imap_command(mail.fetch, email_id, "(RFC822)")
         raw_email = msg_data[0][1]
-        email_message = email.message_from_bytes(raw_email)
-        
-        # Decode subject
-        subject = decode_header(email_message["Subject"])[0][0]
-        if isinstance(subject, bytes):
-            subject = subject.decode()
-        
-        email_obj = {
-            'id': email_id.decode(),
-            'subject': subject,
-            'from': email_message.get("From"),
-            'date': email_message.get("Date"),
-            'raw_email': raw_email
-        }
-        emails.append(email_obj)
-    
-    mail.close()
-    mail.logout()
+        metrics.add_bytes_fetched(len(raw_email), "imap_fetch", email=email_id.decode())
+        emails.append(_email_obj(email_id.decode(), raw_email))
+    
+    close_mailbox(mail)
     return emails
 
+def _email_obj(email_id, raw_email):
+    """Header summary + raw bytes of one fetched message"""
+    email_message = email.message_from_bytes(raw_email)
+    
+    # Decode subject
+    subject = decode_header(email_message["Subject"])[0][0]
+    if isinstance(subject, bytes):
+        subject = subject.decode()
+    
+    return {
+        'id': email_id,
+        'subject': subject,
+        'from': email_message.get("From"),
+        'date': email_message.get("Date"),
+        'message_id': (email_message.get("Message-ID") or "").strip() or None,
+        'raw_email': raw_email
+    }
+
+def search_email_uids(mail, sender_email="newsfeed@on.com", limit=10):
+    """UIDs of the latest emails from sender_email
+    
+    Unlike the sequence numbers fetch_emails_from_sender uses, UIDs stay valid
+    across IMAP connections, so several workers can fetch them in parallel.
+    """
+    with get_metrics().stage("imap_search"):
+        select_inbox(mail)
+        status, data = _imap_command(mail.uid, "search", None, f'FROM "{sender_email}"')
+    return [uid.decode() for uid in data[0].split()][-limit:]
+
+def fetch_email_by_uid(mail, uid):
+    """Fetch one email by UID on an already connected, inbox-selected mailbox"""
+    with get_metrics().stage("imap_fetch", email=uid):
+        status, msg_data = _imap_command(mail.uid, "fetch", uid, "(RFC822)")
+    raw_email = msg_data[0][1]
+    get_metrics().add_bytes_fetched(len(raw_email), "imap_fetch", email=uid)
+    return _email_obj(uid, raw_email)
+
 if __name__ == "__main__":
     try:
         emails = fetch_emails_from_sender()
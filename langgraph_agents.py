@@ -1,46 +1,169 @@
 import os
 import json
 import base64
+import hashlib
+import asyncio
+import threading
+import httpx
+from concurrent.futures import ThreadPoolExecutor
 from typing import TypedDict, Annotated
 from datetime import datetime
+from email.utils import parseaddr
 from dotenv import load_dotenv
 from langgraph.graph import StateGraph, END
-from langchain_core.messages import HumanMessage
-from langchain_openai import ChatOpenAI
+from langchain_core.messages import AIMessage, HumanMessage
+from pydantic import ValidationError
+from langchain_core.runnables import RunnableConfig
+from dna_events import JsonlEventSink, make_event, emit_event
+from dna_checkpoint import ImageProgressStore, open_checkpointer, thread_id_for
+from markdown_extract import extract_raw_content
+from dna_store import DNAResultStore
+from email_embeddings import EmbeddingIndex, create_embeddings
+from email_fingerprint import FingerprintIndex, image_hashes, minhash_signature, offer_numbers, text_diff
+from dna_schemas import (AnalysisFallbackError, ContentDNA, ImageAnalysis, StructuredOutputError,
+                         fallback_reasons, record_parse_stat)
+from pipeline_metrics import get_metrics, timed_node
+from llm_backends import create_chat_models, estimate_prompt_tokens
+from rate_limiter import RateLimitScheduler, get_scheduler
 
 load_dotenv()
 
+# Extra LLM round-trips allowed to repair output that fails schema validation
+JSON_REPAIR_ATTEMPTS = 2
+
 class EmailDNAState(TypedDict):
     email_content: str
     images_dir: str
+    message_id: str
+    raw_data: dict
+    fingerprint: dict
+    duplicate_of: dict
     content_analysis: dict
     image_analysis: dict
     final_dna: dict
     status: str
 
+def create_http_client(max_connections: int = 20) -> httpx.Client:
+    """Pooled keep-alive HTTP client shared by every LLM client in the process"""
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    return httpx.Client(limits=limits, timeout=httpx.Timeout(120.0, connect=10.0))
+
 class EmailDNAAgents:
-    def __init__(self):
-        self.llm = ChatOpenAI(
-            model="gpt-4o",
-            openai_api_key=os.getenv('OPENAI_API_KEY'),
-            temperature=0.3
-        )
-        self.vision_llm = ChatOpenAI(
-            model="gpt-4o",
-            openai_api_key=os.getenv('OPENAI_API_KEY'),
-            temperature=0.2,
-            max_tokens=1000
-        )
+    def __init__(self, http_client: httpx.Client = None, store: DNAResultStore = None,
+                 fingerprints: FingerprintIndex = None, dedupe_threshold: float = 0.9,
+                 embedding_index: EmbeddingIndex = None, llm_backend: str = None,
+                 llm=None, vision_llm=None, scheduler: RateLimitScheduler = None):
+        self.store = store
+        self.embedding_index = embedding_index
+        self.fingerprints = fingerprints
+        self.dedupe_threshold = dedupe_threshold
+        # Backend from llm_backend or $DNA_LLM_BACKEND ("openai" or "fake"); explicit models win
+        if llm is None or vision_llm is None:
+            default_llm, default_vision_llm = create_chat_models(llm_backend, http_client)
+            llm = llm or default_llm
+            vision_llm = vision_llm or default_vision_llm
+        self.llm = llm
+        self.vision_llm = vision_llm
+        # Shared by every analyzer in the process: they all draw on one API key's limits
+        self.scheduler = scheduler or get_scheduler("llm")
+    
+    def fingerprint_agent(self, state: EmailDNAState) -> EmailDNAState:
+        """Agent to fingerprint the email and look up near-duplicates of earlier sends
+
+        Always runs first, so it also extracts the raw data every later agent reads.
+        """
+        raw_data = self._raw_data(state)
+        state["fingerprint"] = {}
+        state["duplicate_of"] = {}
+        if not (self.fingerprints and self.store):
+            state["status"] = "fingerprint_skipped"
+            return state
+        
+        print("🔎 Fingerprint Agent: Checking for near-duplicate sends...")
+        original = raw_data["original_email"]
+        sender_domain = parseaddr(original["sender"])[1].rpartition("@")[2].lower() or None
+        signature = minhash_signature(original["full_body_text"])
+        hashes = image_hashes(state["images_dir"])
+        message_id = self._resolve_message_id(state, {"raw_data": raw_data})
+        
+        match = self.fingerprints.find_duplicate(sender_domain, signature, hashes,
+                                                 threshold=self.dedupe_threshold, exclude=message_id)
+        if match:
+            match = self._reusable(match, original["full_body_text"])
+        if match:
+            print(f"  Near-duplicate of {match['message_id']} (text {match['text_similarity']}, images {match['image_similarity']})")
+        
+        state["fingerprint"] = {"sender_domain": sender_domain, "signature": signature.tolist(), "image_hashes": hashes}
+        state["duplicate_of"] = match or {}
+        state["status"] = "fingerprinted"
+        return state
+    
+    def _reusable(self, match: dict, text: str):
+        """The match, unless its stored DNA is missing, a fallback, or for a different offer"""
+        stored = self.store.get(match["message_id"])
+        if stored is None:
+            return None
+        reasons = fallback_reasons(stored)
+        if reasons:
+            print(f"  Near-duplicate {match['message_id']} only has fallback DNA ({'; '.join(reasons)}); analyzing")
+            return None
+        previous_text = stored["email_dna"].get("raw_data", {}).get("original_email", {}).get("full_body_text", "")
+        previous_offer, offer = offer_numbers(previous_text), offer_numbers(text)
+        if previous_offer != offer:
+            print(f"  Near-duplicate {match['message_id']} has a different offer "
+                  f"({', '.join(previous_offer) or 'none'} -> {', '.join(offer) or 'none'}); analyzing")
+            return None
+        return match
+    
+    def dna_reuser(self, state: EmailDNAState) -> EmailDNAState:
+        """Agent to reuse a near-duplicate's stored DNA instead of re-running the LLM agents"""
+        match = state["duplicate_of"]
+        print(f"♻️  DNA Reuser: Reusing DNA of {match['message_id']}...")
+        
+        raw_data = self._raw_data(state)
+        message_id = self._resolve_message_id(state, {"raw_data": raw_data})
+        
+        dna = self.store.get(match["message_id"])["email_dna"]
+        previous_text = dna.get("raw_data", {}).get("original_email", {}).get("full_body_text", "")
+        
+        # This send's own raw data; the LLM-derived DNA carries over from the template
+        dna.setdefault("raw_data", {}).update({
+            "original_email": raw_data["original_email"],
+            "extracted_links": raw_data["extracted_links"],
+            "image_references": raw_data["image_references"],
+            "content_sections": raw_data["content_sections"],
+            "content_stats": raw_data["content_stats"]
+        })
+        dna.setdefault("meta_data", {}).update({
+            "message_id": message_id,
+            "analysis_timestamp": datetime.now().isoformat(),
+            "reused_from": dict(match, template_diff=text_diff(previous_text, raw_data["original_email"]["full_body_text"]))
+        })
+        final_dna = {"email_dna": dna}
+        
+        self.store.save(message_id, final_dna)
+        self._index_fingerprint(message_id, state)
+        if self.embedding_index is not None:
+            self.embedding_index.add_dna(message_id, final_dna)
+        
+        state["message_id"] = message_id
+        state["final_dna"] = final_dna
+        state["status"] = "complete"
+        return state
+    
+    def _index_fingerprint(self, message_id: str, state: EmailDNAState):
+        fingerprint = state.get("fingerprint") or {}
+        if self.fingerprints and fingerprint:
+            self.fingerprints.add(message_id, fingerprint["sender_domain"],
+                                  fingerprint["signature"], fingerprint["image_hashes"])
     
     def content_agent(self, state: EmailDNAState) -> EmailDNAState:
         """Agent to extract RAW data + analyze email content"""
         print("📄 Content Agent: Extracting raw data + analyzing...")
         
-        with open(state["email_content"], 'r', encoding='utf-8') as f:
-            raw_content = f.read()
-        
-        # Extract raw data first
-        raw_data = self._extract_raw_content(raw_content)
+        raw_data = self._raw_data(state)
+        # The Markdown minus per-send headers such as the Message-ID
+        raw_content = raw_data["original_email"]["raw_markdown"]
         
         # Then analyze
         prompt = f"""
@@ -102,19 +225,14 @@ class EmailDNAAgents:
         }}
         """
         
+        fallback_error = None
         try:
-            response = self.llm.invoke([HumanMessage(content=prompt)])
-            content_text = response.content.strip()
-            if content_text.startswith('```json'):
-                content_text = content_text[7:]
-            if content_text.startswith('```'):
-                content_text = content_text[3:]
-            if content_text.endswith('```'):
-                content_text = content_text[:-3]
-            
-            content_analysis = json.loads(content_text.strip())
+            content_analysis = self._invoke_structured(self.llm, [HumanMessage(content=prompt)], ContentDNA, "content")
         except Exception as e:
             print(f"Content analysis error: {e}")
+            record_parse_stat("content_fallbacks")
+            # Keeps the workflow going, but dna_synthesizer marks the result as a fallback
+            fallback_error = f"{type(e).__name__}: {e}"
             content_analysis = {
                 "subject_line_dna": {"text": "Welcome", "length": 7, "emotional_triggers": ["welcome"], "power_words": [], "personalization_level": "basic", "urgency_indicators": [], "predicted_open_rate": "medium"},
                 "content_structure_dna": {"word_count": 200, "paragraph_count": 3, "opening_hook_type": "benefit", "value_propositions": ["membership benefits"], "social_proof_elements": [], "scarcity_signals": [], "closing_technique": "benefit"},
@@ -127,124 +245,54 @@ class EmailDNAAgents:
         # Combine raw data + analysis
         state["content_analysis"] = {
             "raw_data": raw_data,
-            "analysis": content_analysis
+            "analysis": content_analysis,
+            "fallback_error": fallback_error
         }
         state["status"] = "content_analyzed"
         return state
     
+    def _invoke_structured(self, llm, messages: list, schema, label: str) -> dict:
+        """Call llm in JSON mode and validate the reply against schema
+        
+        A reply that isn't valid JSON or doesn't match the schema is sent back with
+        the validation errors for up to JSON_REPAIR_ATTEMPTS repairs; after that
+        StructuredOutputError is raised and the caller falls back to its defaults,
+        which dna_synthesizer flags in meta_data.analysis_status.
+        Calls go through the rate-limit scheduler, which paces and retries 429s.
+        """
+        json_llm = llm.bind(response_format={"type": "json_object"})
+        for attempt in range(JSON_REPAIR_ATTEMPTS + 1):
+            response = self.scheduler.call(json_llm.invoke, messages, tokens=estimate_prompt_tokens(messages))
+            get_metrics().record_llm_call(response, label, model=getattr(llm, "model_name", None))
+            try:
+                parsed = schema.model_validate_json(response.content)
+            except ValidationError as e:
+                record_parse_stat(f"{label}_parse_failures")
+                errors = "; ".join(f"{'.'.join(str(p) for p in err['loc']) or 'body'}: {err['msg']}"
+                                   for err in e.errors()[:10])
+                last_error = f"{errors} (raw: {response.content[:200]}...)"
+                messages = messages + [
+                    AIMessage(content=response.content),
+                    HumanMessage(content=f"That reply failed validation: {errors}. "
+                                         f"Return ONLY the corrected JSON object.")
+                ]
+                continue
+            if attempt:
+                record_parse_stat(f"{label}_repaired")
+            return parsed.model_dump()
+        raise StructuredOutputError(f"{label} output invalid after {JSON_REPAIR_ATTEMPTS} repairs: {last_error}")
+    
+    def _raw_data(self, state: EmailDNAState) -> dict:
+        """The email's raw data, extracted from the Markdown file on first use"""
+        # Checkpoints from before raw_data was kept in the state have none
+        if not state.get("raw_data"):
+            with open(state["email_content"], 'r', encoding='utf-8') as f:
+                state["raw_data"] = self._extract_raw_content(f.read())
+        return state["raw_data"]
+    
     def _extract_raw_content(self, content: str) -> dict:
-        """Extract raw email data from markdown format"""
-        import re
-        
-        # Extract subject line from markdown header
-        subject_match = re.search(r'^#\s*(.+)', content, re.MULTILINE)
-        subject = subject_match.group(1).strip() if subject_match else "No subject found"
-        
-        # Extract sender info
-        sender_match = re.search(r'\*\*From:\*\*\s*(.+)', content)
-        sender = sender_match.group(1).strip() if sender_match else "Unknown sender"
-        
-        # Extract date
-        date_match = re.search(r'\*\*Date:\*\*\s*(.+)', content)
-        date = date_match.group(1).strip() if date_match else "Unknown date"
-        
-        # Extract all links with better parsing
-        links = []
-        
-        # Markdown image links: [![text](image)](url)
-        image_links = re.findall(r'\[!\[([^\]]+)\]\([^\)]+\)\]\(([^\)]+)\)', content)
-        for text, url in image_links:
-            links.append({
-                "url": url,
-                "anchor_text": text,
-                "link_type": "image_link",
-                "position": "body"
-            })
-        
-        # Regular markdown links: [text](url)
-        markdown_links = re.findall(r'(?<!!)\[([^\]]+)\]\(([^\)]+)\)', content)
-        for text, url in markdown_links:
-            # Skip if it's part of an image link
-            if not url.startswith('images/'):
-                links.append({
-                    "url": url,
-                    "anchor_text": text,
-                    "link_type": "text_link",
-                    "position": "body"
-                })
-        
-        # Image references: ![alt](image_path)
-        images = re.findall(r'!\[([^\]]+)\]\(([^\)]+)\)', content)
-        image_refs = []
-        for alt_text, img_path in images:
-            image_refs.append({
-                "alt_text": alt_text,
-                "image_path": img_path,
-                "image_type": "embedded_image"
-            })
-        
-        # Extract main content sections
-        sections = []
-        
-        # Benefits section
-        benefits_match = re.search(r'## Your benefits\.\.\.(.+?)(?=##|---|\n\n©)', content, re.DOTALL)
-        if benefits_match:
-            benefits_text = benefits_match.group(1).strip()
-            # Extract individual benefits
-            benefit_links = re.findall(r'\*\*\[([^\]]+)\]\([^\)]+\)\*\*', benefits_text)
-            sections.append({
-                "section_type": "benefits",
-                "content": benefits_text,
-                "benefits_list": benefit_links
-            })
-        
-        # Main message section
-        main_msg_match = re.search(r'## Enjoy your unlocked benefits(.+?)## Your benefits', content, re.DOTALL)
-        if main_msg_match:
-            main_message = main_msg_match.group(1).strip()
-            sections.append({
-                "section_type": "main_message",
-                "content": main_message
-            })
-        
-        # Footer section
-        footer_match = re.search(r'\*\*Follow us:\*\*(.+?)(?=---|\n\nYou are receiving)', content, re.DOTALL)
-        if footer_match:
-            footer_content = footer_match.group(1).strip()
-            social_links = re.findall(r'\[([^\]]+)\]\([^\)]+\)', footer_content)
-            sections.append({
-                "section_type": "footer_social",
-                "content": footer_content,
-                "social_platforms": social_links
-            })
-        
-        # Clean text without markdown
-        clean_text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', content)  # Remove links, keep text
-        clean_text = re.sub(r'!\[[^\]]*\]\([^\)]+\)', '', clean_text)  # Remove images
-        clean_text = re.sub(r'\*\*([^\*]+)\*\*', r'\1', clean_text)  # Remove bold
-        clean_text = re.sub(r'#+\s*', '', clean_text)  # Remove headers
-        clean_text = re.sub(r'---+', '', clean_text)  # Remove dividers
-        clean_text = '\n'.join(line.strip() for line in clean_text.split('\n') if line.strip())
-        
-        return {
-            "original_email": {
-                "subject_line": subject,
-                "sender": sender,
-                "date": date,
-                "full_body_text": clean_text,
-                "raw_markdown": content
-            },
-            "extracted_links": links,
-            "image_references": image_refs,
-            "content_sections": sections,
-            "content_stats": {
-                "total_characters": len(content),
-                "total_words": len(clean_text.split()),
-                "total_links": len(links),
-                "total_images": len(image_refs),
-                "format_type": "markdown"
-            }
-        }
+        """Extract raw email data from markdown format (see markdown_extract)"""
+        return extract_raw_content(content)
     
     def analyze_single_image(self, image_path: str, filename: str) -> dict:
         """Analyze a single image using OpenAI Vision API"""
@@ -304,46 +352,17 @@ class EmailDNAAgents:
             }}
             """
             
-            response = self.vision_llm.invoke([
+            messages = [
                 HumanMessage(content=[
                     {"type": "text", "text": prompt},
                     {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
                 ])
-            ])
-            
-            # Clean the response content to extract JSON
-            content = response.content.strip()
-            
-            # Remove markdown code blocks if present
-            if content.startswith('```json'):
-                content = content[7:]
-            if content.startswith('```'):
-                content = content[3:]
-            if content.endswith('```'):
-                content = content[:-3]
-            
-            content = content.strip()
-            
-            # Try to parse JSON
-            try:
-                return json.loads(content)
-            except json.JSONDecodeError:
-                # If still fails, try to find JSON in the response
-                import re
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    return json.loads(json_match.group())
-                else:
-                    raise ValueError(f"No valid JSON found in response: {content[:200]}...")
+            ]
+            return self._invoke_structured(self.vision_llm, messages, ImageAnalysis, "image")
             
         except Exception as e:
             print(f"Error analyzing {filename}: {str(e)}")
-            # Print the actual response for debugging
-            try:
-                if 'response' in locals():
-                    print(f"Raw response: {response.content[:300]}...")
-            except:
-                pass
+            record_parse_stat("image_fallbacks")
             
             return {
                 "filename": filename,
@@ -355,13 +374,19 @@ class EmailDNAAgents:
                 "recommendations": ["Unable to analyze - check image format and accessibility"]
             }
     
-    def image_agent(self, state: EmailDNAState) -> EmailDNAState:
+    def image_agent(self, state: EmailDNAState, config: RunnableConfig = None) -> EmailDNAState:
         """Agent to analyze email images using OpenAI Vision API"""
         print("🖼️ Image Agent: Analyzing visual elements with AI Vision...")
         
         images_dir = state["images_dir"]
         image_analyses = []
         
+        # Images finished by an earlier, interrupted run of this thread
+        configurable = (config or {}).get("configurable") or {}
+        progress = configurable.get("image_progress")
+        thread_id = configurable.get("thread_id")
+        completed = progress.load(thread_id) if progress and thread_id else {}
+        
         # Get all image files
         if os.path.exists(images_dir):
             image_files = [f for f in os.listdir(images_dir) 
@@ -370,10 +395,18 @@ class EmailDNAAgents:
             print(f"Found {len(image_files)} images to analyze...")
             
             for img_file in image_files:
+                if img_file in completed:
+                    print(f"  Resuming (already analyzed): {img_file}")
+                    image_analyses.append(completed[img_file])
+                    continue
                 print(f"  Analyzing: {img_file}")
                 img_path = os.path.join(images_dir, img_file)
                 analysis = self.analyze_single_image(img_path, img_file)
+                get_metrics().add_images(1, "image_agent")
                 image_analyses.append(analysis)
+                if progress and thread_id and "error" not in analysis:
+                    progress.save(thread_id, img_file, analysis)
+                emit_event(config, "image_analysis", state["email_content"], analysis)
         else:
             print(f"Images directory not found: {images_dir}")
         
@@ -431,13 +464,24 @@ class EmailDNAAgents:
         # Generate actionable recommendations
         recommendations = self._generate_recommendations(content, visuals, overall_score)
         
+        message_id = self._resolve_message_id(state, content)
+        
+        # Canned defaults stood in for a failed LLM call: say so in the DNA itself
+        fallbacks = [f"image {img.get('filename', 'unknown')}: {img['error']}"
+                     for img in visuals.get("individual_analyses", []) if "error" in img]
+        if content.get("fallback_error"):
+            fallbacks.insert(0, f"content: {content['fallback_error']}")
+        
         final_dna = {
             "email_dna": {
                 "meta_data": {
+                    "message_id": message_id,
                     "email_type": email_type,
                     "overall_effectiveness_score": overall_score,
                     "content_score": content_score,
                     "visual_score": visual_score,
+                    "analysis_status": "fallback" if fallbacks else "complete",
+                    "fallback_reasons": fallbacks,
                     "analysis_timestamp": datetime.now().isoformat()
                 },
                 "raw_data": {
@@ -456,10 +500,30 @@ class EmailDNAAgents:
             }
         }
         
+        if fallbacks:
+            # Never stored, fingerprinted or embedded, so nothing reuses or compares against it
+            print(f"⚠️  {message_id}: analysis fell back to defaults ({'; '.join(fallbacks)})")
+        else:
+            if self.store:
+                self.store.save(message_id, final_dna)
+                self._index_fingerprint(message_id, state)
+            if self.embedding_index is not None:
+                self.embedding_index.add_dna(message_id, final_dna)
+        
+        state["message_id"] = message_id
         state["final_dna"] = final_dna
-        state["status"] = "complete"
+        state["status"] = "fallback" if fallbacks else "complete"
         return state
     
+    def _resolve_message_id(self, state: EmailDNAState, content: dict) -> str:
+        """Message-ID from the input, else from the Markdown header, else a content hash"""
+        original = content.get("raw_data", {}).get("original_email", {})
+        message_id = state.get("message_id") or original.get("message_id")
+        if message_id:
+            return message_id
+        raw_markdown = original.get("raw_markdown", "")
+        return "sha1:" + hashlib.sha1(raw_markdown.encode("utf-8")).hexdigest()
+    
     def _calculate_content_score(self, content: dict) -> float:
         """Calculate content effectiveness score"""
         score = 5.0  # Base score
@@ -589,53 +653,326 @@ class EmailDNAAgents:
             }
         }
 
-def create_email_dna_workflow():
+def route_after_fingerprint(state: EmailDNAState) -> str:
+    """Skip the LLM agents when a near-duplicate with stored DNA was found"""
+    return "dna_reuser" if state.get("duplicate_of") else "content_agent"
+
+def create_email_dna_workflow(agents: EmailDNAAgents = None, checkpointer=None):
     """Create LangGraph workflow for email DNA generation"""
-    agents = EmailDNAAgents()
+    agents = agents or EmailDNAAgents()
     
     workflow = StateGraph(EmailDNAState)
     
-    # Add nodes
-    workflow.add_node("content_agent", agents.content_agent)
-    workflow.add_node("image_agent", agents.image_agent)
-    workflow.add_node("dna_synthesizer", agents.dna_synthesizer)
+    # Add nodes (each run is timed per email in pipeline_metrics)
+    for name in ("fingerprint_agent", "dna_reuser", "content_agent", "image_agent", "dna_synthesizer"):
+        workflow.add_node(name, timed_node(name, getattr(agents, name)))
     
     # Define edges
-    workflow.set_entry_point("content_agent")
+    workflow.set_entry_point("fingerprint_agent")
+    workflow.add_conditional_edges("fingerprint_agent", route_after_fingerprint,
+                                   {"dna_reuser": "dna_reuser", "content_agent": "content_agent"})
+    workflow.add_edge("dna_reuser", END)
     workflow.add_edge("content_agent", "image_agent")
     workflow.add_edge("image_agent", "dna_synthesizer")
     workflow.add_edge("dna_synthesizer", END)
     
-    return workflow.compile()
+    return workflow.compile(checkpointer=checkpointer)
 
-def run_email_dna_analysis():
-    """Run the complete email DNA analysis workflow"""
-    print("🚀 Starting LangGraph Email DNA Analysis")
-    print("=" * 50)
-    
-    # Initialize state
-    initial_state = {
-        "email_content": "/home/auriga/Documents/MarseerEngineering/emails/Youre-in-Welcome-to-the-Community.md",
-        "images_dir": "/home/auriga/Documents/MarseerEngineering/images",
+DEFAULT_EMAIL_PATH = "/home/auriga/Documents/MarseerEngineering/emails/Youre-in-Welcome-to-the-Community.md"
+DEFAULT_IMAGES_DIR = "/home/auriga/Documents/MarseerEngineering/images"
+
+def build_initial_state(email_content: str, images_dir: str, message_id: str = None) -> EmailDNAState:
+    """Build the initial workflow state for one Markdown email + images dir"""
+    return {
+        "email_content": email_content,
+        "images_dir": images_dir,
+        "message_id": message_id,
+        "raw_data": {},
+        "fingerprint": {},
+        "duplicate_of": {},
         "content_analysis": {},
         "image_analysis": {},
         "final_dna": {},
         "status": "starting"
     }
+
+def _batch_output_paths(inputs, output_dir: str) -> list:
+    """One JSON output path per input, named after the Markdown file"""
+    paths = []
+    seen = set()
+    for email_content, _ in inputs:
+        name = os.path.splitext(os.path.basename(email_content))[0] or "email"
+        candidate = name
+        suffix = 1
+        while candidate in seen:
+            suffix += 1
+            candidate = f"{name}-{suffix}"
+        seen.add(candidate)
+        paths.append(os.path.join(output_dir, f"{candidate}.json"))
+    return paths
+
+def _save_batch_chunk(chunk, results, paths) -> list:
+    """Write each workflow result to its own file and summarize the outcome
+    
+    A result built from fallback defaults is reported as an error and not written.
+    """
+    summary = []
+    for (email_content, images_dir), result, path in zip(chunk, results, paths):
+        if not isinstance(result, Exception) and fallback_reasons(result["final_dna"]):
+            result = AnalysisFallbackError("; ".join(fallback_reasons(result["final_dna"])))
+        if isinstance(result, Exception):
+            print(f"❌ {email_content}: {result}")
+            summary.append({"email_content": email_content, "images_dir": images_dir,
+                            "output_path": None, "error": str(result)})
+            continue
+        with open(path, "w") as f:
+            json.dump(result["final_dna"], f, indent=2)
+        get_metrics().add_bytes_written(os.path.getsize(path), "dna_output", email=email_content)
+        summary.append({"email_content": email_content, "images_dir": images_dir,
+                        "output_path": path, "error": None})
+    return summary
+
+def _batch_chunks(inputs: list, output_dir: str, chunk_size: int):
+    """(chunk of inputs, their output paths) pairs; creates output_dir"""
+    os.makedirs(output_dir, exist_ok=True)
+    paths = _batch_output_paths(inputs, output_dir)
+    for start in range(0, len(inputs), chunk_size):
+        yield inputs[start:start + chunk_size], paths[start:start + chunk_size]
+
+def _batch_completed(summary: list, output_dir: str) -> list:
+    failed = sum(1 for item in summary if item["error"])
+    print(f"🎯 Batch complete: {len(summary) - failed} succeeded, {failed} failed → {output_dir}")
+    return summary
+
+# node name -> (event type, state key, payload extractor) for streamed node updates
+NODE_EVENTS = {
+    "content_agent": ("content_analysis", "content_analysis", lambda value: value),
+    "image_agent": ("image_summary", "image_analysis",
+                    lambda value: {k: v for k, v in value.items() if k != "individual_analyses"}),
+    "dna_synthesizer": ("final_dna", "final_dna", lambda value: value),
+    "dna_reuser": ("final_dna", "final_dna", lambda value: value),
+}
+
+class EmailDNAAnalyzer:
+    """Long-lived analyzer: compiles the workflow once and shares pooled LLM connections
+    
+    Create one per process (or use get_default_analyzer) and reuse it for every
+    email; the compiled graph and the node methods are safe to run concurrently.
+    """
+    
+    def __init__(self, max_connections: int = 20, checkpoint_path: str = None, store_path: str = None,
+                 dedupe_threshold: float = None, embedding_dir: str = None, embeddings=None,
+                 llm_backend: str = None):
+        if dedupe_threshold is not None and not store_path:
+            raise ValueError("Near-duplicate reuse needs a results store: pass store_path")
+        self.http_client = create_http_client(max_connections)
+        self.store = DNAResultStore(store_path) if store_path else None
+        # Fingerprints live next to the DNA they point at, in the store database
+        self.fingerprints = FingerprintIndex(store_path) if dedupe_threshold is not None else None
+        # The fake LLM backend gets local embeddings too: an offline run must not call OpenAI
+        embeddings_kind = "hashing" if (llm_backend or os.getenv("DNA_LLM_BACKEND")) == "fake" else "openai"
+        self.embedding_index = (EmbeddingIndex(embedding_dir, embeddings or create_embeddings(embeddings_kind))
+                                if embedding_dir else None)
+        self.agents = EmailDNAAgents(http_client=self.http_client, store=self.store,
+                                     fingerprints=self.fingerprints, embedding_index=self.embedding_index,
+                                     llm_backend=llm_backend,
+                                     dedupe_threshold=dedupe_threshold if dedupe_threshold is not None else 0.9)
+        # Part of every checkpoint thread id, so switching models never resumes another model's run
+        self.model_names = "/".join(getattr(llm, "model_name", None) or type(llm).__name__
+                                    for llm in (self.agents.llm, self.agents.vision_llm))
+        self.checkpointer = open_checkpointer(checkpoint_path) if checkpoint_path else None
+        self.image_progress = ImageProgressStore(checkpoint_path) if checkpoint_path else None
+        self.workflow = create_email_dna_workflow(self.agents, self.checkpointer)
+    
+    def _run_config(self, email_content: str, images_dir: str, **configurable) -> dict:
+        """Per-email run config; with checkpointing, pins the email to its own thread"""
+        if self.checkpointer:
+            configurable["thread_id"] = thread_id_for(email_content, images_dir, self.model_names)
+            configurable["image_progress"] = self.image_progress
+        return {"configurable": configurable}
     
-    # Create and run workflow
-    workflow = create_email_dna_workflow()
-    result = workflow.invoke(initial_state)
+    def _run_completed(self, config: dict, result: dict):
+        """Drop per-image progress for a finished thread; its checkpoint now holds the result
+        
+        A run that fell back to defaults keeps the images it did analyze for its retry.
+        """
+        if self.image_progress and not fallback_reasons(result.get("final_dna")):
+            self.image_progress.clear(config["configurable"]["thread_id"])
+    
+    def _run_input(self, config: dict, email_content: str, images_dir: str):
+        """Initial state for a new run, or None to resume an existing checkpoint thread
+        
+        Resuming a thread that already finished just returns its saved state. A
+        thread that finished on fallback defaults is run again from the start
+        instead, so a transient failure is never replayed forever.
+        """
+        if self.checkpointer:
+            saved = self.workflow.get_state(config).values
+            if saved and fallback_reasons(saved.get("final_dna")):
+                print(f"🔁 Retrying checkpointed run that fell back to defaults: {email_content}")
+            elif saved:
+                print(f"♻️  Resuming checkpointed run: {email_content}")
+                return None
+        return build_initial_state(email_content, images_dir)
+    
+    def analyze(self, email_content: str, images_dir: str, output_path: str = None) -> dict:
+        """Analyze one email; optionally write its final DNA to output_path
+        
+        Check the result with dna_schemas.fallback_reasons: a failed LLM call
+        leaves defaults in the DNA instead of raising.
+        """
+        config = self._run_config(email_content, images_dir)
+        result = self.workflow.invoke(self._run_input(config, email_content, images_dir), config)
+        self._run_completed(config, result)
+        if output_path:
+            with open(output_path, "w") as f:
+                json.dump(result["final_dna"], f, indent=2)
+        return result
+    
+    def batch(self, inputs, output_dir="dna_results", max_concurrency=4, chunk_size=100) -> list:
+        """Run DNA analysis over many (markdown_path, images_dir) pairs with bounded concurrency
+        
+        Inputs are processed in chunks so memory stays flat on large runs; each email's
+        final DNA is written to its own JSON file in output_dir as its chunk finishes.
+        Failed emails are reported in the returned summary instead of aborting the run.
+        """
+        inputs = list(inputs)
+        print(f"🚀 Starting LangGraph batch DNA analysis: {len(inputs)} emails (max_concurrency={max_concurrency})")
+        summary = []
+        for chunk, paths in _batch_chunks(inputs, output_dir, chunk_size):
+            states, configs = self._chunk_runs(chunk, max_concurrency)
+            results = self.workflow.batch(states, configs, return_exceptions=True)
+            summary.extend(self._chunk_completed(chunk, configs, results, paths))
+            print(f"📊 Batch progress: {len(summary)}/{len(inputs)} emails")
+        return _batch_completed(summary, output_dir)
     
-    # Save results
-    with open("email_dna_langgraph.json", "w") as f:
-        json.dump(result["final_dna"], f, indent=2)
+    async def abatch(self, inputs, output_dir="dna_results", max_concurrency=4, chunk_size=100) -> list:
+        """Async variant of batch built on workflow.abatch"""
+        if self.checkpointer:
+            # SqliteSaver is sync-only; run the checkpointed batch off the event loop
+            return await asyncio.to_thread(self.batch, inputs, output_dir, max_concurrency, chunk_size)
+        inputs = list(inputs)
+        print(f"🚀 Starting async LangGraph batch DNA analysis: {len(inputs)} emails (max_concurrency={max_concurrency})")
+        summary = []
+        for chunk, paths in _batch_chunks(inputs, output_dir, chunk_size):
+            states, configs = self._chunk_runs(chunk, max_concurrency)
+            results = await self.workflow.abatch(states, configs, return_exceptions=True)
+            summary.extend(self._chunk_completed(chunk, configs, results, paths))
+            print(f"📊 Batch progress: {len(summary)}/{len(inputs)} emails")
+        return _batch_completed(summary, output_dir)
+    
+    def _chunk_runs(self, chunk, max_concurrency: int):
+        """(initial states, run configs) for one batch chunk"""
+        configs = [dict(self._run_config(email_content, images_dir), max_concurrency=max_concurrency)
+                   for email_content, images_dir in chunk]
+        states = [self._run_input(config, email_content, images_dir)
+                  for config, (email_content, images_dir) in zip(configs, chunk)]
+        return states, configs
+    
+    def _chunk_completed(self, chunk, configs, results, paths) -> list:
+        """Finish one batch chunk: clear finished runs' progress, write outputs, summarize"""
+        for config, result in zip(configs, results):
+            if not isinstance(result, Exception):
+                self._run_completed(config, result)
+        return _save_batch_chunk(chunk, results, paths)
+    
+    def stream(self, email_content: str, images_dir: str, sink: JsonlEventSink = None,
+               output_path: str = None) -> dict:
+        """Analyze one email, emitting per-node partial results to sink as they complete
+        
+        Events: run_started, content_analysis, image_analysis (one per image),
+        image_summary, final_dna, then run_completed or run_failed.
+        """
+        sink = sink or JsonlEventSink()
+        config = self._run_config(email_content, images_dir, event_sink=sink)
+        run_input = self._run_input(config, email_content, images_dir)
+        result = dict(self.workflow.get_state(config).values) if run_input is None else dict(run_input)
+        sink.emit(make_event("run_started", email_content, {"images_dir": images_dir, "resumed": run_input is None}))
+        try:
+            for chunk in self.workflow.stream(run_input, config, stream_mode="updates"):
+                for node, update in chunk.items():
+                    result.update(update)
+                    if node in NODE_EVENTS:
+                        event_type, key, extract = NODE_EVENTS[node]
+                        sink.emit(make_event(event_type, email_content, extract(update.get(key, {}))))
+        except Exception as e:
+            sink.emit(make_event("run_failed", email_content, {"error": str(e), "status": result.get("status")}))
+            raise
+        self._run_completed(config, result)
+        
+        if output_path:
+            with open(output_path, "w") as f:
+                json.dump(result["final_dna"], f, indent=2)
+        sink.emit(make_event("run_completed", email_content, {"output_path": output_path}))
+        return result
+    
+    def stream_batch(self, inputs, sink: JsonlEventSink, output_dir="dna_results", max_concurrency=4) -> list:
+        """Streaming counterpart of batch: events for every email go to one shared sink"""
+        inputs = list(inputs)
+        os.makedirs(output_dir, exist_ok=True)
+        paths = _batch_output_paths(inputs, output_dir)
+        
+        def run_one(item):
+            (email_content, images_dir), path = item
+            try:
+                self.stream(email_content, images_dir, sink, path)
+                return {"email_content": email_content, "images_dir": images_dir, "output_path": path, "error": None}
+            except Exception as e:
+                print(f"❌ {email_content}: {e}")
+                return {"email_content": email_content, "images_dir": images_dir, "output_path": None, "error": str(e)}
+        
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            return list(pool.map(run_one, zip(inputs, paths)))
+    
+    def close(self):
+        """Release pooled HTTP connections and checkpoint database handles"""
+        self.http_client.close()
+        if self.store:
+            self.store.close()
+        if self.fingerprints:
+            self.fingerprints.close()
+        if self.checkpointer:
+            self.checkpointer.conn.close()
+            self.image_progress.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+_default_analyzer = None
+_default_analyzer_lock = threading.Lock()
+
+def get_default_analyzer() -> EmailDNAAnalyzer:
+    """Process-wide analyzer shared by the module-level run_* helpers"""
+    global _default_analyzer
+    with _default_analyzer_lock:
+        if _default_analyzer is None:
+            _default_analyzer = EmailDNAAnalyzer()
+        return _default_analyzer
+
+def run_email_dna_analysis(email_content=DEFAULT_EMAIL_PATH, images_dir=DEFAULT_IMAGES_DIR,
+                           output_path="email_dna_langgraph.json"):
+    """Run the complete email DNA analysis workflow"""
+    print("🚀 Starting LangGraph Email DNA Analysis")
+    print("=" * 50)
+    
+    result = get_default_analyzer().analyze(email_content, images_dir, output_path)
     
     print("\n" + "=" * 50)
     print("🎯 LangGraph Email DNA Analysis Complete!")
-    print("📊 Results saved to: email_dna_langgraph.json")
+    print(f"📊 Results saved to: {output_path}")
     
     return result
 
+def run_email_dna_batch(inputs, output_dir="dna_results", max_concurrency=4, chunk_size=100):
+    """Run DNA analysis over many (markdown_path, images_dir) pairs (see EmailDNAAnalyzer.batch)"""
+    return get_default_analyzer().batch(inputs, output_dir, max_concurrency, chunk_size)
+
+async def arun_email_dna_batch(inputs, output_dir="dna_results", max_concurrency=4, chunk_size=100):
+    """Async variant of run_email_dna_batch built on workflow.abatch"""
+    return await get_default_analyzer().abatch(inputs, output_dir, max_concurrency, chunk_size)
+
 if __name__ == "__main__":
     run_email_dna_analysis()
\ No newline at end of file
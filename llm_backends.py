@@ -0,0 +1,272 @@
+"""
+Pluggable chat-model backends for the DNA agents: OpenAI, or a deterministic local fake
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from collections import Counter, deque
+from typing import Optional
+import httpx
+import openai
+from pydantic import PrivateAttr
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from dna_schemas import ContentDNA, ImageAnalysis
+
+BACKENDS = ("openai", "fake")
+
+# Roughly what OpenAI bills for one image at detail=auto
+_IMAGE_PROMPT_TOKENS = 765
+
+_FAKE_CONTENT_REPLY = ContentDNA.model_validate({
+    "subject_line_dna": {"text": "Welcome", "length": 7, "emotional_triggers": ["welcome"]},
+    "content_structure_dna": {"word_count": 200, "paragraph_count": 3, "value_propositions": ["membership benefits"]},
+    "cta_dna": {"primary_cta": {"text": "Get Started", "action_type": "signup"}, "cta_count": 1},
+    "psychological_triggers": {"urgency_score": 4},
+    "offer_dna": {},
+    "brand_voice_dna": {"personality_traits": ["helpful"]},
+}).model_dump_json()
+
+_FAKE_IMAGE_REPLY = ImageAnalysis.model_validate({
+    "raw_visual_description": {"scene_description": "Runner on a mountain trail at sunrise",
+                               "text_in_image": "Shop now", "colors_observed": ["white", "orange"]},
+    "visual_elements": {"image_type": "hero", "dominant_colors": ["#FFFFFF", "#FF6B35"]},
+    "brand_dna": {"professionalism_score": 8, "brand_consistency": "high", "visual_appeal": "good"},
+}).model_dump_json()
+
+def _message_text(message) -> str:
+    if isinstance(message.content, str):
+        return message.content
+    return "".join(block.get("text", "") if block.get("type") == "text" else json.dumps(block, sort_keys=True)
+                   for block in message.content)
+
+def prompt_key(messages) -> str:
+    """Stable hash of a prompt, used to look up recorded responses"""
+    digest = hashlib.sha1()
+    for message in messages:
+        digest.update(message.type.encode("utf-8") + b"\0" + _message_text(message).encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+def prompt_kind(messages) -> str:
+    """"image" for vision prompts (content blocks with an image), else "content\""""
+    for message in messages:
+        if not isinstance(message.content, str) and any(block.get("type") == "image_url" for block in message.content):
+            return "image"
+    return "content"
+
+def estimate_prompt_tokens(messages) -> int:
+    """Rough prompt size: ~4 characters per text token, a flat rate per image block"""
+    tokens = 0
+    for message in messages:
+        blocks = [{"type": "text", "text": message.content}] if isinstance(message.content, str) else message.content
+        for block in blocks:
+            tokens += len(block.get("text", "")) // 4 if block.get("type") == "text" else _IMAGE_PROMPT_TOKENS
+    return tokens
+
+def _api_error(error_class, status: int, message: str, headers: dict = None):
+    """An openai SDK error carrying a synthetic HTTP response, as the real client would raise"""
+    request = httpx.Request("POST", "https://fake-llm.local/v1/chat/completions")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    return error_class(message, response=response, body={"message": message})
+
+class FakeChatModel(BaseChatModel):
+    """Offline stand-in for ChatOpenAI with controllable latency and failures
+
+    Replies are schema-valid JSON: a recorded response for the exact prompt
+    if `recordings_path` has one, else any recording of the same kind
+    (content/image), else a canned reply. Failure injection is deterministic
+    per (seed, prompt, attempt), so concurrent runs fail the same calls:
+    - error_rate: openai.InternalServerError (HTTP 500)
+    - rate_limit_rate: openai.RateLimitError (HTTP 429, Retry-After header)
+    - rpm: 429s once more than rpm calls land in a sliding 60 s window
+    - invalid_rate: a non-JSON reply, to exercise the repair path
+    """
+
+    model_name: str = "fake-gpt-4o"
+    latency: float = 0.0
+    latency_jitter: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    rpm: Optional[int] = None
+    invalid_rate: float = 0.0
+    recordings_path: Optional[str] = None
+    seed: int = 0
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _attempts: Counter = PrivateAttr(default_factory=Counter)
+    _call_times: deque = PrivateAttr(default_factory=deque)
+    _recordings: dict = PrivateAttr(default_factory=dict)
+    _recordings_by_kind: dict = PrivateAttr(default_factory=dict)
+    _stats: Counter = PrivateAttr(default_factory=Counter)
+
+    def model_post_init(self, __context):
+        if self.recordings_path and os.path.exists(self.recordings_path):
+            with open(self.recordings_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self._recordings[record["key"]] = record["content"]
+                        self._recordings_by_kind.setdefault(record.get("kind", "content"), []).append(record["content"])
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @property
+    def stats(self) -> dict:
+        """Counts of calls, rate_limited, errors and invalid replies so far"""
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _roll(self, key: str, attempt: int, purpose: str) -> float:
+        """Deterministic uniform [0, 1) draw for this prompt attempt"""
+        digest = hashlib.blake2b(f"{self.seed}:{purpose}:{key}:{attempt}".encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") / 2 ** 64
+
+    def _admit(self, messages) -> tuple:
+        """Apply rate limits and injected errors; returns (key, attempt, delay seconds)"""
+        key = prompt_key(messages)
+        with self._lock:
+            attempt = self._attempts[key]
+            self._attempts[key] += 1
+            self._stats["calls"] += 1
+            now = time.monotonic()
+            while self._call_times and now - self._call_times[0] > 60:
+                self._call_times.popleft()
+            over_rpm = self.rpm is not None and len(self._call_times) >= self.rpm
+            if not over_rpm:
+                self._call_times.append(now)
+            retry_after = 60 - (now - self._call_times[0]) if over_rpm else 1.0
+
+        if over_rpm or self._roll(key, attempt, "rate_limit") < self.rate_limit_rate:
+            self._count("rate_limited")
+            raise _api_error(openai.RateLimitError, 429, "Rate limit reached (fake backend)",
+                             {"retry-after": f"{max(retry_after, 0.0):.1f}"})
+        if self._roll(key, attempt, "error") < self.error_rate:
+            self._count("errors")
+            raise _api_error(openai.InternalServerError, 500, "Injected server error (fake backend)")
+        delay = self.latency + self.latency_jitter * self._roll(key, attempt, "latency")
+        return key, attempt, delay
+
+    def _reply(self, messages, key: str, attempt: int) -> AIMessage:
+        kind = prompt_kind(messages)
+        if self._roll(key, attempt, "invalid") < self.invalid_rate:
+            self._count("invalid")
+            content = "Sorry, here is the analysis: {not json"
+        elif key in self._recordings:
+            content = self._recordings[key]
+        elif self._recordings_by_kind.get(kind):
+            options = self._recordings_by_kind[kind]
+            content = options[int(key[:8], 16) % len(options)]
+        else:
+            content = _FAKE_IMAGE_REPLY if kind == "image" else _FAKE_CONTENT_REPLY
+        prompt_tokens = estimate_prompt_tokens(messages)
+        completion_tokens = len(content) // 4
+        response_metadata = {"model_name": self.model_name, "finish_reason": "stop"}
+        if self.rpm is not None:
+            # The headers OpenAI sends, so schedulers can learn the limit from responses
+            with self._lock:
+                remaining = max(0, self.rpm - len(self._call_times))
+            response_metadata["headers"] = {"x-ratelimit-limit-requests": str(self.rpm),
+                                            "x-ratelimit-remaining-requests": str(remaining)}
+        return AIMessage(
+            content=content,
+            response_metadata=response_metadata,
+            usage_metadata={"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                            "total_tokens": prompt_tokens + completion_tokens},
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        key, attempt, delay = self._admit(messages)
+        if delay:
+            time.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages, key, attempt))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        key, attempt, delay = self._admit(messages)
+        if delay:
+            await asyncio.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages, key, attempt))])
+
+class ResponseRecorder(BaseCallbackHandler):
+    """Append every chat response to a JSONL file that FakeChatModel can replay"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._prompts = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        with self._lock:
+            self._prompts[run_id] = (prompt_key(messages[0]), prompt_kind(messages[0]))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            key, kind = self._prompts.pop(run_id, (None, None))
+            if key is None:
+                return
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "kind": kind, "content": response.generations[0][0].text}) + "\n")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._prompts.pop(run_id, None)
+
+def fake_options_from_env() -> dict:
+    """FakeChatModel settings from DNA_FAKE_LLM_* environment variables"""
+    options = {}
+    for field, cast in (("latency", float), ("latency_jitter", float), ("error_rate", float),
+                        ("rate_limit_rate", float), ("rpm", int), ("invalid_rate", float),
+                        ("recordings_path", str), ("seed", int)):
+        value = os.getenv(f"DNA_FAKE_LLM_{field.upper()}")
+        if value:
+            options[field] = cast(value)
+    return options
+
+def create_chat_models(backend: str = None, http_client: httpx.Client = None, **fake_options) -> tuple:
+    """(content llm, vision llm) for a backend name; defaults to $DNA_LLM_BACKEND or "openai"
+
+    With the OpenAI backend, $DNA_LLM_RECORD names a JSONL file that every
+    response is appended to, for later replay through the fake backend.
+    Retries are left to the rate_limiter scheduler, which needs to see every
+    429 and the rate-limit headers to pace calls.
+    """
+    backend = backend or os.getenv("DNA_LLM_BACKEND", "openai")
+    if backend == "fake":
+        # One instance for both roles: content and vision calls share a rate limit, like one API key
+        model = FakeChatModel(**{**fake_options_from_env(), **fake_options})
+        return model, model
+    if backend == "openai":
+        from langchain_openai import ChatOpenAI
+        record_path = os.getenv("DNA_LLM_RECORD")
+        callbacks = [ResponseRecorder(record_path)] if record_path else None
+        llm = ChatOpenAI(
+            model="gpt-4o",
+            openai_api_key=os.getenv('OPENAI_API_KEY'),
+            temperature=0.3,
+            max_retries=0,
+            include_response_headers=True,
+            http_client=http_client,
+            callbacks=callbacks
+        )
+        vision_llm = ChatOpenAI(
+            model="gpt-4o",
+            openai_api_key=os.getenv('OPENAI_API_KEY'),
+            temperature=0.2,
+            max_tokens=1000,
+            max_retries=0,
+            include_response_headers=True,
+            http_client=http_client,
+            callbacks=callbacks
+        )
+        return llm, vision_llm
+    raise ValueError(f"Unknown LLM backend {backend!r}; expected one of {BACKENDS}")
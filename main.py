@@ -5,25 +5,46 @@ Fetch → Parse → Markdown → LangGraph Analysis
 """
 
 from gmail_fetch import fetch_emails_from_sender
-from email_parser import parse_email_content, save_images
-from email_to_markdown import save_email_as_markdown
-from test_parser import extract_text_from_html
+from dna_events import JsonlEventSink
+from pipeline_metrics import get_metrics
+from pipeline_runner import process_raw_email
+from output_manifest import dna_is_current, record_dna
 
-try:
-    from langgraph_agents import run_email_dna_analysis
-except ImportError:
-    print("⚠️  langgraph_agents.py not found - skipping LangGraph step")
-    run_email_dna_analysis = None
+def _load_dna_analyzer():
+    """langgraph_agents pulls in LangGraph + LangChain; import it only when analysis runs"""
+    try:
+        from langgraph_agents import get_default_analyzer
+    except ImportError:
+        print("⚠️  langgraph_agents.py not found - skipping LangGraph step")
+        return None
+    return get_default_analyzer()
 
-def main():
-    """Run complete email processing pipeline"""
+def main(sender_email="newsfeed@on.com", limit=1, metrics_file="pipeline_metrics.prom",
+         metrics_log=None, metrics_port=None):
+    """Run complete email processing pipeline
+    
+    Outputs are keyed by Message-ID (emails/<key>/, dna_results/<key>.json) and
+    tracked in a per-email manifest, so emails unchanged since a previous run are
+    skipped and only stages whose inputs changed are recomputed.
+    
+    Stage timings, bytes, images, LLM tokens and cost are written to metrics_file
+    (Prometheus text format), optionally logged per stage/LLM call as JSON Lines to
+    metrics_log, and optionally served at http://127.0.0.1:<metrics_port>/metrics.
+    """
     print("🚀 Starting Complete Email Processing Pipeline")
     print("=" * 50)
     
+    metrics = get_metrics()
+    if metrics_log:
+        metrics.sink = JsonlEventSink(metrics_log)
+    if metrics_port:
+        metrics.serve_prometheus(metrics_port)
+        print(f"📈 Metrics served at http://127.0.0.1:{metrics_port}/metrics")
+    
     try:
         # Step 1: Fetch emails
         print("📧 Step 1: Fetching emails...")
-        emails = fetch_emails_from_sender("newsfeed@on.com", limit=1)
+        emails = fetch_emails_from_sender(sender_email, limit=limit)
         
         if not emails:
             print("❌ No emails found")
@@ -31,48 +52,57 @@ def main():
         
         print(f"✅ Fetched {len(emails)} emails")
         
-        # Step 2: Parse email content
-        print("\n🔍 Step 2: Parsing email content...")
-        parsed = parse_email_content(emails[0]['raw_email'])
-        
-        print(f"✅ Subject: {parsed['subject']}")
-        print(f"✅ Images: {len(parsed['images'])} found")
+        analysis_inputs = []
+        for email_obj in emails:
+            # Steps 2-4: parse, write Markdown + images to emails/<key>/, extract clean text
+            print(f"\n🔍 Steps 2-4: Parsing {email_obj['id']} into Markdown + images...")
+            converted = process_raw_email(email_obj['id'], email_obj['raw_email'], "emails")
+            if converted['skipped']:
+                print(f"♻️  {email_obj['id']} unchanged since last run: {converted['md_path']}")
+            else:
+                print(f"✅ Subject: {converted['subject']}")
+                print(f"✅ Images: {converted['images']} found")
+                print(f"✅ Markdown saved: {converted['md_path']}")
+                print(f"✅ Clean text extracted: {converted['clean_text_chars']} characters")
+            analysis_inputs.append((converted['md_path'], converted['images_dir']))
         
-        # Step 3: Save images
-        if parsed['images']:
-            print("\n🖼️  Step 3: Saving images...")
-            image_paths = save_images(parsed)
-            print(f"✅ Images saved: {len(image_paths)} files")
-        
-        # Step 4: Convert to Markdown
-        print("\n📝 Step 4: Converting to Markdown...")
-        md_path = save_email_as_markdown(parsed)
-        print(f"✅ Markdown saved: {md_path}")
-        
-        # Step 5: Extract clean text
-        print("\n📄 Step 5: Extracting clean text...")
-        if parsed['html_body']:
-            clean_text = extract_text_from_html(parsed['html_body'])
-            print(f"✅ Clean text extracted: {len(clean_text)} characters")
-        
-        # Step 6: LangGraph Analysis
-        if run_email_dna_analysis:
-            print("\n🧬 Step 6: Running LangGraph DNA analysis...")
+        # Step 5: LangGraph Analysis
+        analyzer = _load_dna_analyzer() if analysis_inputs else None
+        if analyzer:
+            print("\n🧬 Step 5: Running LangGraph DNA analysis...")
             try:
-                result = run_email_dna_analysis()
+                pending = [(md_path, images_dir) for md_path, images_dir in analysis_inputs
+                           if not dna_is_current(analyzer, md_path, images_dir)]
+                if len(pending) < len(analysis_inputs):
+                    print(f"♻️  {len(analysis_inputs) - len(pending)} emails already analyzed, skipping")
+                summary = analyzer.batch(pending) if pending else []
+                for item in summary:
+                    if item['output_path']:
+                        record_dna(analyzer, item['email_content'], item['images_dir'], item['output_path'])
                 print("✅ LangGraph analysis completed")
-                print(f"📊 Results saved to output files")
+                print(f"📊 Results saved to {len([s for s in summary if s['output_path']])} output files")
             except Exception as e:
                 print(f"❌ LangGraph error: {e}")
         
         print("\n" + "=" * 50)
         print("🎯 Complete Pipeline Finished!")
-        print(f"📧 Email: {parsed['subject']}")
-        print(f"📝 Markdown: {md_path}")
-        print(f"🖼️  Images: {len(parsed['images'])} saved")
+        print(f"📧 Emails: {len(emails)}")
+        for md_path, _ in analysis_inputs:
+            print(f"📝 Markdown: {md_path}")
+        
+        for email_obj, (md_path, _) in zip(emails, analysis_inputs):
+            fetched = metrics.pop_email(email_obj['id']) or {}
+            analyzed = metrics.pop_email(md_path) or {}
+            stages = {**fetched.get("stages", {}), **analyzed.get("stages", {})}
+            print(f"⏱️  {email_obj['id']}: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in stages.items())
+                  + f" | {analyzed.get('llm_calls', 0)} LLM calls, ${analyzed.get('cost_usd', 0):.4f}")
         
     except Exception as e:
         print(f"❌ Pipeline error: {e}")
+    finally:
+        if metrics_file:
+            metrics.write_prometheus(metrics_file)
+            print(f"📈 Metrics written to: {metrics_file}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,187 @@
+"""
+Single-pass raw data extraction from email Markdown
+"""
+import re
+from email.utils import parseaddr
+
+# Header fields written by save_email_as_markdown; all sit in the first few lines
+_SUBJECT_RE = re.compile(r'^#\s*(.+)', re.MULTILINE)
+_SENDER_RE = re.compile(r'\*\*From:\*\*\s*(.+)')
+_DATE_RE = re.compile(r'\*\*Date:\*\*\s*(.+)')
+# Whole line, so it can be cut out: a per-send id is not content
+_MESSAGE_ID_RE = re.compile(r'^\*\*Message-ID:\*\*[ \t]*(.+)\n?', re.MULTILINE)
+
+# Every inline construct we care about, as one alternation scanned left to right.
+# Order matters: an image link must win over the image and link inside it.
+# The leading lookahead lets the engine skip plain text without trying each branch.
+_TOKEN_RE = re.compile(
+    r'(?=[\[!*#-])'
+    r'(?:(?P<image_link>\[!\[(?P<il_alt>[^\]]+)\]\((?P<il_src>[^\)]+)\)\]\((?P<il_url>[^\)]+)\))'
+    r'|(?P<image>!\[(?P<img_alt>[^\]]*)\]\((?P<img_src>[^\)]+)\))'
+    r'|(?P<link>\[(?P<link_text>[^\]]+)\]\((?P<link_url>[^\)]+)\))'
+    r'|(?P<bold>\*\*)'
+    r'|(?P<header>#+[ \t]*)'
+    r'|(?P<divider>---+))'
+)
+
+_LINK_TEXT_RE = re.compile(r'\[([^\]]+)\]\([^\)]+\)')
+_BOLD_LINK_TEXT_RE = re.compile(r'\*\*\[([^\]]+)\]\([^\)]+\)\*\*')
+
+class SectionRule:
+    """A content section running from a literal start marker to the first end match
+
+    items_key/item_pattern optionally pull a list of items (e.g. benefit names)
+    out of the section text.
+    """
+
+    def __init__(self, section_type: str, start: str, end: str, items_key: str = None, item_pattern=None):
+        self.section_type = section_type
+        self.start = start
+        self.end = re.compile(end)
+        self.items_key = items_key
+        self.item_pattern = item_pattern
+
+    def extract(self, content: str):
+        begin = content.find(self.start)
+        if begin < 0:
+            return None
+        body_start = begin + len(self.start)
+        # The section body must be at least one character long
+        end_match = self.end.search(content, body_start + 1)
+        if not end_match:
+            return None
+        text = content[body_start:end_match.start()].strip()
+        section = {"section_type": self.section_type, "content": text}
+        if self.items_key:
+            section[self.items_key] = self.item_pattern.findall(text)
+        return section
+
+# On (on.com) community newsletter template
+ON_SECTION_RULES = [
+    SectionRule("benefits", "## Your benefits...", r'##|---|\n\n©', "benefits_list", _BOLD_LINK_TEXT_RE),
+    SectionRule("main_message", "## Enjoy your unlocked benefits", r'## Your benefits'),
+    SectionRule("footer_social", "**Follow us:**", r'---|\n\nYou are receiving', "social_platforms", _LINK_TEXT_RE),
+]
+
+DEFAULT_SECTION_RULES = []
+
+_SENDER_SECTION_RULES = {
+    "on.com": ON_SECTION_RULES,
+}
+
+def register_section_rules(sender_domain: str, rules: list):
+    """Use rules for mail from sender_domain and its subdomains"""
+    _SENDER_SECTION_RULES[sender_domain.lower()] = list(rules)
+
+def section_rules_for(sender: str) -> list:
+    """Section rules registered for the sender's domain, or DEFAULT_SECTION_RULES"""
+    address = parseaddr(sender or "")[1].lower()
+    domain = address.rpartition("@")[2]
+    while domain:
+        if domain in _SENDER_SECTION_RULES:
+            return _SENDER_SECTION_RULES[domain]
+        domain = domain.partition(".")[2]
+    return DEFAULT_SECTION_RULES
+
+def _scan(content: str):
+    """One pass over the Markdown collecting links, image refs and clean text"""
+    image_links = []
+    text_links = []
+    image_refs = []
+    pieces = []
+    pos = 0
+    for match in _TOKEN_RE.finditer(content):
+        pieces.append(content[pos:match.start()])
+        pos = match.end()
+        kind = match.lastgroup
+
+        if kind == "link":
+            text, url = match.group("link_text"), match.group("link_url")
+            pieces.append(text.replace("**", ""))
+            if not url.startswith('images/'):
+                text_links.append({
+                    "url": url,
+                    "anchor_text": text,
+                    "link_type": "text_link",
+                    "position": "body"
+                })
+        elif kind == "image":
+            alt = match.group("img_alt")
+            if alt:
+                image_refs.append({
+                    "alt_text": alt,
+                    "image_path": match.group("img_src"),
+                    "image_type": "embedded_image"
+                })
+        elif kind == "image_link":
+            image_links.append({
+                "url": match.group("il_url"),
+                "anchor_text": match.group("il_alt"),
+                "link_type": "image_link",
+                "position": "body"
+            })
+            image_refs.append({
+                "alt_text": match.group("il_alt"),
+                "image_path": match.group("il_src"),
+                "image_type": "embedded_image"
+            })
+        # bold markers, header markers and dividers are simply dropped
+    pieces.append(content[pos:])
+
+    clean_text = '\n'.join(line.strip() for line in ''.join(pieces).split('\n') if line.strip())
+    return image_links + text_links, image_refs, clean_text
+
+def extract_raw_content(content: str, section_rules: list = None) -> dict:
+    """Extract raw email data from markdown format
+
+    section_rules overrides the per-sender rules picked by section_rules_for.
+    The Message-ID header line is read, then dropped from raw_markdown and
+    everything derived from the text (body text, stats, sections): it differs
+    on every send, so it would only add noise to prompts, fingerprints,
+    template diffs and embeddings.
+    """
+    subject_match = _SUBJECT_RE.search(content)
+    subject = subject_match.group(1).strip() if subject_match else "No subject found"
+
+    sender_match = _SENDER_RE.search(content)
+    sender = sender_match.group(1).strip() if sender_match else "Unknown sender"
+
+    date_match = _DATE_RE.search(content)
+    date = date_match.group(1).strip() if date_match else "Unknown date"
+
+    message_id_match = _MESSAGE_ID_RE.search(content)
+    message_id = None
+    if message_id_match:
+        message_id = message_id_match.group(1).strip()
+        content = content[:message_id_match.start()] + content[message_id_match.end():]
+
+    links, image_refs, clean_text = _scan(content)
+
+    if section_rules is None:
+        section_rules = section_rules_for(sender)
+    sections = []
+    for rule in section_rules:
+        section = rule.extract(content)
+        if section:
+            sections.append(section)
+
+    return {
+        "original_email": {
+            "subject_line": subject,
+            "sender": sender,
+            "date": date,
+            "message_id": message_id,
+            "full_body_text": clean_text,
+            "raw_markdown": content
+        },
+        "extracted_links": links,
+        "image_references": image_refs,
+        "content_sections": sections,
+        "content_stats": {
+            "total_characters": len(content),
+            "total_words": len(clean_text.split()),
+            "total_links": len(links),
+            "total_images": len(image_refs),
+            "format_type": "markdown"
+        }
+    }
@@ -0,0 +1,159 @@
+"""
+Incremental, idempotent pipeline outputs: content-keyed directories plus a per-email manifest
+"""
+import os
+import json
+import hashlib
+from datetime import datetime, timezone
+from email.parser import BytesHeaderParser
+from pipeline_metrics import get_metrics
+
+# Bump a stage's version when its code changes what it produces; that stage and
+# everything downstream of it is recomputed on the next run.
+STAGE_VERSIONS = {
+    "markdown": 1,  # parse + images + Markdown
+    "dna": 1,       # LangGraph DNA analysis
+}
+
+MANIFEST_FILENAME = "manifest.json"
+
+def content_hash(*parts) -> str:
+    """sha256 over str/bytes parts (separated, so ("ab", "c") != ("a", "bc"))"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8") if isinstance(part, str) else part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def files_hash(paths) -> str:
+    """Hash of the names and contents of files, independent of the order given"""
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(os.path.basename(path).encode("utf-8") + b"\0")
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def email_key(raw_email: bytes) -> str:
+    """Stable output key for one email: from its Message-ID, else from its bytes
+
+    Unlike IMAP sequence numbers or subjects, the key is the same on every
+    fetch and different for every distinct message.
+    """
+    message_id = (BytesHeaderParser().parsebytes(raw_email).get("Message-ID") or "").strip()
+    return content_hash(message_id or raw_email)[:20]
+
+def _markdown_files(md_path: str, images_dir: str) -> list:
+    files = [md_path]
+    if images_dir and os.path.isdir(images_dir):
+        files += [os.path.join(images_dir, name) for name in os.listdir(images_dir)]
+    return files
+
+class OutputManifest:
+    """What one email's output directory holds, produced from which input by which stage version
+
+    Saved as manifest.json in the email's directory. A stage is current when
+    its recorded version and input hash match and its files still exist.
+    Each stage's input hash covers what the stage actually reads (the raw
+    email for "markdown", the Markdown + images for "dna"), so re-running an
+    upstream stage that produces identical output leaves downstream results
+    untouched.
+    """
+
+    def __init__(self, email_dir: str):
+        self.email_dir = email_dir
+        self.path = os.path.join(email_dir, MANIFEST_FILENAME)
+        self.data = {"stages": {}}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    def entry(self, stage: str) -> dict:
+        return self.data["stages"].get(stage)
+
+    def is_current(self, stage: str, input_hash: str) -> bool:
+        entry = self.entry(stage)
+        return (entry is not None
+                and entry["version"] == STAGE_VERSIONS[stage]
+                and entry["input_hash"] == input_hash
+                and all(os.path.exists(path) for path in entry["files"]))
+
+    def record(self, stage: str, input_hash: str, outputs: dict, files: list, **info) -> dict:
+        """Record a completed stage and save the manifest"""
+        entry = {
+            "version": STAGE_VERSIONS[stage],
+            "input_hash": input_hash,
+            "output_hash": files_hash(files),
+            "outputs": outputs,
+            "files": list(files),
+            "completed_at": datetime.now(timezone.utc).isoformat(),
+            **info,
+        }
+        self.data["stages"][stage] = entry
+        self.save()
+        return entry
+
+    def save(self):
+        os.makedirs(self.email_dir, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+def record_markdown(manifest: OutputManifest, raw_hash: str, parsed_email: dict, md_path: str, **info) -> dict:
+    """Record the "markdown" stage for a parsed email written to manifest.email_dir"""
+    images_dir = os.path.join(manifest.email_dir, "images")
+    image_files = [os.path.join(images_dir, image['filename'] or f"image_{i}.jpg")
+                   for i, image in enumerate(parsed_email['images'])]
+    outputs = {"subject": parsed_email['subject'], "message_id": parsed_email['message_id'],
+               "md_path": md_path, "images_dir": images_dir, "images": len(parsed_email['images']), **info}
+    return manifest.record("markdown", raw_hash, outputs, [md_path] + image_files)
+
+def dna_input_hash(analyzer, md_path: str, images_dir: str) -> str:
+    """What the DNA result depends on: the Markdown + images contents and the models used"""
+    return content_hash(files_hash(_markdown_files(md_path, images_dir)), analyzer.model_names)
+
+def dna_is_current(analyzer, md_path: str, images_dir: str) -> bool:
+    manifest = OutputManifest(os.path.dirname(md_path))
+    return manifest.is_current("dna", dna_input_hash(analyzer, md_path, images_dir))
+
+def _check_not_fallback(final_dna: dict):
+    # dna_schemas pulls in pydantic; fetch/markdown-only callers never get here
+    from dna_schemas import AnalysisFallbackError, fallback_reasons
+    reasons = fallback_reasons(final_dna)
+    if reasons:
+        raise AnalysisFallbackError("analysis fell back to defaults: " + "; ".join(reasons))
+
+def record_dna(analyzer, md_path: str, images_dir: str, output_path: str) -> dict:
+    """Record the "dna" stage for output_path; AnalysisFallbackError if that DNA is a fallback"""
+    with open(output_path) as f:
+        _check_not_fallback(json.load(f))
+    manifest = OutputManifest(os.path.dirname(md_path))
+    return manifest.record("dna", dna_input_hash(analyzer, md_path, images_dir),
+                           {"dna_path": output_path}, [output_path], models=analyzer.model_names)
+
+def analyze_incremental(analyzer, md_path: str, images_dir: str, output_path: str, guard=None) -> bool:
+    """Run DNA analysis unless the manifest shows output_path is already current; True if skipped
+
+    guard, if given, is called before the analysis starts and again before
+    its output is written; raising from it abandons the email. A result
+    built from fallback defaults raises AnalysisFallbackError and is neither
+    written nor recorded, so the next run tries the email again.
+    """
+    manifest = OutputManifest(os.path.dirname(md_path))
+    input_hash = dna_input_hash(analyzer, md_path, images_dir)
+    if manifest.is_current("dna", input_hash) and manifest.entry("dna")["outputs"]["dna_path"] == output_path:
+        return True
+    if guard:
+        guard()
+    result = analyzer.analyze(md_path, images_dir)
+    _check_not_fallback(result["final_dna"])
+    if guard:
+        guard()
+    with open(output_path, "w") as f:
+        json.dump(result["final_dna"], f, indent=2)
+    get_metrics().add_bytes_written(os.path.getsize(output_path), "dna_output", email=md_path)
+    manifest.record("dna", input_hash, {"dna_path": output_path}, [output_path], models=analyzer.model_names)
+    return False
@@ -0,0 +1,299 @@
+"""
+Per-stage timing, byte, image and LLM token/cost metrics for the email pipeline
+"""
+import os
+import time
+import threading
+import functools
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from dna_events import JsonlEventSink, make_event
+
+# USD per 1M (prompt, completion) tokens; matched by longest model-name prefix
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0),
+}
+
+# Prometheus name -> (help text, per-email summary key)
+_COUNTERS = {
+    "dna_stage_seconds_total": ("Wall time spent in each pipeline stage", None),
+    "dna_stage_runs_total": ("Completed runs of each pipeline stage", None),
+    "dna_stage_errors_total": ("Pipeline stage runs that raised", None),
+    "dna_bytes_fetched_total": ("Bytes read from IMAP or image downloads", "bytes_fetched"),
+    "dna_bytes_written_total": ("Bytes written to disk (Markdown, images, results)", "bytes_written"),
+    # One image passes through several stages, so only per-stage counts mean anything:
+    # per email they go to summary["images"][stage] instead of a single sum
+    "dna_images_processed_total": ("Images handled by each stage (extracted, saved, downloaded or analyzed)", None),
+    "dna_llm_calls_total": ("LLM requests, chat and embeddings", "llm_calls"),
+    "dna_llm_prompt_tokens_total": ("LLM prompt tokens", "prompt_tokens"),
+    "dna_llm_completion_tokens_total": ("LLM completion tokens", "completion_tokens"),
+    "dna_llm_cost_usd_total": ("Estimated LLM cost in USD", "cost_usd"),
+    "dna_throttled_total": ("Calls rejected by a rate limit (HTTP 429, IMAP throttling)", "throttled"),
+    "dna_throttle_wait_seconds_total": ("Time spent pacing or backing off for rate limits", "throttle_wait_seconds"),
+}
+
+# Email the current thread/task is working on, so deep calls need no extra argument
+_current_email = contextvars.ContextVar("dna_metrics_email", default=None)
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimated USD cost of one call, 0.0 for models without a known price"""
+    for prefix in sorted(MODEL_PRICES, key=len, reverse=True):
+        if (model or "").startswith(prefix):
+            prompt_price, completion_price = MODEL_PRICES[prefix]
+            return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+    return 0.0
+
+def _token_usage(response) -> tuple:
+    """(prompt, completion) tokens from a LangChain message, whichever field the provider filled"""
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage:
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    return token_usage.get("prompt_tokens", 0), token_usage.get("completion_tokens", 0)
+
+class PipelineMetrics:
+    """Thread-safe counters for every pipeline stage, in total and per email
+
+    Totals are labelled Prometheus-style (stage, model) and exported with
+    to_prometheus(); per-email breakdowns are kept until pop_email(). The
+    email is either passed explicitly or taken from an enclosing
+    `with metrics.for_email(...)`. Each finished stage and LLM call is also
+    written as a structured event to `sink`, if one is set.
+    """
+
+    def __init__(self, sink: JsonlEventSink = None):
+        self.sink = sink
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._emails = {}
+
+    def _add(self, name: str, value, email: str = None, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        email = email if email is not None else _current_email.get()
+        with self._lock:
+            self._counters[key] += value
+            email_key = _COUNTERS[name][1]
+            if email is not None and email_key:
+                summary = self._email_summary(email)
+                summary[email_key] += value
+
+    def _email_summary(self, email: str) -> dict:
+        if email not in self._emails:
+            summary = {key: 0 for _, key in _COUNTERS.values() if key}
+            summary["stages"] = {}
+            summary["images"] = {}
+            self._emails[email] = summary
+        return self._emails[email]
+
+    def _emit(self, event_type: str, email: str, data: dict):
+        if self.sink:
+            self.sink.emit(make_event(event_type, email, data))
+
+    @contextmanager
+    def for_email(self, email: str):
+        """Attribute everything recorded inside the block to email"""
+        token = _current_email.set(email)
+        try:
+            yield
+        finally:
+            _current_email.reset(token)
+
+    @contextmanager
+    def stage(self, name: str, email: str = None):
+        """Time a block as one run of a stage: `with metrics.stage("parse", email=...)`"""
+        email = email if email is not None else _current_email.get()
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self._add("dna_stage_seconds_total", seconds, stage=name)
+            self._add("dna_stage_errors_total" if error else "dna_stage_runs_total", 1, stage=name)
+            if email is not None:
+                with self._lock:
+                    stages = self._email_summary(email)["stages"]
+                    stages[name] = stages.get(name, 0.0) + seconds
+            self._emit("stage_completed", email, {"stage": name, "seconds": round(seconds, 4),
+                                                  "error": str(error) if error else None})
+
+    def add_bytes_fetched(self, count: int, stage: str, email: str = None):
+        self._add("dna_bytes_fetched_total", count, email, stage=stage)
+
+    def add_bytes_written(self, count: int, stage: str, email: str = None):
+        self._add("dna_bytes_written_total", count, email, stage=stage)
+
+    def add_images(self, count: int, stage: str, email: str = None):
+        email = email if email is not None else _current_email.get()
+        self._add("dna_images_processed_total", count, email, stage=stage)
+        if email is not None:
+            with self._lock:
+                images = self._email_summary(email)["images"]
+                images[stage] = images.get(stage, 0) + count
+
+    def add_throttle(self, resource: str, email: str = None):
+        self._add("dna_throttled_total", 1, email, resource=resource)
+
+    def add_throttle_wait(self, seconds: float, resource: str, email: str = None):
+        self._add("dna_throttle_wait_seconds_total", seconds, email, resource=resource)
+
+    def record_llm_call(self, response, stage: str, model: str = None, email: str = None) -> dict:
+        """Count one LLM call with its token usage and estimated cost"""
+        email = email if email is not None else _current_email.get()
+        model = (getattr(response, "response_metadata", None) or {}).get("model_name") or model or "unknown"
+        prompt_tokens, completion_tokens = _token_usage(response)
+        cost = estimate_cost(model, prompt_tokens, completion_tokens)
+        self._add("dna_llm_calls_total", 1, email, stage=stage, model=model)
+        self._add("dna_llm_prompt_tokens_total", prompt_tokens, email, stage=stage, model=model)
+        self._add("dna_llm_completion_tokens_total", completion_tokens, email, stage=stage, model=model)
+        self._add("dna_llm_cost_usd_total", cost, email, stage=stage, model=model)
+        usage = {"stage": stage, "model": model, "prompt_tokens": prompt_tokens,
+                 "completion_tokens": completion_tokens, "cost_usd": round(cost, 6)}
+        self._emit("llm_call", email, usage)
+        return usage
+
+    def record_embedding_call(self, model: str, tokens: int, stage: str = "embeddings", email: str = None) -> dict:
+        """Count one embedding request as an LLM call; tokens is an estimate, embeddings report no usage"""
+        email = email if email is not None else _current_email.get()
+        model = model or "unknown"
+        cost = estimate_cost(model, tokens, 0)
+        self._add("dna_llm_calls_total", 1, email, stage=stage, model=model)
+        self._add("dna_llm_prompt_tokens_total", tokens, email, stage=stage, model=model)
+        self._add("dna_llm_cost_usd_total", cost, email, stage=stage, model=model)
+        usage = {"stage": stage, "model": model, "prompt_tokens": tokens, "completion_tokens": 0,
+                 "cost_usd": round(cost, 6)}
+        self._emit("llm_call", email, usage)
+        return usage
+
+    def email_summary(self, email: str) -> dict:
+        with self._lock:
+            summary = self._emails.get(email)
+            return {**summary, "stages": dict(summary["stages"]), "images": dict(summary["images"])} if summary else None
+
+    def pop_email(self, email: str) -> dict:
+        """Per-email breakdown, forgotten afterwards so long runs don't accumulate it"""
+        with self._lock:
+            return self._emails.pop(email, None)
+
+    def snapshot(self) -> dict:
+        """Totals per metric and label set, plus the structured-output parse counters"""
+        # dna_schemas pulls in pydantic; fetch/parse-only runs never need it
+        from dna_schemas import parse_stats
+        with self._lock:
+            counters = list(self._counters.items())
+        totals = defaultdict(dict)
+        for (name, labels), value in counters:
+            label_text = ",".join(f"{k}={v}" for k, v in labels) or "all"
+            totals[name][label_text] = round(value, 6)
+        return {"counters": dict(totals), "parse_stats": parse_stats()}
+
+    def to_prometheus(self) -> str:
+        """All counters in the Prometheus text exposition format"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+        lines = []
+        for name, (help_text, _) in _COUNTERS.items():
+            samples = [(labels, value) for (metric, labels), value in counters if metric == name]
+            if not samples:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                value = int(value) if float(value).is_integer() else repr(value)
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        from dna_schemas import parse_stats
+        stats = parse_stats()
+        if stats:
+            lines.append("# HELP dna_parse_events_total Structured-output parse failures, repairs and fallbacks")
+            lines.append("# TYPE dna_parse_events_total counter")
+            for name, value in sorted(stats.items()):
+                lines.append(f'dna_parse_events_total{{event="{_escape(name)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> str:
+        """Write to_prometheus() atomically, for node_exporter's textfile collector"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+        return path
+
+    def serve_prometheus(self, port: int = 9464, host: str = "127.0.0.1"):
+        """Serve to_prometheus() at http://host:port/metrics from a daemon thread"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def drain(self) -> dict:
+        """Take everything recorded so far and start empty; pair with merge() across processes"""
+        with self._lock:
+            state = {"counters": list(self._counters.items()), "emails": self._emails}
+            self._counters = defaultdict(float)
+            self._emails = {}
+        return state
+
+    def merge(self, state: dict):
+        """Add counters and per-email breakdowns drained from another registry (e.g. a worker process)"""
+        with self._lock:
+            for key, value in state["counters"]:
+                self._counters[key] += value
+            for email, other in state["emails"].items():
+                summary = self._email_summary(email)
+                for field, value in other.items():
+                    if field in ("stages", "images"):
+                        for stage, amount in value.items():
+                            summary[field][stage] = summary[field].get(stage, 0) + amount
+                    else:
+                        summary[field] += value
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._emails.clear()
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+_metrics = PipelineMetrics()
+
+def get_metrics() -> PipelineMetrics:
+    """Process-wide metrics registry every pipeline module records into"""
+    return _metrics
+
+def timed_node(stage: str, node):
+    """Wrap a LangGraph node so each run is timed as `stage` for the email it processes
+
+    functools.wraps keeps the node's signature visible, so LangGraph still
+    passes `config` to nodes that accept it.
+    """
+    @functools.wraps(node)
+    def wrapper(state, **kwargs):
+        with _metrics.for_email(state.get("email_content")), _metrics.stage(stage):
+            return node(state, **kwargs)
+    return wrapper
@@ -0,0 +1,278 @@
+"""
+Staged pipeline runner: fetch → parse/Markdown → DNA analysis, overlapped
+
+Each stage is a worker pool and stages are connected by bounded queues:
+
+    Gmail UIDs ─▶ [fetch: threads, one IMAP connection each]
+               ─▶ [parse + images + Markdown + text: process pool]
+               ─▶ [DNA analysis: threads, capped at llm_concurrency]
+
+A full queue blocks the stage feeding it, so at most roughly
+queue_size + in-flight raw emails are held in memory at any time, however
+many emails the run covers.
+"""
+import os
+import queue
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pipeline_metrics import get_metrics
+
+_STOP = object()
+
+def process_raw_email(email_id: str, raw_email: bytes, output_root: str = "emails",
+                      drain_metrics: bool = False) -> dict:
+    """CPU-bound part of the pipeline for one email; runs in a worker process
+
+    Parses the message, writes Markdown + images to output_root/<key>/ (key
+    from the Message-ID, see output_manifest.email_key) and extracts clean
+    text. If the manifest there shows the same raw email was already
+    converted by the current stage version, nothing is redone. Returns paths,
+    not the parsed content, so little crosses the process boundary. In a pool
+    process, drain_metrics=True also returns (and clears) that process's
+    metrics for the parent to merge; callers in their own process leave it off.
+    """
+    from email_parser import parse_email_content
+    from email_to_markdown import save_email_as_markdown
+    from test_parser import extract_text_from_html
+    from output_manifest import OutputManifest, content_hash, email_key, record_markdown
+
+    metrics = get_metrics()
+    key = email_key(raw_email)
+    email_dir = os.path.join(output_root, key)
+    manifest = OutputManifest(email_dir)
+    raw_hash = content_hash(raw_email)
+    if manifest.is_current("markdown", raw_hash):
+        entry = manifest.entry("markdown")
+        return {"email_id": email_id, "key": key, **entry["outputs"], "skipped": True,
+                "metrics": metrics.drain() if drain_metrics else None}
+
+    with metrics.for_email(email_id):
+        parsed = parse_email_content(raw_email)
+        md_path = save_email_as_markdown(parsed, output_dir=email_dir, filename=f"{key}.md")
+        clean_text = extract_text_from_html(parsed['html_body']) if parsed['html_body'] else ""
+    entry = record_markdown(manifest, raw_hash, parsed, md_path, clean_text_chars=len(clean_text))
+    return {
+        "email_id": email_id,
+        "key": key,
+        **entry["outputs"],
+        "skipped": False,
+        # A pool process has its own registry; the parent merges it back in
+        "metrics": metrics.drain() if drain_metrics else None,
+    }
+
+class PipelineRunner:
+    """Run many emails through every pipeline stage concurrently
+
+    fetch_workers IMAP connections download in parallel, parse_workers
+    processes do the BeautifulSoup/MIME work, and llm_concurrency threads
+    run the DNA workflow (one LLM request in flight per thread). Per-email
+    failures are reported in the returned summary; they never stop the run.
+    """
+
+    def __init__(self, analyzer=None, fetch_workers: int = 4, parse_workers: int = None,
+                 llm_concurrency: int = 4, queue_size: int = 16, output_root: str = "emails",
+                 output_dir: str = "dna_results"):
+        self.analyzer = analyzer
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.llm_concurrency = llm_concurrency
+        self.queue_size = queue_size
+        self.output_root = output_root
+        self.output_dir = output_dir
+        self._results = []
+        self._results_lock = threading.Lock()
+
+    def _record(self, email_id: str, stage: str, error=None, **fields):
+        if error is not None:
+            print(f"❌ {email_id} ({stage}): {error}")
+        with self._results_lock:
+            self._results.append({"email_id": email_id, "stage": stage,
+                                  "error": str(error) if error is not None else None, **fields})
+
+    def run_gmail(self, sender_email: str = "newsfeed@on.com", limit: int = 10) -> list:
+        """Fetch the latest `limit` emails from sender_email and run them through every stage"""
+        from gmail_fetch import GMAIL_MAX_CONNECTIONS, connect_gmail, search_email_uids
+        fetch_workers = self.fetch_workers
+        if fetch_workers > GMAIL_MAX_CONNECTIONS:
+            print(f"⚠️  Gmail allows {GMAIL_MAX_CONNECTIONS} IMAP connections per account; "
+                  f"using {GMAIL_MAX_CONNECTIONS} fetch workers instead of {fetch_workers}")
+            fetch_workers = GMAIL_MAX_CONNECTIONS
+        mail = connect_gmail()
+        try:
+            uids = search_email_uids(mail, sender_email, limit)
+        finally:
+            mail.logout()
+        print(f"📧 Found {len(uids)} emails from {sender_email}")
+
+        uid_queue = queue.Queue(maxsize=self.queue_size)
+
+        def produce():
+            for uid in uids:
+                uid_queue.put(uid)
+            for _ in range(fetch_workers):
+                uid_queue.put(_STOP)
+
+        def fetch_worker(parse_queue):
+            from gmail_fetch import IMAPConnectionLost, close_mailbox, fetch_email_by_uid, open_inbox
+            # Connected lazily, like QueueWorker: a failed connect only fails the UID it was for
+            mail = None
+            while True:
+                uid = uid_queue.get()
+                if uid is _STOP:
+                    break
+                # A connection that drops mid-fetch is replaced and the UID tried once more
+                for attempt in range(2):
+                    try:
+                        if mail is None:
+                            mail = open_inbox()
+                        raw_email = fetch_email_by_uid(mail, uid)['raw_email']
+                    except IMAPConnectionLost as e:
+                        close_mailbox(mail)
+                        mail = None
+                        if attempt == 0:
+                            print(f"🔌 IMAP connection lost fetching {uid} ({e}); reconnecting")
+                            continue
+                        self._record(uid, "fetch", e)
+                    except Exception as e:
+                        self._record(uid, "fetch", e)
+                    else:
+                        parse_queue.put((uid, raw_email))
+                    break
+            if mail is not None:
+                close_mailbox(mail)
+
+        return self._run([threading.Thread(target=produce, daemon=True)],
+                         fetch_worker, fetch_workers)
+
+    def run_raw(self, raw_emails) -> list:
+        """Run already-downloaded (email_id, raw RFC822 bytes) pairs through parse and analysis"""
+        raw_emails = iter(raw_emails)
+
+        def fetch_worker(parse_queue):
+            # Feeding from an iterator: a single worker keeps it simple and ordered
+            for email_id, raw_email in raw_emails:
+                parse_queue.put((email_id, raw_email))
+
+        return self._run([], fetch_worker, 1)
+
+    def _run(self, producers: list, fetch_worker, fetch_workers: int) -> list:
+        self._results = []
+        parse_queue = queue.Queue(maxsize=self.queue_size)
+        analyze_queue = queue.Queue(maxsize=self.queue_size)
+        os.makedirs(self.output_dir, exist_ok=True)
+        print(f"🚀 Pipeline: {fetch_workers} fetch / {self.parse_workers} parse / "
+              f"{self.llm_concurrency} LLM workers, queues of {self.queue_size}")
+
+        fetchers = [threading.Thread(target=fetch_worker, args=(parse_queue,), daemon=True)
+                    for _ in range(fetch_workers)]
+
+        def close_parse_queue():
+            for thread in fetchers:
+                thread.join()
+            parse_queue.put(_STOP)
+
+        analyzers = [threading.Thread(target=self._analyze_worker, args=(analyze_queue,), daemon=True)
+                     for _ in range(self.llm_concurrency)]
+        dispatcher = threading.Thread(target=self._parse_dispatcher, args=(parse_queue, analyze_queue), daemon=True)
+        threads = producers + fetchers + [threading.Thread(target=close_parse_queue, daemon=True),
+                                          dispatcher] + analyzers
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        failed = sum(1 for item in self._results if item["error"])
+        skipped = sum(1 for item in self._results if item["stage"] == "skipped")
+        print(f"🎯 Pipeline complete: {len(self._results) - failed} succeeded ({skipped} unchanged, skipped), "
+              f"{failed} failed → {self.output_dir}")
+        return list(self._results)
+
+    def _parse_dispatcher(self, parse_queue: queue.Queue, analyze_queue: queue.Queue):
+        """Feed the process pool, keeping at most 2 tasks per process in flight"""
+        max_in_flight = self.parse_workers * 2
+        in_flight = deque()
+        metrics = get_metrics()
+
+        def hand_off(future, email_id):
+            try:
+                result = future.result()
+            except Exception as e:
+                self._record(email_id, "parse", e)
+                return
+            child_metrics = result.pop("metrics")
+            if child_metrics:
+                metrics.merge(child_metrics)
+            # Blocks while analysis is behind: this is what bounds the parse stage
+            analyze_queue.put(result)
+
+        def collect(block: bool):
+            if block:
+                wait([future for future, _ in in_flight], return_when=FIRST_COMPLETED)
+            for item in [item for item in in_flight if item[0].done()]:
+                in_flight.remove(item)
+                hand_off(*item)
+
+        stopped = False
+        email_id = None
+        try:
+            # spawn, not fork: forking a process that is running threads can copy held locks
+            with ProcessPoolExecutor(max_workers=self.parse_workers,
+                                     mp_context=multiprocessing.get_context("spawn")) as pool:
+                while True:
+                    item = parse_queue.get()
+                    if item is _STOP:
+                        stopped = True
+                        break
+                    email_id, raw_email = item
+                    while len(in_flight) >= max_in_flight:
+                        collect(block=True)
+                    in_flight.append((pool.submit(process_raw_email, email_id, raw_email, self.output_root,
+                                                  drain_metrics=True), email_id))
+                    email_id = None
+                    collect(block=False)
+                while in_flight:
+                    collect(block=True)
+        except Exception as e:
+            # e.g. BrokenProcessPool after a parse process was killed: fail what's left, don't hang
+            print(f"❌ Parse stage stopped: {e}")
+            if email_id is not None:
+                self._record(email_id, "parse", e)
+            # The pool has shut down, so every in-flight future is settled
+            while in_flight:
+                hand_off(*in_flight.popleft())
+            # Unblock the fetchers and account for everything they still send
+            while not stopped:
+                item = parse_queue.get()
+                if item is _STOP:
+                    stopped = True
+                else:
+                    self._record(item[0], "parse", e)
+        finally:
+            for _ in range(self.llm_concurrency):
+                analyze_queue.put(_STOP)
+
+    def _analyze_worker(self, analyze_queue: queue.Queue):
+        from output_manifest import analyze_incremental
+        while True:
+            item = analyze_queue.get()
+            if item is _STOP:
+                break
+            output_path = os.path.join(self.output_dir, f"{item['key']}.json")
+            try:
+                skipped = analyze_incremental(self.analyzer, item["md_path"], item["images_dir"], output_path)
+            except Exception as e:
+                self._record(item["email_id"], "analyze", e, md_path=item["md_path"])
+                continue
+            self._record(item["email_id"], "skipped" if skipped else "complete", md_path=item["md_path"],
+                         output_path=output_path, subject=item["subject"], message_id=item["message_id"])
+
+def run_pipeline(sender_email: str = "newsfeed@on.com", limit: int = 10, store_path: str = None,
+                 llm_backend: str = None, **runner_options) -> list:
+    """Staged counterpart of main.main(): fetch, parse and analyze emails concurrently"""
+    from langgraph_agents import EmailDNAAnalyzer
+    llm_concurrency = runner_options.get("llm_concurrency", 4)
+    with EmailDNAAnalyzer(max_connections=llm_concurrency, store_path=store_path,
+                          llm_backend=llm_backend) as analyzer:
+        return PipelineRunner(analyzer, **runner_options).run_gmail(sender_email, limit)
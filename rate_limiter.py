@@ -0,0 +1,295 @@
+"""
+Rate-limit-aware scheduling for LLM and IMAP calls: token buckets, backoff, adaptive concurrency
+"""
+import os
+import re
+import time
+import random
+import imaplib
+import threading
+from collections import Counter
+from pipeline_metrics import get_metrics
+
+# Gmail IMAP replies that mean "slow down", not "this request is wrong"
+_IMAP_THROTTLE_MARKERS = ("[THROTTLED]", "TOO MANY SIMULTANEOUS CONNECTIONS", "[UNAVAILABLE]",
+                          "BANDWIDTH LIMITS EXCEEDED")
+
+_RETRYABLE_STATUSES = {408, 409, 500, 502, 503, 504}
+
+def _parse_duration(value) -> float:
+    """Seconds from a header value: "1.5", "20ms", "6m0s" or "1h2m3.5s"; None if unparseable"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts or "".join(number + unit for number, unit in parts) != value:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+def _headers(obj) -> dict:
+    """Lower-cased HTTP headers from an openai error or a LangChain response, if it carries any"""
+    response = getattr(obj, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is None:
+        headers = (getattr(obj, "response_metadata", None) or {}).get("headers")
+    return {str(k).lower(): v for k, v in dict(headers or {}).items()}
+
+def classify_error(exc: Exception) -> str:
+    """"rate_limit", "transient" or None (not worth retrying) for an exception from a scheduled call"""
+    if isinstance(exc, imaplib.IMAP4.abort):
+        # The connection dropped; worth another try, on a new connection
+        return "transient"
+    if isinstance(exc, imaplib.IMAP4.error):
+        message = str(exc).upper()
+        return "rate_limit" if any(marker in message for marker in _IMAP_THROTTLE_MARKERS) else None
+    status = getattr(exc, "status_code", None)
+    if status == 429:
+        return "rate_limit"
+    if status in _RETRYABLE_STATUSES:
+        return "transient"
+    if type(exc).__module__.startswith("openai"):
+        import openai
+        if isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError)):
+            return "transient"
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return "transient"
+    return None
+
+def retry_after(exc: Exception) -> float:
+    """Server-requested delay in seconds from retry-after(-ms) or x-ratelimit-reset-* headers"""
+    headers = _headers(exc)
+    if "retry-after-ms" in headers:
+        milliseconds = _parse_duration(headers["retry-after-ms"])
+        if milliseconds is not None:
+            return milliseconds / 1000
+    for name in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        seconds = _parse_duration(headers.get(name))
+        if seconds is not None:
+            return seconds
+    return None
+
+class TokenBucket:
+    """`per_minute` units per minute, with bursts of up to `capacity`
+
+    reserve() always succeeds and returns how long the caller must wait
+    before using what it reserved; the level may go negative, so waiting
+    callers are served in order instead of racing for the next refill.
+    Not thread-safe on its own: RateLimitScheduler guards it.
+    """
+
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.per_minute = float(per_minute)
+        # Ten seconds' worth by default: providers enforce limits on sub-minute windows too
+        self.capacity = capacity or max(1.0, self.per_minute / 6)
+        self._level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+
+    def reserve(self, amount: float, now: float = None) -> float:
+        now = now if now is not None else time.monotonic()
+        self._refill(now)
+        self._level -= amount
+        return max(0.0, -self._level) * 60 / self.per_minute
+
+    def refund(self, amount: float):
+        """Give back (or, if negative, charge) units once the real cost of a call is known"""
+        self._level = min(self.capacity, self._level + amount)
+
+    def set_rate(self, per_minute: float):
+        self._refill(time.monotonic())
+        self.capacity = self.capacity * per_minute / self.per_minute
+        self.per_minute = float(per_minute)
+        self._level = min(self._level, self.capacity)
+
+    def cap(self, remaining: float):
+        """Lower the level to what the server says is actually left"""
+        self._refill(time.monotonic())
+        self._level = min(self._level, remaining)
+
+class RateLimitScheduler:
+    """Paces calls to one rate-limited service and adapts to what it will sustain
+
+    call(fn, ...) waits for a concurrency slot and for request/token budget
+    (token buckets at rpm/tpm), then runs fn. On a rate-limit error every
+    caller pauses for the server's retry-after (or a jittered exponential
+    backoff) and the concurrency limit is halved; each success grows it
+    back by about one slot per limit's worth of calls (AIMD). Rate-limit
+    headers on responses (x-ratelimit-limit/remaining-*) replace the
+    configured rpm/tpm, so the buckets track the account's real limits.
+    Transient errors (5xx, timeouts) are retried with backoff but don't
+    shrink concurrency. Thread-safe; share one per API key or mailbox.
+    """
+
+    def __init__(self, name: str, rpm: float = None, tpm: float = None, max_concurrency: int = 8,
+                 min_concurrency: int = 1, max_retries: int = 6, base_delay: float = 1.0,
+                 max_delay: float = 60.0, headroom: float = 0.95):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.headroom = headroom
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._slots = threading.Condition()
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    @property
+    def concurrency(self) -> int:
+        """Calls currently allowed in flight at once"""
+        return int(self._limit)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["concurrency"] = self.concurrency
+        stats["rpm"] = self.requests.per_minute if self.requests else None
+        stats["tpm"] = self.tokens.per_minute if self.tokens else None
+        return stats
+
+    def _acquire_slot(self):
+        with self._slots:
+            while self._in_flight >= int(self._limit):
+                self._slots.wait()
+            self._in_flight += 1
+
+    def _release_slot(self):
+        with self._slots:
+            self._in_flight -= 1
+            self._slots.notify_all()
+
+    def _reserve(self, tokens: int) -> float:
+        """Seconds to wait before this call may start; reserves its budget"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._paused_until - now)
+            if self.requests:
+                wait = max(wait, self.requests.reserve(1, now))
+            if self.tokens and tokens:
+                wait = max(wait, self.tokens.reserve(tokens, now))
+            return wait
+
+    def _backoff(self, exc: Exception, kind: str, attempt: int) -> float:
+        delay = retry_after(exc)
+        if delay is None:
+            # Full jitter: spreads retries from many threads over the whole window
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        else:
+            # A little jitter so everyone told "retry in 2s" doesn't return in the same instant
+            delay = min(self.max_delay, delay) * random.uniform(1.0, 1.2)
+        with self._lock:
+            self._stats["retries"] += 1
+            if kind != "rate_limit":
+                self._stats["transient_errors"] += 1
+                return delay
+            self._stats["throttled"] += 1
+            now = time.monotonic()
+            # One decrease per throttling episode, not one per concurrent 429
+            if now >= self._paused_until:
+                self._limit = max(float(self.min_concurrency), self._limit / 2)
+            self._paused_until = max(self._paused_until, now + delay)
+        get_metrics().add_throttle(self.name)
+        return delay
+
+    def _on_success(self, result, tokens: int):
+        headers = _headers(result)
+        usage = getattr(result, "usage_metadata", None) or {}
+        with self._lock:
+            self._stats["calls"] += 1
+            self._limit = min(float(self.max_concurrency), self._limit + 1 / self._limit)
+            if self.tokens and usage.get("total_tokens"):
+                self.tokens.refund(tokens - usage["total_tokens"])
+            for bucket_name, kind in (("requests", "requests"), ("tokens", "tokens")):
+                limit = _parse_duration(headers.get(f"x-ratelimit-limit-{kind}"))
+                remaining = _parse_duration(headers.get(f"x-ratelimit-remaining-{kind}"))
+                if not limit:
+                    continue
+                bucket = getattr(self, bucket_name)
+                if bucket is None:
+                    bucket = TokenBucket(limit * self.headroom)
+                    setattr(self, bucket_name, bucket)
+                elif bucket.per_minute != limit * self.headroom:
+                    bucket.set_rate(limit * self.headroom)
+                if remaining is not None:
+                    bucket.cap(remaining)
+
+    def call(self, fn, *args, tokens: int = 0, **kwargs):
+        """Run fn(*args, **kwargs) within the limits, retrying throttled and transient failures
+
+        tokens is the estimated token cost, charged against tpm up front and
+        corrected from the response's usage_metadata afterwards.
+        """
+        metrics = get_metrics()
+        for attempt in range(self.max_retries + 1):
+            start = time.monotonic()
+            self._acquire_slot()
+            try:
+                wait = self._reserve(tokens)
+                if wait:
+                    time.sleep(wait)
+                waited = time.monotonic() - start
+                if waited > 0.001:
+                    metrics.add_throttle_wait(waited, self.name)
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                kind = classify_error(e)
+                if kind is None or attempt == self.max_retries:
+                    raise
+                delay = self._backoff(e, kind, attempt)
+            else:
+                self._on_success(result, tokens)
+                return result
+            finally:
+                self._release_slot()
+            # Back off outside the slot so other callers can drain what's already in flight
+            time.sleep(delay)
+            metrics.add_throttle_wait(delay, self.name)
+
+def _env_number(name: str, cast=float):
+    value = os.getenv(name)
+    return cast(value) if value else None
+
+def _scheduler_from_env(name: str) -> RateLimitScheduler:
+    if name == "llm":
+        return RateLimitScheduler("llm", rpm=_env_number("DNA_LLM_RPM"), tpm=_env_number("DNA_LLM_TPM"),
+                                  max_concurrency=_env_number("DNA_LLM_MAX_CONCURRENCY", int) or 16)
+    if name == "imap":
+        # Caps commands in flight across this process's IMAP connections, not the connections
+        # themselves: see gmail_fetch.GMAIL_MAX_CONNECTIONS for Gmail's per-account limit
+        return RateLimitScheduler("imap", rpm=_env_number("DNA_IMAP_RPM"),
+                                  max_concurrency=_env_number("DNA_IMAP_MAX_CONCURRENCY", int) or 10,
+                                  base_delay=2.0)
+    if name == "embeddings":
+        return RateLimitScheduler("embeddings", rpm=_env_number("DNA_EMBEDDINGS_RPM"),
+                                  tpm=_env_number("DNA_EMBEDDINGS_TPM"),
+                                  max_concurrency=_env_number("DNA_EMBEDDINGS_MAX_CONCURRENCY", int) or 8)
+    return RateLimitScheduler(name)
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+def get_scheduler(name: str) -> RateLimitScheduler:
+    """Process-wide scheduler per service ("llm", "imap", "embeddings"), configured from the environment
+
+    DNA_LLM_RPM / DNA_LLM_TPM / DNA_LLM_MAX_CONCURRENCY, DNA_IMAP_RPM /
+    DNA_IMAP_MAX_CONCURRENCY and DNA_EMBEDDINGS_RPM / DNA_EMBEDDINGS_TPM /
+    DNA_EMBEDDINGS_MAX_CONCURRENCY set the starting limits; response headers
+    refine the LLM ones as calls come back.
+    """
+    with _schedulers_lock:
+        if name not in _schedulers:
+            _schedulers[name] = _scheduler_from_env(name)
+        return _schedulers[name]
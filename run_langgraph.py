@@ -1,35 +1,45 @@
 #!/usr/bin/env python3
 """
 LangGraph Email DNA Analysis Runner
+
+Usage: python run_langgraph.py [EMAIL_MD [IMAGES_DIR]] [--output JSON]
 """
 import os
-from langgraph_agents import run_email_dna_analysis
+import argparse
+from langgraph_agents import run_email_dna_analysis, DEFAULT_EMAIL_PATH, DEFAULT_IMAGES_DIR
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the LangGraph DNA analysis on one Markdown email")
+    parser.add_argument("email_path", nargs="?", default=DEFAULT_EMAIL_PATH, help="Markdown email to analyze")
+    parser.add_argument("images_dir", nargs="?", default=DEFAULT_IMAGES_DIR, help="that email's images directory")
+    parser.add_argument("--output", default="email_dna_langgraph.json")
+    args = parser.parse_args(argv)
+    
     print("🔗 LangGraph Email DNA Analysis System")
     print("=" * 50)
     
-    # Check API key
-    if not os.getenv('OPENAI_API_KEY'):
-        print("❌ Please set OPENAI_API_KEY in .env file")
+    # Check API key; the offline fake backend needs none
+    if os.getenv("DNA_LLM_BACKEND", "openai") != "fake" and not os.getenv('OPENAI_API_KEY'):
+        print("❌ Please set OPENAI_API_KEY in .env file (or DNA_LLM_BACKEND=fake to run offline)")
         return
     
     # Check files exist
-    email_path = "/home/auriga/Documents/MarseerEngineering/emails/Youre-in-Welcome-to-the-Community.md"
-    images_path = "/home/auriga/Documents/MarseerEngineering/images"
+    email_path = args.email_path
+    images_path = args.images_dir
     
     if not os.path.exists(email_path):
-        print("❌ Email content not found")
+        print(f"❌ Email content not found: {email_path}")
         return
     
     if not os.path.exists(images_path):
-        print("❌ Images directory not found")
+        print(f"❌ Images directory not found: {images_path}")
         return
     
     try:
-        result = run_email_dna_analysis()
+        result = run_email_dna_analysis(email_path, images_path, args.output)
         print(f"\n✅ Analysis complete!")
-        print(f"📈 Overall Score: {result['final_dna']['email_dna']['overall_score']}")
+        meta = result['final_dna']['email_dna'].get('meta_data', {})
+        print(f"📈 Overall Score: {meta.get('overall_effectiveness_score')}")
         
     except Exception as e:
         print(f"❌ Error: {str(e)}")
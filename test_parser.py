@@ -1,30 +1,56 @@
-from email_parser import parse_email_content
-from gmail_fetch import fetch_emails_from_sender
+import os
 from bs4 import BeautifulSoup
-import requests
+from pipeline_metrics import get_metrics
 
-def extract_text_from_html(html_content):
-    """Extract clean text from HTML"""
+# Seconds to wait on one remote image host before giving up on that image
+IMAGE_DOWNLOAD_TIMEOUT = 10
+
+def extract_text_from_html(html_content, images_dir=None):
+    """Extract clean text from HTML
+    
+    Remote <img> sources are downloaded into images_dir only if one is given;
+    the pipeline passes none, since it needs the text and nothing else.
+    """
     if not html_content:
         return ""
-    soup = BeautifulSoup(html_content, 'html.parser')
+    # Includes any image downloads, which are also timed on their own as image_download
+    with get_metrics().stage("text_extract"):
+        soup = BeautifulSoup(html_content, 'html.parser')
 
-    extract_images_from_email(soup)
+        if images_dir:
+            extract_images_from_email(soup, images_dir)
 
-    return soup.get_text(strip=True)
+        return soup.get_text(strip=True)
 
 
-def extract_images_from_email(soup):
+def extract_images_from_email(soup, images_dir="images"):
+    """Download remote images to images_dir; a failed download is reported and skipped"""
     if not soup:
         return
+    metrics = get_metrics()
     for i, img in enumerate(soup.find_all("img")):
         url = img.get("src")
         if url and url.startswith("http"):
-            data = requests.get(url).content
-            with open(f"images/image_{i+1}.jpg", "wb") as f:
-                f.write(data)
+            import requests  # only emails with remote images pay for the import
+            os.makedirs(images_dir, exist_ok=True)
+            try:
+                with metrics.stage("image_download"):
+                    response = requests.get(url, timeout=IMAGE_DOWNLOAD_TIMEOUT)
+                    response.raise_for_status()
+                    data = response.content
+                    with open(os.path.join(images_dir, f"image_{i+1}.jpg"), "wb") as f:
+                        f.write(data)
+            except (requests.RequestException, OSError) as e:
+                print(f"⚠️  Skipping image {url}: {e}")
+                continue
+            metrics.add_bytes_fetched(len(data), "image_download")
+            metrics.add_bytes_written(len(data), "image_download")
+            metrics.add_images(1, "image_download")
 
 if __name__ == "__main__":
+    from email_parser import parse_email_content
+    from gmail_fetch import fetch_emails_from_sender
+    
     # Test with one email
     emails = fetch_emails_from_sender("newsfeed@on.com", limit=1)
     
@@ -40,7 +66,7 @@ if __name__ == "__main__":
         
         # Extract readable text from HTML
         if parsed['html_body']:
-            clean_text = extract_text_from_html(parsed['html_body'])
+            clean_text = extract_text_from_html(parsed['html_body'], images_dir="images")
             print(f"\n📄 Clean Text Preview (first 300 chars):")
             print(clean_text[:300] + "..." if len(clean_text) > 300 else clean_text)
         
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+# The pipeline is a set of top-level modules, not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def raw_emails():
+    """A few deterministic synthetic newsletters (raw RFC822 bytes), each with its own Message-ID"""
+    from benchmark import generate_corpus
+    return [item["raw_email"] for item in generate_corpus(count=3, seed=11, profiles=("small",))]
+
+@pytest.fixture
+def eml_files(tmp_path, raw_emails):
+    paths = []
+    for i, raw_email in enumerate(raw_emails):
+        path = tmp_path / f"email_{i}.eml"
+        path.write_bytes(raw_email)
+        paths.append(str(path))
+    return paths
+
+@pytest.fixture
+def prepared(tmp_path, raw_emails):
+    """One email converted to emails/<key>/ (Markdown + images) as the pipeline does it"""
+    from pipeline_runner import process_raw_email
+    return process_raw_email("1", raw_emails[0], str(tmp_path / "emails"))
@@ -0,0 +1,52 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from markdown_extract import extract_raw_content
+from pipeline_runner import process_raw_email
+
+@pytest.fixture(scope="module")
+def analyzer():
+    from langgraph_agents import EmailDNAAnalyzer
+    with EmailDNAAnalyzer(llm_backend="fake") as analyzer:
+        yield analyzer
+
+@pytest.fixture
+def inputs(tmp_path, raw_emails):
+    converted = [process_raw_email(str(i), raw_email, str(tmp_path / "emails")) for i, raw_email in enumerate(raw_emails)]
+    return [(item["md_path"], item["images_dir"]) for item in converted]
+
+def run_batch(analyzer, inputs, output_dir, asynchronous, **options):
+    if asynchronous:
+        return asyncio.run(analyzer.abatch(inputs, output_dir, **options))
+    return analyzer.batch(inputs, output_dir, **options)
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_every_email_gets_its_own_output(analyzer, inputs, tmp_path, asynchronous):
+    summary = run_batch(analyzer, inputs, str(tmp_path / "out"), asynchronous, chunk_size=2)
+    assert [(item["email_content"], item["images_dir"]) for item in summary] == inputs
+    assert all(item["error"] is None for item in summary)
+    for (md_path, _), item in zip(inputs, summary):
+        with open(item["output_path"]) as f:
+            dna = json.load(f)["email_dna"]
+        with open(md_path) as f:
+            expected = extract_raw_content(f.read())["original_email"]
+        assert dna["raw_data"]["original_email"]["raw_markdown"] == expected["raw_markdown"]
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_failed_email_does_not_stop_the_batch(analyzer, inputs, tmp_path, asynchronous):
+    broken = (str(tmp_path / "missing.md"), str(tmp_path / "missing_images"))
+    summary = run_batch(analyzer, [broken] + inputs, str(tmp_path / "out"), asynchronous, chunk_size=2)
+    assert summary[0]["output_path"] is None and "missing.md" in summary[0]["error"]
+    assert all(item["error"] is None for item in summary[1:])
+
+def test_same_file_names_do_not_overwrite_each_other(analyzer, inputs, tmp_path):
+    md_path, images_dir = inputs[0]
+    copy_dir = tmp_path / "copy"
+    copy_dir.mkdir()
+    copy = copy_dir / os.path.basename(md_path)
+    copy.write_text(open(md_path).read())
+    summary = analyzer.batch([inputs[0], (str(copy), images_dir)], str(tmp_path / "out"))
+    assert len({item["output_path"] for item in summary}) == 2
@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import cli
+import main
+from output_manifest import OutputManifest, email_key
+
+def test_markdown_command_converts_once(eml_files, raw_emails, tmp_path, capsys):
+    root = str(tmp_path / "converted")
+    assert cli.main(["markdown", *eml_files, "--output-dir", root]) == 0
+    for raw_email in raw_emails:
+        key = email_key(raw_email)
+        assert os.path.exists(os.path.join(root, key, f"{key}.md"))
+        assert OutputManifest(os.path.join(root, key)).entry("markdown")["outputs"]["clean_text_chars"] > 0
+
+    capsys.readouterr()
+    cli.main(["markdown", *eml_files, "--output-dir", root])
+    assert capsys.readouterr().out.count("Markdown unchanged") == len(eml_files)
+
+def test_main_converts_through_the_shared_stage(raw_emails, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    emails = [{"id": str(i), "raw_email": raw_email} for i, raw_email in enumerate(raw_emails)]
+    monkeypatch.setattr(main, "fetch_emails_from_sender", lambda sender, limit: emails)
+    monkeypatch.setattr(main, "_load_dna_analyzer", lambda: None)
+
+    main.main(metrics_file=None)
+    keys = sorted(email_key(raw_email) for raw_email in raw_emails)
+    assert sorted(os.listdir("emails")) == keys
+    assert all(OutputManifest(os.path.join("emails", key)).entry("markdown") for key in keys)
+
+HEAVY_MODULES = ("langgraph", "langchain_core", "langchain_openai", "openai", "numpy", "pydantic", "httpx")
+
+@pytest.mark.parametrize("command", ["parse", "markdown"])
+def test_light_commands_do_not_import_the_analysis_stack(command, eml_files):
+    # A fresh interpreter: this one has long since imported everything
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = (f"import sys; sys.path.insert(0, {root!r}); import cli; "
+            f"cli.main([{command!r}, {eml_files[0]!r}]); "
+            f"print(sorted({{name.split('.')[0] for name in sys.modules}} & set({HEAVY_MODULES!r})))")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == "[]"
+
+def test_analyze_command_skips_unchanged_emails(eml_files, tmp_path, capsys):
+    root = str(tmp_path / "converted")
+    cli.main(["markdown", eml_files[0], "--output-dir", root])
+    [key] = os.listdir(root)
+    md_path = os.path.join(root, key, f"{key}.md")
+    args = ["analyze", md_path, "--output-dir", str(tmp_path / "dna"), "--llm-backend", "fake"]
+
+    assert cli.main(args) == 0
+    assert os.path.exists(tmp_path / "dna" / f"{key}.json")
+    capsys.readouterr()
+    assert cli.main(args) == 0
+    assert "Unchanged" in capsys.readouterr().out
+
+def test_analyze_command_fails_on_missing_markdown(tmp_path):
+    args = ["analyze", str(tmp_path / "missing.md"), "--output-dir", str(tmp_path / "dna"), "--llm-backend", "fake"]
+    assert cli.main(args) == 1
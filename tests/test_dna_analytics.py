@@ -0,0 +1,73 @@
+import pytest
+
+from dna_analytics import DNAAnalytics
+from dna_store import DNAResultStore
+
+def dna(sender, date, score, urgency=5, email_type="promotional"):
+    return {"email_dna": {
+        "meta_data": {"email_type": email_type, "overall_effectiveness_score": score},
+        "raw_data": {"original_email": {"sender": sender, "date": date, "subject_line": "Sale"},
+                     "content_stats": {"total_links": 3, "total_images": 2, "total_words": 100}},
+        "content_dna": {"psychological_triggers": {"urgency_score": urgency}, "cta_dna": {"cta_count": 1}},
+    }}
+
+ON = "On <news@on.com>"
+NIKE = "Nike <hello@nike.com>"
+
+@pytest.fixture
+def store(tmp_path):
+    store = DNAResultStore(str(tmp_path / "dna.sqlite"))
+    # Mon 6 and Wed 8 Jan 2025 are one week; Mon 13 Jan starts the next
+    store.save("a", dna(ON, "Mon, 6 Jan 2025 09:00:00 +0000", 6.0))
+    store.save("b", dna(ON, "Wed, 8 Jan 2025 09:00:00 +0000", 8.0))
+    store.save("c", dna(ON, "Mon, 13 Jan 2025 09:00:00 +0000", 7.0))
+    store.save("d", dna(NIKE, "Tue, 7 Jan 2025 09:00:00 +0000", 9.0, urgency=9))
+    store.save("e", dna(NIKE, None, None))
+    yield store
+    store.close()
+
+def test_by_group_matches_the_sql_aggregate(store):
+    analytics = DNAAnalytics(store)
+    assert analytics.refresh() == 5
+    rows = {row["sender"]: row for row in analytics.by_group("overall_score")}
+    assert rows[ON] == {"sender": ON, "count": 3, "mean": 7.0, "std": 0.816, "min": 6.0, "max": 8.0}
+    # Missing scores are skipped, like SQL AVG does
+    assert rows[NIKE]["count"] == 1 and rows[NIKE]["mean"] == 9.0
+    for row in store.aggregate("sender", "overall_score"):
+        if row["sender"] in rows:
+            assert (rows[row["sender"]]["min"], rows[row["sender"]]["max"]) == (row["min"], row["max"])
+            assert rows[row["sender"]]["mean"] == pytest.approx(row["avg"])
+
+def test_weeks_start_on_monday(store):
+    analytics = DNAAnalytics(store)
+    analytics.refresh()
+    rows = [(row["sender"], row["week"], row["count"]) for row in analytics.by_group_week("overall_score")]
+    assert rows == [(NIKE, "2025-01-06", 1), (ON, "2025-01-06", 2), (ON, "2025-01-13", 1)]
+
+def test_refresh_only_reads_new_and_changed_rows(store):
+    analytics = DNAAnalytics(store)
+    analytics.refresh()
+    assert analytics.refresh() == 0
+
+    store.save("a", dna(ON, "Mon, 6 Jan 2025 09:00:00 +0000", 9.0))
+    store.save("f", dna(NIKE, "Tue, 14 Jan 2025 09:00:00 +0000", 5.0, email_type="newsletter"))
+    assert analytics.refresh() == 2
+    assert len(analytics) == 6
+    rows = {row["sender"]: row for row in analytics.by_group("overall_score")}
+    assert rows[ON]["max"] == 9.0 and rows[ON]["count"] == 3
+    assert {row["email_type"] for row in analytics.by_group("overall_score", "email_type")} == \
+        {"promotional", "newsletter"}
+
+def test_distribution_for_one_group(store):
+    analytics = DNAAnalytics(store)
+    analytics.refresh()
+    histogram = analytics.distribution("urgency_score", bins=2, group_by="sender_domain", group="nike.com")
+    assert sum(histogram["counts"]) == 2
+    assert analytics.distribution("urgency_score", group_by="sender_domain", group="adidas.com") == \
+        {"counts": [], "edges": []}
+
+def test_aggregate_rejects_unknown_columns(store):
+    with pytest.raises(ValueError):
+        store.aggregate("subject; DROP TABLE email_dna", "overall_score")
+    assert store.aggregate("sender_domain", "urgency_score", sender_domain="nike.com") == \
+        [{"sender_domain": "nike.com", "count": 2, "avg": 7.0, "min": 5, "max": 9}]
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+from dna_checkpoint import ImageProgressStore, thread_id_for
+from dna_schemas import fallback_reasons
+from langgraph_agents import EmailDNAAnalyzer
+
+@pytest.fixture
+def checkpoint_path(tmp_path):
+    return str(tmp_path / "checkpoints.sqlite")
+
+def llm_calls(analyzer):
+    # The fake backend uses one model for both roles
+    return analyzer.agents.llm.stats.get("calls", 0)
+
+def test_thread_id_tracks_markdown_images_and_model(prepared):
+    md_path, images_dir = prepared["md_path"], prepared["images_dir"]
+    base = thread_id_for(md_path, images_dir, "fake-gpt-4o")
+    assert thread_id_for(md_path, images_dir, "fake-gpt-4o") == base
+    assert thread_id_for(md_path, images_dir, "gpt-4o") != base
+
+    image = os.path.join(images_dir, sorted(os.listdir(images_dir))[0])
+    with open(image, "ab") as f:
+        f.write(b"\0")
+    assert thread_id_for(md_path, images_dir, "fake-gpt-4o") != base
+
+def test_finished_run_is_resumed_without_llm_calls(prepared, checkpoint_path, capsys):
+    with EmailDNAAnalyzer(llm_backend="fake", checkpoint_path=checkpoint_path) as analyzer:
+        first = analyzer.analyze(prepared["md_path"], prepared["images_dir"])
+    with EmailDNAAnalyzer(llm_backend="fake", checkpoint_path=checkpoint_path) as analyzer:
+        again = analyzer.analyze(prepared["md_path"], prepared["images_dir"])
+        assert llm_calls(analyzer) == 0
+    assert "Resuming checkpointed run" in capsys.readouterr().out
+    assert again["final_dna"] == first["final_dna"]
+
+def test_interrupted_run_resumes_after_finished_images(prepared, checkpoint_path, monkeypatch):
+    with EmailDNAAnalyzer(llm_backend="fake", checkpoint_path=checkpoint_path) as analyzer:
+        analyze_image = analyzer.agents.analyze_single_image
+        analyzed = []
+
+        def crash_on_second(image_path, filename):
+            if analyzed:
+                raise KeyboardInterrupt("worker killed")
+            analyzed.append(filename)
+            return analyze_image(image_path, filename)
+
+        monkeypatch.setattr(analyzer.agents, "analyze_single_image", crash_on_second)
+        with pytest.raises(KeyboardInterrupt):
+            analyzer.analyze(prepared["md_path"], prepared["images_dir"])
+
+    with EmailDNAAnalyzer(llm_backend="fake", checkpoint_path=checkpoint_path) as analyzer:
+        result = analyzer.analyze(prepared["md_path"], prepared["images_dir"])
+        # Only the images the first run didn't finish; content analysis is not redone
+        assert llm_calls(analyzer) == prepared["images"] - 1
+    assert result["final_dna"]["email_dna"]["visual_dna"]["summary"]["total_images"] == prepared["images"]
+
+    thread_id = thread_id_for(prepared["md_path"], prepared["images_dir"], analyzer.model_names)
+    progress = ImageProgressStore(checkpoint_path)
+    assert progress.load(thread_id) == {}
+    progress.close()
+
+def test_fallback_run_is_retried_not_resumed(prepared, checkpoint_path, monkeypatch, capsys):
+    monkeypatch.setenv("DNA_FAKE_LLM_INVALID_RATE", "1.0")
+    with EmailDNAAnalyzer(llm_backend="fake", checkpoint_path=checkpoint_path) as analyzer:
+        first = analyzer.analyze(prepared["md_path"], prepared["images_dir"])
+    assert fallback_reasons(first["final_dna"])
+
+    monkeypatch.delenv("DNA_FAKE_LLM_INVALID_RATE")
+    with EmailDNAAnalyzer(llm_backend="fake", checkpoint_path=checkpoint_path) as analyzer:
+        again = analyzer.analyze(prepared["md_path"], prepared["images_dir"])
+        assert llm_calls(analyzer) == 1 + prepared["images"]
+    assert "Retrying checkpointed run" in capsys.readouterr().out
+    assert fallback_reasons(again["final_dna"]) == []
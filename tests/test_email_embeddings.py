@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import pytest
+
+from email_embeddings import EmbeddingIndex, HashingEmbeddings, create_embeddings
+
+def test_fake_backend_defaults_to_local_embeddings(monkeypatch):
+    monkeypatch.setenv("DNA_LLM_BACKEND", "fake")
+    assert isinstance(create_embeddings(), HashingEmbeddings)
+    with pytest.raises(ValueError):
+        create_embeddings("word2vec")
+
+def test_fake_analyzer_embeds_without_an_api_key(prepared, tmp_path, monkeypatch):
+    from langgraph_agents import EmailDNAAnalyzer
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.delenv("DNA_LLM_BACKEND", raising=False)
+    with EmailDNAAnalyzer(llm_backend="fake", store_path=str(tmp_path / "dna.sqlite"),
+                          embedding_dir=str(tmp_path / "embeddings")) as analyzer:
+        assert isinstance(analyzer.embedding_index.embeddings, HashingEmbeddings)
+        result = analyzer.analyze(prepared["md_path"], prepared["images_dir"])
+        message_id = result["final_dna"]["email_dna"]["meta_data"]["message_id"]
+        assert len(analyzer.embedding_index) == 1
+        assert analyzer.embedding_index.similar_to(message_id) == []
+
+def make_index(tmp_path, dim=16):
+    return EmbeddingIndex(str(tmp_path / "index"), HashingEmbeddings(dim=dim))
+
+def test_search_and_superseded_rows(tmp_path):
+    index = make_index(tmp_path)
+    index.add_text("a", "trail running shoes sale")
+    index.add_text("b", "trail running shoes sale today")
+    index.add_text("c", "quarterly investor update")
+    index.add_text("a", "quarterly investor update and results")
+    assert len(index) == 3
+    assert [message_id for message_id, _ in index.search_text("trail running shoes", k=3)][0] == "b"
+    assert index.similar_to("c", k=1)[0][0] == "a"
+
+    reopened = make_index(tmp_path)
+    assert len(reopened) == 3
+    assert reopened.similar_to("c", k=1) == index.similar_to("c", k=1)
+
+def test_torn_vector_row_is_dropped_on_open(tmp_path):
+    index = make_index(tmp_path)
+    index.add_text("a", "first email")
+    index.add_text("b", "second email")
+    # Crash halfway through writing b's vector
+    with open(index._vectors_path, "r+b") as f:
+        f.truncate(16 * 4 + 10)
+
+    reopened = make_index(tmp_path)
+    assert len(reopened) == 1
+    assert os.path.getsize(reopened._vectors_path) == 16 * 4
+    reopened.add_text("b", "second email")
+    assert reopened.similar_to("a", k=1)[0][0] == "b"
+
+def test_vector_without_id_is_dropped_on_open(tmp_path):
+    index = make_index(tmp_path)
+    index.add_text("a", "first email")
+    # Crash after the vector but before its id was appended
+    with open(index._vectors_path, "ab") as f:
+        f.write(np.ones(16, dtype=np.float32).tobytes())
+
+    reopened = make_index(tmp_path)
+    assert len(reopened) == 1
+    assert os.path.getsize(reopened._vectors_path) == 16 * 4
+    reopened.add_text("b", "second email")
+    assert [message_id for message_id, _ in reopened.search_text("second email", k=2)] == ["b", "a"]
+
+def test_dimension_mismatch_is_rejected(tmp_path):
+    index = make_index(tmp_path)
+    index.add("a", np.ones(16))
+    with pytest.raises(ValueError):
+        index.add("b", np.ones(8))
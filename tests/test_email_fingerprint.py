@@ -0,0 +1,89 @@
+import pytest
+
+from email_fingerprint import minhash_signature, offer_numbers, text_similarity
+
+BODY = """Spring is here and so is our biggest sale of the season.
+Take {offer} off everything in store and online, from running shoes to rain jackets.
+Members get free shipping on every order and early access to new colours.
+Visit your nearest store or shop the full collection on our website.
+Questions? Our support team answers every message within one business day."""
+
+def write_email(tmp_path, name, offer="20%", message_id=None, sender="News <news@shop.example>"):
+    header = [f"# Spring sale: {offer} off", "", f"**From:** {sender}", "**Date:** Mon, 3 Mar 2025 09:00:00 +0000"]
+    if message_id:
+        header.append(f"**Message-ID:** {message_id}")
+    path = tmp_path / f"{name}.md"
+    path.write_text("\n".join(header) + "\n\n---\n\n" + BODY.format(offer=offer) + "\n")
+    return str(path)
+
+def test_offer_numbers():
+    assert offer_numbers("Take 20% off, now $49.99 (was $ 60) or 15 EUR") == ["$49.99", "$60", "15eur", "20%"]
+    assert offer_numbers("Order 12345 ships on 3 March 2025") == []
+
+def test_offer_change_still_looks_like_the_same_template():
+    before, after = BODY.format(offer="20%"), BODY.format(offer="50%")
+    assert text_similarity(minhash_signature(before), minhash_signature(after)) == 1.0
+    assert offer_numbers(before) != offer_numbers(after)
+
+@pytest.fixture
+def analyzer(tmp_path):
+    from langgraph_agents import EmailDNAAnalyzer
+    with EmailDNAAnalyzer(store_path=str(tmp_path / "dna.sqlite"), dedupe_threshold=0.9,
+                          llm_backend="fake") as analyzer:
+        yield analyzer
+
+def llm_calls(analyzer):
+    return analyzer.agents.llm.stats["calls"]
+
+def no_images(tmp_path):
+    return str(tmp_path / "no_images")
+
+def test_resend_reuses_stored_dna(analyzer, tmp_path):
+    analyzer.analyze(write_email(tmp_path, "first", message_id="<a@shop>"), no_images(tmp_path))
+    calls = llm_calls(analyzer)
+
+    result = analyzer.analyze(write_email(tmp_path, "resend", message_id="<b@shop>"), no_images(tmp_path))
+    meta = result["final_dna"]["email_dna"]["meta_data"]
+    assert llm_calls(analyzer) == calls
+    assert meta["message_id"] == "<b@shop>"
+    assert meta["reused_from"]["message_id"] == "<a@shop>"
+    assert analyzer.store.get("<b@shop>") is not None
+
+def test_changed_offer_is_analyzed_again(analyzer, tmp_path):
+    analyzer.analyze(write_email(tmp_path, "first", message_id="<a@shop>"), no_images(tmp_path))
+    calls = llm_calls(analyzer)
+
+    result = analyzer.analyze(write_email(tmp_path, "bigger", offer="50%", message_id="<b@shop>"),
+                              no_images(tmp_path))
+    assert llm_calls(analyzer) == calls + 1
+    assert "reused_from" not in result["final_dna"]["email_dna"]["meta_data"]
+
+def test_other_sender_is_not_a_duplicate(analyzer, tmp_path):
+    analyzer.analyze(write_email(tmp_path, "first", message_id="<a@shop>"), no_images(tmp_path))
+    calls = llm_calls(analyzer)
+    analyzer.analyze(write_email(tmp_path, "copycat", message_id="<b@other>", sender="x@other.example"),
+                     no_images(tmp_path))
+    assert llm_calls(analyzer) == calls + 1
+
+def test_fallback_dna_is_never_reused(analyzer, tmp_path):
+    first = analyzer.analyze(write_email(tmp_path, "first", message_id="<a@shop>"), no_images(tmp_path))
+    # A fallback row left behind by an older version, still in the fingerprint index
+    dna = first["final_dna"]["email_dna"]
+    dna["meta_data"].update(analysis_status="fallback", fallback_reasons=["content: RateLimitError"])
+    analyzer.store.save("<a@shop>", first["final_dna"])
+    calls = llm_calls(analyzer)
+
+    result = analyzer.analyze(write_email(tmp_path, "resend", message_id="<b@shop>"), no_images(tmp_path))
+    assert llm_calls(analyzer) == calls + 1
+    assert "reused_from" not in result["final_dna"]["email_dna"]["meta_data"]
+
+def test_markdown_is_read_once_per_run(analyzer, tmp_path, monkeypatch):
+    import langgraph_agents
+    extracted = []
+    extract = langgraph_agents.extract_raw_content
+    monkeypatch.setattr(langgraph_agents, "extract_raw_content",
+                        lambda *args, **kwargs: extracted.append(args) or extract(*args, **kwargs))
+
+    analyzer.analyze(write_email(tmp_path, "first", message_id="<a@shop>"), no_images(tmp_path))
+    analyzer.analyze(write_email(tmp_path, "resend", message_id="<b@shop>"), no_images(tmp_path))
+    assert len(extracted) == 2
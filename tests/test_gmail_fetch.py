@@ -0,0 +1,44 @@
+import imaplib
+import socket
+
+import pytest
+
+import gmail_fetch
+from gmail_fetch import GMAIL_MAX_CONNECTIONS, IMAPConnectionLost, _imap_command
+from rate_limiter import classify_error
+
+class Command:
+    """An IMAP command method raising the given errors in order, then replying OK"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, *args):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "OK", [b"1 2 3"]
+
+@pytest.mark.parametrize("error", [imaplib.IMAP4.abort("socket error: EOF"), socket.timeout("timed out"),
+                                   ConnectionResetError()])
+def test_dropped_connection_is_not_retried_on_the_same_socket(error):
+    command = Command(error)
+    with pytest.raises(IMAPConnectionLost):
+        _imap_command(command, "inbox")
+    assert command.calls == 1
+    assert classify_error(IMAPConnectionLost("gone")) is None
+
+def test_no_reply_raises():
+    with pytest.raises(imaplib.IMAP4.error, match="no such mailbox"):
+        _imap_command(lambda *args: ("NO", [b"no such mailbox"]))
+
+def test_runner_caps_fetch_workers_at_gmail_connection_limit(monkeypatch):
+    from pipeline_runner import PipelineRunner
+    runner = PipelineRunner(fetch_workers=GMAIL_MAX_CONNECTIONS + 5)
+    monkeypatch.setattr(gmail_fetch, "connect_gmail", lambda: type("Mail", (), {"logout": lambda self: None})())
+    monkeypatch.setattr(gmail_fetch, "search_email_uids", lambda mail, sender, limit: [])
+    started = []
+    monkeypatch.setattr(runner, "_run", lambda producers, fetch_worker, fetch_workers: started.append(fetch_workers) or [])
+    runner.run_gmail(limit=1)
+    assert started == [GMAIL_MAX_CONNECTIONS]
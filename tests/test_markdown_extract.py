@@ -0,0 +1,167 @@
+import json
+import os
+import re
+
+from markdown_extract import extract_raw_content
+
+HEADER = "# Big Sale\n\n**From:** Shop <news@shop.example.com>  \n**Date:** Mon, 6 Oct 2025 09:00:00 +0000  \n"
+BODY = "\n---\n\nHello **friend**, take [20% off](https://shop.example.com/sale) today.\n"
+
+def test_message_id_is_read_but_kept_out_of_the_content():
+    with_id = extract_raw_content(HEADER + "**Message-ID:** <abc.123@shop.example.com>\n" + BODY)
+    without_id = extract_raw_content(HEADER + BODY)
+
+    assert with_id["original_email"]["message_id"] == "<abc.123@shop.example.com>"
+    assert "abc.123" not in with_id["original_email"]["full_body_text"]
+    assert "abc.123" not in with_id["original_email"]["raw_markdown"]
+    with_id["original_email"]["message_id"] = None
+    assert with_id == without_id
+
+# --- Equivalence with the multi-regex extractor this module replaced ---
+
+def reference_extract(content: str) -> dict:
+    """The original LangGraph-agent extractor, verbatim apart from dropping self"""
+    # Extract subject line from markdown header
+    subject_match = re.search(r'^#\s*(.+)', content, re.MULTILINE)
+    subject = subject_match.group(1).strip() if subject_match else "No subject found"
+
+    # Extract sender info
+    sender_match = re.search(r'\*\*From:\*\*\s*(.+)', content)
+    sender = sender_match.group(1).strip() if sender_match else "Unknown sender"
+
+    # Extract date
+    date_match = re.search(r'\*\*Date:\*\*\s*(.+)', content)
+    date = date_match.group(1).strip() if date_match else "Unknown date"
+
+    links = []
+
+    # Markdown image links: [![text](image)](url)
+    image_links = re.findall(r'\[!\[([^\]]+)\]\([^\)]+\)\]\(([^\)]+)\)', content)
+    for text, url in image_links:
+        links.append({"url": url, "anchor_text": text, "link_type": "image_link", "position": "body"})
+
+    # Regular markdown links: [text](url)
+    markdown_links = re.findall(r'(?<!!)\[([^\]]+)\]\(([^\)]+)\)', content)
+    for text, url in markdown_links:
+        if not url.startswith('images/'):
+            links.append({"url": url, "anchor_text": text, "link_type": "text_link", "position": "body"})
+
+    # Image references: ![alt](image_path)
+    images = re.findall(r'!\[([^\]]+)\]\(([^\)]+)\)', content)
+    image_refs = []
+    for alt_text, img_path in images:
+        image_refs.append({"alt_text": alt_text, "image_path": img_path, "image_type": "embedded_image"})
+
+    sections = []
+
+    benefits_match = re.search(r'## Your benefits\.\.\.(.+?)(?=##|---|\n\n©)', content, re.DOTALL)
+    if benefits_match:
+        benefits_text = benefits_match.group(1).strip()
+        benefit_links = re.findall(r'\*\*\[([^\]]+)\]\([^\)]+\)\*\*', benefits_text)
+        sections.append({"section_type": "benefits", "content": benefits_text, "benefits_list": benefit_links})
+
+    main_msg_match = re.search(r'## Enjoy your unlocked benefits(.+?)## Your benefits', content, re.DOTALL)
+    if main_msg_match:
+        sections.append({"section_type": "main_message", "content": main_msg_match.group(1).strip()})
+
+    footer_match = re.search(r'\*\*Follow us:\*\*(.+?)(?=---|\n\nYou are receiving)', content, re.DOTALL)
+    if footer_match:
+        footer_content = footer_match.group(1).strip()
+        social_links = re.findall(r'\[([^\]]+)\]\([^\)]+\)', footer_content)
+        sections.append({"section_type": "footer_social", "content": footer_content,
+                         "social_platforms": social_links})
+
+    # Clean text without markdown
+    clean_text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', content)  # Remove links, keep text
+    clean_text = re.sub(r'!\[[^\]]*\]\([^\)]+\)', '', clean_text)  # Remove images
+    clean_text = re.sub(r'\*\*([^\*]+)\*\*', r'\1', clean_text)  # Remove bold
+    clean_text = re.sub(r'#+\s*', '', clean_text)  # Remove headers
+    clean_text = re.sub(r'---+', '', clean_text)  # Remove dividers
+    clean_text = '\n'.join(line.strip() for line in clean_text.split('\n') if line.strip())
+
+    return {
+        "original_email": {
+            "subject_line": subject,
+            "sender": sender,
+            "date": date,
+            "full_body_text": clean_text,
+            "raw_markdown": content
+        },
+        "extracted_links": links,
+        "image_references": image_refs,
+        "content_sections": sections,
+        "content_stats": {
+            "total_characters": len(content),
+            "total_words": len(clean_text.split()),
+            "total_links": len(links),
+            "total_images": len(image_refs),
+            "format_type": "markdown"
+        }
+    }
+
+def without_known_quirks(expected: dict) -> dict:
+    """The reference result minus the two bugs the single-pass extractor fixed on purpose
+
+    Link removal ran before image removal, so every image left "!alt" in the
+    body text; and [![alt](src)](url) also produced a text link to src.
+    """
+    original = expected["original_email"]
+    text = original["full_body_text"]
+    for image in expected["image_references"]:
+        text = text.replace("!" + image["alt_text"], "", 1)
+    original["full_body_text"] = '\n'.join(line.strip() for line in text.split('\n') if line.strip())
+    expected["extracted_links"] = [link for link in expected["extracted_links"]
+                                   if not link["anchor_text"].startswith("![")]
+    expected["content_stats"].update(total_words=len(original["full_body_text"].split()),
+                                     total_links=len(expected["extracted_links"]))
+    return expected
+
+def extract_without_message_id(content: str) -> dict:
+    result = extract_raw_content(content)
+    del result["original_email"]["message_id"]
+    return result
+
+ON_TEMPLATE = """# You're in! Welcome to the Community
+
+**From:** On Community <newsfeed@on.com>  
+**Date:** Fri, 7 Nov 2025 16:28:00 +0000 (UTC)
+
+---
+
+[![On logo](images/image_001.png)](https://www.on.com/)
+
+## Enjoy your unlocked benefits
+As a **member** you get early access, free returns and [exclusive drops](https://www.on.com/drops).
+
+## Your benefits...
+**[Free shipping](https://www.on.com/shipping)** on every order
+**[Birthday gift](https://www.on.com/birthday)** once a year
+---
+
+**Follow us:** [Instagram](https://instagram.com/on) [Strava](https://strava.com/on)
+
+You are receiving this email because you joined the On Community.
+
+© On AG
+"""
+
+def test_stored_sample_matches_reference_exactly():
+    with open(os.path.join(os.path.dirname(__file__), "..", "email_dna_langgraph.json")) as f:
+        content = json.load(f)["email_dna"]["raw_data"]["original_email"]["raw_markdown"]
+    assert extract_without_message_id(content) == reference_extract(content)
+
+def test_on_template_matches_reference():
+    result = extract_without_message_id(ON_TEMPLATE)
+    assert result == without_known_quirks(reference_extract(ON_TEMPLATE))
+    assert [section["section_type"] for section in result["content_sections"]] == \
+        ["benefits", "main_message", "footer_social"]
+    assert result["content_sections"][0]["benefits_list"] == ["Free shipping", "Birthday gift"]
+
+def test_corpus_matches_reference(tmp_path):
+    from benchmark import generate_corpus
+    from pipeline_runner import process_raw_email
+    for i, item in enumerate(generate_corpus(count=6, seed=5)):
+        with open(process_raw_email(str(i), item["raw_email"], str(tmp_path))["md_path"]) as f:
+            # The reference predates Message-ID headers in the Markdown
+            content = re.sub(r'^\*\*Message-ID:\*\*.*\n', '', f.read(), flags=re.MULTILINE)
+        assert extract_without_message_id(content) == without_known_quirks(reference_extract(content)), item["profile"]
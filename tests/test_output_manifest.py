@@ -0,0 +1,117 @@
+import json
+import os
+
+import pytest
+
+import output_manifest
+from dna_schemas import AnalysisFallbackError
+from output_manifest import OutputManifest, analyze_incremental, dna_is_current, email_key
+from pipeline_runner import process_raw_email
+
+@pytest.fixture(scope="module")
+def analyzer():
+    from langgraph_agents import EmailDNAAnalyzer
+    with EmailDNAAnalyzer(llm_backend="fake") as analyzer:
+        yield analyzer
+
+@pytest.fixture
+def counting(analyzer, monkeypatch):
+    """The analyzer, with a count of how many emails it actually analyzed"""
+    calls = []
+    analyze = analyzer.analyze
+    monkeypatch.setattr(analyzer, "analyze", lambda *args, **kwargs: calls.append(args) or analyze(*args, **kwargs))
+    monkeypatch.setattr(analyzer, "calls", calls, raising=False)
+    return analyzer
+
+def run(analyzer, prepared, tmp_path):
+    output_path = str(tmp_path / f"{prepared['key']}.json")
+    return analyze_incremental(analyzer, prepared["md_path"], prepared["images_dir"], output_path)
+
+def test_email_key_follows_message_id(raw_emails):
+    assert email_key(raw_emails[0]) == email_key(raw_emails[0])
+    assert len({email_key(raw_email) for raw_email in raw_emails}) == len(raw_emails)
+    reworded = raw_emails[0].replace(b"Subject:", b"Subject: Re:", 1)
+    assert email_key(reworded) == email_key(raw_emails[0])
+
+def test_markdown_stage_is_skipped_for_the_same_raw_email(tmp_path, raw_emails):
+    root = str(tmp_path / "emails")
+    first = process_raw_email("1", raw_emails[0], root)
+    again = process_raw_email("1", raw_emails[0], root)
+    assert not first["skipped"] and again["skipped"]
+    assert again["md_path"] == first["md_path"] == os.path.join(root, first["key"], f"{first['key']}.md")
+
+    os.remove(first["md_path"])
+    assert not process_raw_email("1", raw_emails[0], root)["skipped"]
+
+def test_dna_is_analyzed_once_then_skipped(counting, prepared, tmp_path):
+    assert not dna_is_current(counting, prepared["md_path"], prepared["images_dir"])
+    assert run(counting, prepared, tmp_path) is False
+    assert dna_is_current(counting, prepared["md_path"], prepared["images_dir"])
+    assert run(counting, prepared, tmp_path) is True
+    assert len(counting.calls) == 1
+
+    with open(tmp_path / f"{prepared['key']}.json") as f:
+        assert "email_dna" in json.load(f)
+    entry = OutputManifest(os.path.dirname(prepared["md_path"])).entry("dna")
+    assert entry["models"] == counting.model_names
+
+def test_edited_markdown_invalidates_dna(counting, prepared, tmp_path):
+    run(counting, prepared, tmp_path)
+    with open(prepared["md_path"], "a") as f:
+        f.write("\nOne more line.\n")
+    assert not dna_is_current(counting, prepared["md_path"], prepared["images_dir"])
+    assert run(counting, prepared, tmp_path) is False
+    assert len(counting.calls) == 2
+
+def test_changed_image_invalidates_dna(counting, prepared, tmp_path):
+    run(counting, prepared, tmp_path)
+    image = sorted(os.listdir(prepared["images_dir"]))[0]
+    with open(os.path.join(prepared["images_dir"], image), "ab") as f:
+        f.write(b"\0")
+    assert not dna_is_current(counting, prepared["md_path"], prepared["images_dir"])
+
+def test_other_model_invalidates_dna(counting, prepared, tmp_path, monkeypatch):
+    run(counting, prepared, tmp_path)
+    monkeypatch.setattr(counting, "model_names", "gpt-5/gpt-5")
+    assert not dna_is_current(counting, prepared["md_path"], prepared["images_dir"])
+
+def test_stage_version_bump_invalidates_dna(counting, prepared, tmp_path, monkeypatch):
+    run(counting, prepared, tmp_path)
+    monkeypatch.setitem(output_manifest.STAGE_VERSIONS, "dna", output_manifest.STAGE_VERSIONS["dna"] + 1)
+    assert not dna_is_current(counting, prepared["md_path"], prepared["images_dir"])
+
+def test_missing_output_is_recomputed(counting, prepared, tmp_path):
+    run(counting, prepared, tmp_path)
+    os.remove(tmp_path / f"{prepared['key']}.json")
+    assert run(counting, prepared, tmp_path) is False
+    assert len(counting.calls) == 2
+
+def test_guard_abandons_before_analysis(counting, prepared, tmp_path):
+    def guard():
+        raise RuntimeError("lease lost")
+    with pytest.raises(RuntimeError):
+        analyze_incremental(counting, prepared["md_path"], prepared["images_dir"],
+                            str(tmp_path / "out.json"), guard=guard)
+    assert counting.calls == []
+    assert not os.path.exists(tmp_path / "out.json")
+
+def test_fallback_result_is_not_recorded(prepared, tmp_path, monkeypatch, counting):
+    from langgraph_agents import EmailDNAAnalyzer
+    monkeypatch.setenv("DNA_FAKE_LLM_INVALID_RATE", "1.0")
+    with EmailDNAAnalyzer(llm_backend="fake") as failing:
+        with pytest.raises(AnalysisFallbackError):
+            run(failing, prepared, tmp_path)
+        assert not dna_is_current(failing, prepared["md_path"], prepared["images_dir"])
+    assert not os.path.exists(tmp_path / f"{prepared['key']}.json")
+
+    # The next run retries instead of reporting the email unchanged
+    assert run(counting, prepared, tmp_path) is False
+    assert len(counting.calls) == 1
+
+def test_record_dna_refuses_fallback_output(prepared, tmp_path, analyzer):
+    output_path = tmp_path / "fallback.json"
+    output_path.write_text(json.dumps({"email_dna": {"meta_data": {
+        "analysis_status": "fallback", "fallback_reasons": ["content: RateLimitError"]}}}))
+    with pytest.raises(AnalysisFallbackError, match="RateLimitError"):
+        output_manifest.record_dna(analyzer, prepared["md_path"], prepared["images_dir"], str(output_path))
+    assert not dna_is_current(analyzer, prepared["md_path"], prepared["images_dir"])
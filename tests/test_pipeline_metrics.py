@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from email_embeddings import EmbeddingIndex, HashingEmbeddings
+from output_manifest import analyze_incremental
+from pipeline_metrics import PipelineMetrics, get_metrics
+from pipeline_runner import process_raw_email
+
+@pytest.fixture
+def metrics():
+    return get_metrics()
+
+def test_images_are_counted_per_stage_not_summed(raw_emails, tmp_path, metrics):
+    converted = process_raw_email("metrics-1", raw_emails[0], str(tmp_path))
+    summary = metrics.pop_email("metrics-1")
+    assert summary["images"] == {"parse": converted["images"], "markdown_images": converted["images"]}
+    assert "images_processed" not in summary
+
+def test_merge_adds_per_stage_images():
+    first, second = PipelineMetrics(), PipelineMetrics()
+    first.add_images(2, "parse", email="a")
+    second.add_images(2, "parse", email="a")
+    second.add_images(1, "image_agent", email="a")
+    first.merge(second.drain())
+    assert first.email_summary("a")["images"] == {"parse": 4, "image_agent": 1}
+
+class PricedEmbeddings(HashingEmbeddings):
+    model = "text-embedding-3-small"
+
+def test_embedding_requests_count_as_llm_calls(tmp_path, metrics):
+    index = EmbeddingIndex(str(tmp_path / "embeddings"), PricedEmbeddings(dim=32))
+    with metrics.for_email("metrics-2"):
+        index.add_text("a", "running shoes " * 200)
+        index.search_text("running shoes", k=1)
+    summary = metrics.pop_email("metrics-2")
+    assert summary["llm_calls"] == 2
+    assert summary["prompt_tokens"] == len("running shoes " * 200) // 4 + len("running shoes") // 4
+    assert summary["cost_usd"] > 0
+
+def test_incremental_analysis_counts_output_bytes(prepared, tmp_path, metrics):
+    from langgraph_agents import EmailDNAAnalyzer
+    output_path = str(tmp_path / "out.json")
+    metrics.pop_email(prepared["md_path"])
+    with EmailDNAAnalyzer(llm_backend="fake") as analyzer:
+        analyze_incremental(analyzer, prepared["md_path"], prepared["images_dir"], output_path)
+    summary = metrics.pop_email(prepared["md_path"])
+    assert summary["bytes_written"] == os.path.getsize(output_path)
+    assert summary["images"] == {"image_agent": prepared["images"]}
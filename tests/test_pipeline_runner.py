@@ -0,0 +1,87 @@
+import imaplib
+import os
+
+import pytest
+
+import gmail_fetch
+from pipeline_runner import PipelineRunner
+
+@pytest.fixture(scope="module")
+def analyzer():
+    from langgraph_agents import EmailDNAAnalyzer
+    with EmailDNAAnalyzer(llm_backend="fake") as analyzer:
+        yield analyzer
+
+def runner_for(analyzer, tmp_path, **options):
+    return PipelineRunner(analyzer, parse_workers=1, llm_concurrency=2, output_root=str(tmp_path / "emails"),
+                          output_dir=str(tmp_path / "dna_results"), **options)
+
+def test_run_raw_analyzes_every_email_then_skips_them(analyzer, tmp_path, raw_emails):
+    inputs = [(str(i), raw_email) for i, raw_email in enumerate(raw_emails)]
+    results = runner_for(analyzer, tmp_path).run_raw(inputs)
+    assert sorted(item["email_id"] for item in results) == ["0", "1", "2"]
+    assert all(item["stage"] == "complete" and item["error"] is None for item in results)
+    assert all(os.path.exists(item["output_path"]) for item in results)
+
+    again = runner_for(analyzer, tmp_path).run_raw(inputs)
+    assert [item["stage"] for item in again] == ["skipped"] * len(raw_emails)
+
+def test_unparseable_email_fails_alone(analyzer, tmp_path, raw_emails):
+    results = runner_for(analyzer, tmp_path).run_raw([("good", raw_emails[0]), ("bad", None)])
+    by_id = {item["email_id"]: item for item in results}
+    assert by_id["good"]["stage"] == "complete"
+    assert by_id["bad"]["stage"] == "parse" and by_id["bad"]["error"]
+
+class FakeMailbox:
+    """Just enough of IMAP4_SSL for run_gmail; drops the connection on the UIDs in `abort_on`"""
+
+    def __init__(self, messages, abort_on=()):
+        self.messages = messages
+        self.abort_on = set(abort_on)
+        self.selected = False
+        self.logged_out = False
+
+    def select(self, mailbox):
+        self.selected = True
+        return "OK", [str(len(self.messages)).encode()]
+
+    def uid(self, command, *args):
+        if command == "search":
+            return "OK", [b" ".join(uid.encode() for uid in self.messages)]
+        uid = args[0]
+        if uid in self.abort_on:
+            raise imaplib.IMAP4.abort("socket error: EOF")
+        return "OK", [(f"{uid} (RFC822)".encode(), self.messages[uid])]
+
+    def close(self):
+        if not self.selected:
+            raise imaplib.IMAP4.error("command CLOSE illegal in state AUTH, only allowed in states SELECTED")
+
+    def logout(self):
+        self.logged_out = True
+
+def test_fetch_worker_reconnects_and_retries_dropped_uid(analyzer, tmp_path, raw_emails, monkeypatch):
+    messages = {str(i + 1): raw_email for i, raw_email in enumerate(raw_emails)}
+    connections = [FakeMailbox(messages), FakeMailbox(messages, abort_on={"2"}), FakeMailbox(messages)]
+    opened = []
+    monkeypatch.setattr(gmail_fetch, "connect_gmail", lambda: opened.append(connections[len(opened)]) or opened[-1])
+
+    results = runner_for(analyzer, tmp_path, fetch_workers=1).run_gmail(limit=10)
+    assert sorted(item["email_id"] for item in results if item["stage"] == "complete") == ["1", "2", "3"]
+    # search connection, the one that dropped, and its replacement; all logged out
+    assert len(opened) == 3
+    assert all(mail.logged_out for mail in opened)
+
+def test_uid_that_keeps_dropping_fails_alone(analyzer, tmp_path, raw_emails, monkeypatch):
+    messages = {str(i + 1): raw_email for i, raw_email in enumerate(raw_emails)}
+    monkeypatch.setattr(gmail_fetch, "connect_gmail", lambda: FakeMailbox(messages, abort_on={"2"}))
+
+    results = runner_for(analyzer, tmp_path, fetch_workers=1).run_gmail(limit=10)
+    by_id = {item["email_id"]: item for item in results}
+    assert by_id["2"]["stage"] == "fetch" and "abort" in by_id["2"]["error"]
+    assert by_id["1"]["stage"] == by_id["3"]["stage"] == "complete"
+
+def test_close_mailbox_logs_out_when_select_never_succeeded():
+    mail = FakeMailbox({})
+    gmail_fetch.close_mailbox(mail)
+    assert mail.logged_out
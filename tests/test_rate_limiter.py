@@ -0,0 +1,117 @@
+import time
+import imaplib
+
+import openai
+import pytest
+
+from llm_backends import FakeChatModel, _api_error
+from rate_limiter import RateLimitScheduler, TokenBucket, classify_error, retry_after
+
+def rate_limit_error(retry_after_header: str = None):
+    headers = {"retry-after": retry_after_header} if retry_after_header else {}
+    return _api_error(openai.RateLimitError, 429, "slow down", headers)
+
+class Flaky:
+    """Raises the given errors in order, then returns "ok" on every later call"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+def test_classify_error():
+    assert classify_error(rate_limit_error()) == "rate_limit"
+    assert classify_error(_api_error(openai.InternalServerError, 503, "down")) == "transient"
+    assert classify_error(imaplib.IMAP4.error("NO [THROTTLED] try later")) == "rate_limit"
+    assert classify_error(imaplib.IMAP4.error("NO no such mailbox")) is None
+    assert classify_error(imaplib.IMAP4.abort("socket error: EOF")) == "transient"
+    assert classify_error(TimeoutError()) == "transient"
+    assert classify_error(ValueError("bad prompt")) is None
+
+def test_retry_after_reads_headers():
+    assert retry_after(rate_limit_error("2")) == 2.0
+    assert retry_after(_api_error(openai.RateLimitError, 429, "x", {"retry-after-ms": "250"})) == 0.25
+    assert retry_after(_api_error(openai.RateLimitError, 429, "x", {"x-ratelimit-reset-requests": "1m30s"})) == 90
+    assert retry_after(rate_limit_error()) is None
+
+def test_token_bucket_makes_later_callers_wait():
+    bucket = TokenBucket(per_minute=60, capacity=2)
+    now = time.monotonic()
+    assert bucket.reserve(1, now) == 0
+    assert bucket.reserve(1, now) == 0
+    assert bucket.reserve(1, now) == pytest.approx(1.0)
+    assert bucket.reserve(1, now) == pytest.approx(2.0)
+
+def test_429_halves_concurrency_and_successes_grow_it_back():
+    scheduler = RateLimitScheduler("test", max_concurrency=8, max_delay=0.01)
+    fn = Flaky(rate_limit_error("0"))
+    assert scheduler.call(fn) == "ok"
+    assert fn.calls == 2
+    assert scheduler.concurrency == 4
+    assert scheduler.stats()["throttled"] == 1
+
+    for _ in range(4):
+        scheduler.call(lambda: "ok")
+    assert scheduler.concurrency == 5
+    for _ in range(100):
+        scheduler.call(lambda: "ok")
+    assert scheduler.concurrency == 8
+
+def test_concurrency_never_drops_below_minimum():
+    scheduler = RateLimitScheduler("test", max_concurrency=4, min_concurrency=2, max_retries=10, max_delay=0.001)
+    # Retry-after of 0 ends each pause at once, so every 429 is its own throttling episode
+    scheduler.call(Flaky(*[rate_limit_error("0") for _ in range(5)]))
+    assert scheduler.concurrency == 2
+
+def test_retry_after_is_honoured():
+    scheduler = RateLimitScheduler("test", max_delay=5)
+    start = time.monotonic()
+    scheduler.call(Flaky(rate_limit_error("0.2")))
+    assert time.monotonic() - start >= 0.2
+
+def test_retry_after_is_capped_by_max_delay():
+    scheduler = RateLimitScheduler("test", max_delay=0.05)
+    start = time.monotonic()
+    scheduler.call(Flaky(rate_limit_error("30")))
+    assert time.monotonic() - start < 1
+
+def test_transient_errors_retry_without_shrinking_concurrency():
+    scheduler = RateLimitScheduler("test", max_concurrency=8, base_delay=0.001)
+    assert scheduler.call(Flaky(_api_error(openai.InternalServerError, 500, "oops"), TimeoutError())) == "ok"
+    stats = scheduler.stats()
+    assert stats["retries"] == 2 and stats["transient_errors"] == 2
+    assert scheduler.concurrency == 8
+
+def test_permanent_errors_and_exhausted_retries_raise():
+    scheduler = RateLimitScheduler("test", max_retries=2, max_delay=0.001)
+    fn = Flaky(ValueError("bad"))
+    with pytest.raises(ValueError):
+        scheduler.call(fn)
+    assert fn.calls == 1
+
+    fn = Flaky(*[rate_limit_error("0") for _ in range(3)])
+    with pytest.raises(openai.RateLimitError):
+        scheduler.call(fn)
+    assert fn.calls == 3
+
+def test_fake_model_429s_are_retried_until_every_call_succeeds():
+    model = FakeChatModel(rate_limit_rate=0.5, seed=3)
+    scheduler = RateLimitScheduler("llm-test", max_concurrency=8, max_retries=20, max_delay=0.001)
+    replies = [scheduler.call(model.invoke, f"prompt {i}") for i in range(20)]
+
+    assert all(reply.content for reply in replies)
+    assert model.stats["rate_limited"] > 0
+    assert scheduler.stats()["throttled"] == model.stats["rate_limited"]
+    assert scheduler.stats()["calls"] == 20
+
+def test_rate_limit_headers_set_the_request_rate():
+    model = FakeChatModel(rpm=120)
+    scheduler = RateLimitScheduler("llm-test", headroom=0.5)
+    assert scheduler.requests is None
+    scheduler.call(model.invoke, "hello")
+    assert scheduler.requests.per_minute == 60
@@ -0,0 +1,57 @@
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from dna_schemas import ContentDNA, StructuredOutputError, fallback_reasons, parse_stats, reset_parse_stats
+from langgraph_agents import EmailDNAAgents, EmailDNAAnalyzer
+from llm_backends import _FAKE_CONTENT_REPLY
+
+def scripted(*replies):
+    return GenericFakeChatModel(messages=iter(AIMessage(content=reply) for reply in replies))
+
+@pytest.fixture(autouse=True)
+def clean_stats():
+    reset_parse_stats()
+    yield
+    reset_parse_stats()
+
+def test_invalid_reply_is_repaired():
+    llm = scripted("Sure! {not json", _FAKE_CONTENT_REPLY)
+    agents = EmailDNAAgents(llm=llm, vision_llm=llm)
+    result = agents._invoke_structured(llm, [HumanMessage(content="analyze")], ContentDNA, "content")
+    assert ContentDNA.model_validate(result)
+    assert parse_stats() == {"content_parse_failures": 1, "content_repaired": 1}
+
+def test_repairs_are_bounded():
+    llm = scripted(*["{not json"] * 5)
+    agents = EmailDNAAgents(llm=llm, vision_llm=llm)
+    with pytest.raises(StructuredOutputError):
+        agents._invoke_structured(llm, [HumanMessage(content="analyze")], ContentDNA, "content")
+    assert parse_stats()["content_parse_failures"] == 3
+
+def test_valid_run_is_marked_complete(prepared):
+    with EmailDNAAnalyzer(llm_backend="fake") as analyzer:
+        result = analyzer.analyze(prepared["md_path"], prepared["images_dir"])
+    assert result["final_dna"]["email_dna"]["meta_data"]["analysis_status"] == "complete"
+    assert fallback_reasons(result["final_dna"]) == []
+
+def test_failed_calls_are_flagged_and_never_stored(prepared, tmp_path, monkeypatch):
+    monkeypatch.setenv("DNA_FAKE_LLM_INVALID_RATE", "1.0")
+    with EmailDNAAnalyzer(llm_backend="fake", store_path=str(tmp_path / "dna.sqlite"), dedupe_threshold=0.9,
+                          embedding_dir=str(tmp_path / "embeddings")) as analyzer:
+        result = analyzer.analyze(prepared["md_path"], prepared["images_dir"])
+        meta = result["final_dna"]["email_dna"]["meta_data"]
+        assert result["status"] == "fallback"
+        assert meta["analysis_status"] == "fallback"
+        reasons = fallback_reasons(result["final_dna"])
+        assert reasons[0].startswith("content: StructuredOutputError")
+        assert len(reasons) == 1 + prepared["images"]
+        assert analyzer.store.get(meta["message_id"]) is None
+        assert len(analyzer.embedding_index) == 0
+
+def test_batch_reports_fallbacks_as_errors(prepared, tmp_path, monkeypatch):
+    monkeypatch.setenv("DNA_FAKE_LLM_INVALID_RATE", "1.0")
+    with EmailDNAAnalyzer(llm_backend="fake") as analyzer:
+        [item] = analyzer.batch([(prepared["md_path"], prepared["images_dir"])], str(tmp_path / "out"))
+    assert item["output_path"] is None
+    assert "content: StructuredOutputError" in item["error"]
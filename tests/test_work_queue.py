@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+from work_queue import LeaseLost, QueueWorker, WorkQueue, _Heartbeat, enqueue_files
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"), max_attempts=2, retry_delay=0)
+    yield queue
+    queue.close()
+
+def expire_lease(queue, job_id):
+    with queue._conn:
+        queue._conn.execute("UPDATE jobs SET lease_expires = 0 WHERE job_id = ?", (job_id,))
+
+def test_enqueue_is_idempotent(queue):
+    assert queue.enqueue("a", {"n": 1})
+    assert not queue.enqueue("a", {"n": 2})
+    assert queue.stats()["pending"] == 1
+
+def test_claim_leases_each_job_to_one_worker(queue):
+    queue.enqueue("a", {"n": 1})
+    job = queue.claim("w1")
+    assert job == {"job_id": "a", "payload": {"n": 1}, "attempts": 1, "max_attempts": 2}
+    assert queue.claim("w2") is None
+    assert queue.complete("a", "w1", {"ok": True})
+    assert queue.stats()["done"] == 1
+    assert queue.unfinished() == 0
+
+def test_expired_lease_is_reclaimed_and_old_owner_locked_out(queue):
+    queue.enqueue("a", {})
+    queue.claim("w1")
+    expire_lease(queue, "a")
+
+    job = queue.claim("w2")
+    assert job["job_id"] == "a" and job["attempts"] == 2
+    assert not queue.heartbeat("a", "w1")
+    assert not queue.complete("a", "w1")
+    assert queue.fail("a", "w1", "late") is None
+    assert queue.complete("a", "w2")
+
+def test_failed_attempts_retry_then_dead_letter(queue):
+    queue.enqueue("a", {})
+    queue.claim("w1")
+    assert queue.fail("a", "w1", "boom 1") == "pending"
+    assert queue.claim("w1")["attempts"] == 2
+    assert queue.fail("a", "w1", "boom 2") == "failed"
+
+    assert queue.claim("w1") is None
+    assert queue.stats()["failed"] == 1
+    assert queue.failures() == [{"job_id": "a", "attempts": 2, "last_error": "boom 2"}]
+    assert queue.requeue_failed() == 1
+    assert queue.claim("w1")["attempts"] == 1
+
+def test_retry_waits_out_its_backoff(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"), retry_delay=60)
+    queue.enqueue("a", {})
+    queue.claim("w1")
+    assert queue.fail("a", "w1", "boom") == "pending"
+    assert queue.claim("w1") is None
+    assert queue.unfinished() == 1
+    queue.close()
+
+def test_expired_lease_on_last_attempt_is_dead_lettered(queue):
+    queue.enqueue("a", {})
+    queue.claim("w1")
+    queue.fail("a", "w1", "boom")
+    queue.claim("w1")
+    expire_lease(queue, "a")
+
+    assert queue.claim("w2") is None
+    assert queue.failures()[0]["last_error"] == "boom"
+
+def test_heartbeat_check_raises_once_lease_is_taken(queue):
+    queue.enqueue("a", {})
+    queue.claim("w1", lease_seconds=60)
+    heartbeat = _Heartbeat(queue, "a", "w1", 60)
+    try:
+        heartbeat.check()
+        expire_lease(queue, "a")
+        queue.claim("w2")
+        with pytest.raises(LeaseLost):
+            heartbeat.check()
+        assert heartbeat.lost
+    finally:
+        heartbeat.stop()
+
+@pytest.fixture
+def worker(tmp_path):
+    worker = QueueWorker(str(tmp_path / "queue.sqlite"), str(tmp_path / "dna.sqlite"), worker_id="w1",
+                         emails_root=str(tmp_path / "emails"), output_dir=str(tmp_path / "dna_results"),
+                         llm_backend="fake")
+    yield worker
+    worker.close()
+
+def test_worker_drains_queue_and_skips_unchanged_emails(worker, eml_files):
+    assert enqueue_files(worker.queue, eml_files) == len(eml_files)
+    assert worker.run() == {"done": len(eml_files), "retried": 0, "failed": 0, "abandoned": 0}
+
+    # Same emails under new job ids: the manifests show nothing to redo
+    for path in eml_files:
+        worker.queue.enqueue(f"again:{path}", {"source": "file", "path": path})
+    worker.run()
+    results = [json.loads(row[0]) for row in worker.queue._conn.execute(
+        "SELECT result FROM jobs WHERE job_id LIKE 'again:%'")]
+    assert len(results) == len(eml_files)
+    assert all(result["skipped"] for result in results)
+
+def test_worker_abandons_job_whose_lease_was_taken(worker, eml_files):
+    enqueue_files(worker.queue, eml_files[:1])
+    job = worker.queue.claim(worker.worker_id, 60)
+    heartbeat = _Heartbeat(worker.queue, job["job_id"], worker.worker_id, 60)
+    expire_lease(worker.queue, job["job_id"])
+    worker.queue.claim("w2")
+    try:
+        with pytest.raises(LeaseLost):
+            worker.process(job, heartbeat)
+    finally:
+        heartbeat.stop()
+    assert not worker.queue.complete(job["job_id"], worker.worker_id)
@@ -0,0 +1,353 @@
+"""
+Durable SQLite work queue for distributed DNA analysis: leases, retries, heartbeats
+"""
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+import multiprocessing
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    result TEXT,
+    enqueued_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, available_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs (status, lease_expires);
+"""
+
+JOB_STATUSES = ("pending", "leased", "done", "failed")
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class WorkQueue:
+    """Jobs in one SQLite file that any number of worker processes can claim
+
+    claim() leases the oldest available job to one worker for lease_seconds.
+    A worker that dies simply stops heartbeating; its lease expires and the
+    job is handed out again. A job that fails is retried with exponential
+    backoff until max_attempts, then parked as 'failed'. enqueue() is
+    idempotent per job_id, so re-running the coordinator never duplicates
+    work. Workers on several hosts need the file on storage with working
+    POSIX locks; SQLite over NFS is not that.
+    """
+
+    def __init__(self, path: str = "work_queue.sqlite", max_attempts: int = 3, retry_delay: float = 30.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def enqueue(self, job_id: str, payload: dict, max_attempts: int = None) -> bool:
+        """Add a job; False if job_id was already queued (in any state)"""
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (job_id, payload, max_attempts, available_at, enqueued_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, json.dumps(payload), max_attempts or self.max_attempts, now, now, now)
+            )
+        return cursor.rowcount == 1
+
+    def claim(self, worker_id: str, lease_seconds: float = 300.0):
+        """Lease the next available job to worker_id, or None if nothing is ready
+
+        Expired leases count as available. One UPDATE ... RETURNING statement
+        picks and leases the row, so two workers can never claim the same job.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            # Jobs whose worker vanished after their last allowed attempt are failed, not retried
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', last_error = COALESCE(last_error, 'lease expired'), "
+                "lease_owner = NULL, updated_at = ? "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= max_attempts",
+                (now, now)
+            )
+            row = self._conn.execute(
+                "UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? "
+                "WHERE job_id = (SELECT job_id FROM jobs "
+                "                WHERE (status = 'pending' AND available_at <= ?) "
+                "                   OR (status = 'leased' AND lease_expires < ?) "
+                "                ORDER BY enqueued_at LIMIT 1) "
+                "RETURNING job_id, payload, attempts, max_attempts",
+                (worker_id, now + lease_seconds, now, now, now)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"job_id": row["job_id"], "payload": json.loads(row["payload"]),
+                "attempts": row["attempts"], "max_attempts": row["max_attempts"]}
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float = 300.0) -> bool:
+        """Extend a lease; False if worker_id no longer holds it"""
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE job_id = ? AND status = 'leased' AND lease_owner = ?",
+                (now + lease_seconds, now, job_id, worker_id)
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, result: dict = None) -> bool:
+        """Mark a leased job done; False if the lease was lost to another worker"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, lease_owner = NULL, lease_expires = NULL, "
+                "last_error = NULL, updated_at = ? WHERE job_id = ? AND status = 'leased' AND lease_owner = ?",
+                (json.dumps(result, default=str), time.time(), job_id, worker_id)
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> str:
+        """Record a failed attempt; returns the job's new status ('pending' to retry, or 'failed')"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE job_id = ? AND status = 'leased' AND lease_owner = ?",
+                (job_id, worker_id)
+            ).fetchone()
+            if row is None:
+                return None
+            status = "failed" if row["attempts"] >= row["max_attempts"] else "pending"
+            delay = self.retry_delay * 2 ** (row["attempts"] - 1)
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, available_at = ?, last_error = ?, lease_owner = NULL, "
+                "lease_expires = NULL, updated_at = ? WHERE job_id = ?",
+                (status, now + delay, error, now, job_id)
+            )
+        return status
+
+    def requeue_failed(self) -> int:
+        """Give every failed job a fresh set of attempts"""
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'pending', attempts = 0, available_at = ?, updated_at = ? "
+                "WHERE status = 'failed'", (now, now)
+            )
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        """Job count per status"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        counts = dict.fromkeys(JOB_STATUSES, 0)
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+    def failures(self, limit: int = 20) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, attempts, last_error FROM jobs WHERE status = 'failed' "
+                "ORDER BY updated_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def unfinished(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'leased')"
+            ).fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+# --- Coordinator ---
+
+def enqueue_gmail(queue: WorkQueue, sender_email: str = "newsfeed@on.com", limit: int = 10) -> int:
+    """Enqueue the latest emails from sender_email by IMAP UID; returns how many were new"""
+    from gmail_fetch import connect_gmail, search_email_uids
+    mail = connect_gmail()
+    try:
+        uids = search_email_uids(mail, sender_email, limit)
+    finally:
+        mail.logout()
+    added = sum(queue.enqueue(f"gmail:{uid}", {"source": "gmail", "uid": uid}) for uid in uids)
+    print(f"📥 Enqueued {added} new of {len(uids)} emails from {sender_email}")
+    return added
+
+def enqueue_files(queue: WorkQueue, paths) -> int:
+    """Enqueue saved .eml files (absolute paths, so workers may run from any directory)"""
+    added = 0
+    for path in paths:
+        path = os.path.abspath(path)
+        added += queue.enqueue(f"file:{path}", {"source": "file", "path": path})
+    print(f"📥 Enqueued {added} new .eml files")
+    return added
+
+# --- Workers ---
+
+class LeaseLost(Exception):
+    """Another worker took over the job; this one must stop working on it"""
+
+class _Heartbeat:
+    """Keeps a job's lease alive from a background thread while the worker processes it"""
+
+    def __init__(self, queue: WorkQueue, job_id: str, worker_id: str, lease_seconds: float):
+        self._stop = threading.Event()
+        self.lost = False
+        self._renew = lambda: queue.heartbeat(job_id, worker_id, lease_seconds)
+
+        def beat():
+            while not self._stop.wait(lease_seconds / 3):
+                if not self._renew():
+                    self.lost = True
+                    return
+
+        self._thread = threading.Thread(target=beat, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def check(self):
+        """Renew the lease now; raise LeaseLost if another worker has taken the job"""
+        if self.lost or not self._renew():
+            self.lost = True
+            raise LeaseLost("lease lost to another worker")
+
+class QueueWorker:
+    """Claims jobs, runs parse → Markdown → DNA on each, and records results in a shared store
+
+    Each job's email goes to emails_root/<key>/ and its DNA to the
+    DNAResultStore at store_path (plus output_dir/<key>.json), so any
+    number of workers on any number of hosts write to one place. Outputs
+    the manifest shows are current are not recomputed.
+    """
+
+    def __init__(self, queue_path: str, store_path: str, worker_id: str = None, lease_seconds: float = 300.0,
+                 emails_root: str = "emails", output_dir: str = "dna_results", llm_backend: str = None):
+        from langgraph_agents import EmailDNAAnalyzer
+        self.queue = WorkQueue(queue_path)
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.emails_root = emails_root
+        self.output_dir = output_dir
+        self.analyzer = EmailDNAAnalyzer(store_path=store_path, llm_backend=llm_backend)
+        self._mail = None
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _raw_email(self, payload: dict) -> bytes:
+        if payload["source"] == "file":
+            with open(payload["path"], "rb") as f:
+                return f.read()
+        if payload["source"] == "gmail":
+            from gmail_fetch import close_mailbox, fetch_email_by_uid, open_inbox
+            if self._mail is None:
+                self._mail = open_inbox()
+            try:
+                return fetch_email_by_uid(self._mail, payload["uid"])["raw_email"]
+            except Exception:
+                # Drop a possibly broken connection; the retry reconnects
+                close_mailbox(self._mail)
+                self._mail = None
+                raise
+        raise ValueError(f"Unknown job source {payload['source']!r}")
+
+    def process(self, job: dict, heartbeat: _Heartbeat) -> dict:
+        """Parse, convert and analyze one job's email; raises LeaseLost as soon as the lease is gone"""
+        from pipeline_runner import process_raw_email
+        from output_manifest import analyze_incremental
+        payload = job["payload"]
+        raw_email = self._raw_email(payload)
+        heartbeat.check()
+        prepared = process_raw_email(job["job_id"], raw_email, self.emails_root)
+        output_path = os.path.join(self.output_dir, f"{prepared['key']}.json")
+        # Checked before the LLM spend and again before the result is written
+        skipped = analyze_incremental(self.analyzer, prepared["md_path"], prepared["images_dir"], output_path,
+                                      guard=heartbeat.check)
+        return {"message_id": prepared["message_id"], "output_path": output_path,
+                "md_path": prepared["md_path"], "skipped": skipped}
+
+    def run(self, exit_when_empty: bool = True, poll_interval: float = 5.0) -> dict:
+        """Work until the queue has nothing left (or forever, polling, if exit_when_empty is False)"""
+        processed = {"done": 0, "retried": 0, "failed": 0, "abandoned": 0}
+        print(f"👷 Worker {self.worker_id} started on {self.queue.path}")
+        while True:
+            job = self.queue.claim(self.worker_id, self.lease_seconds)
+            if job is None:
+                if exit_when_empty and not self.queue.unfinished():
+                    break
+                # Other workers still hold leases (or retries are backing off): they may come back
+                time.sleep(poll_interval)
+                continue
+
+            heartbeat = _Heartbeat(self.queue, job["job_id"], self.worker_id, self.lease_seconds)
+            try:
+                result = self.process(job, heartbeat)
+            except LeaseLost:
+                heartbeat.stop()
+                processed["abandoned"] += 1
+                print(f"⚠️  {job['job_id']}: lease lost, abandoned to the current owner")
+                continue
+            except Exception as e:
+                heartbeat.stop()
+                status = self.queue.fail(job["job_id"], self.worker_id, f"{type(e).__name__}: {e}")
+                print(f"❌ {job['job_id']} attempt {job['attempts']}/{job['max_attempts']}: {e} → {status}")
+                if status is None:
+                    # The lease had already passed to another worker, which owns the retry
+                    processed["abandoned"] += 1
+                else:
+                    processed["failed" if status == "failed" else "retried"] += 1
+                continue
+            heartbeat.stop()
+            if self.queue.complete(job["job_id"], self.worker_id, result):
+                processed["done"] += 1
+                print(f"{'♻️ ' if result['skipped'] else '✅'} {job['job_id']} → {result['output_path']}")
+            else:
+                # Lost between the last check and completion; the new owner's outputs will match these
+                processed["abandoned"] += 1
+                print(f"⚠️  {job['job_id']}: lease lost, result left to the current owner")
+        print(f"🎯 Worker {self.worker_id} finished: {processed}")
+        return processed
+
+    def close(self):
+        if self._mail is not None:
+            from gmail_fetch import close_mailbox
+            close_mailbox(self._mail)
+        self.analyzer.close()
+        self.queue.close()
+
+def _worker_main(queue_path: str, store_path: str, exit_when_empty: bool, worker_options: dict):
+    worker = QueueWorker(queue_path, store_path, **worker_options)
+    try:
+        worker.run(exit_when_empty=exit_when_empty)
+    finally:
+        worker.close()
+
+def run_workers(queue_path: str, store_path: str, processes: int = 2, exit_when_empty: bool = True,
+                **worker_options) -> list:
+    """Start `processes` local worker processes and wait until the queue is drained
+
+    Handy for backfills on one box and for testing; on other hosts just run
+    `python cli.py worker` against the same queue and store files.
+    """
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_worker_main, args=(queue_path, store_path, exit_when_empty, worker_options))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return [worker.exitcode for worker in workers]